@@ -0,0 +1,21 @@
+import importlib
+
+def lazy_exports(namespace, exports):
+    """
+    Returns a module-level __getattr__ for a package whose globals are
+    namespace. Each name in exports ({name: relative module}) is imported
+    on first access and then cached in the package, so importing the
+    package does not load its heavy dependencies (llama_cpp, numpy, mss,
+    PIL) until something is actually used.
+    """
+    package = namespace["__name__"]
+
+    def __getattr__(name):
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module, package), name)
+        namespace[name] = value
+        return value
+
+    return __getattr__
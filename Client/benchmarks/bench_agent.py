@@ -0,0 +1,114 @@
+"""
+Offline benchmark for the full agent loop.
+
+Replays recorded screenshots through Agent._main_loop with a deterministic
+stub model and a no-op input backend, then reports steps/sec, per-stage
+latency and peak RSS as JSON. No display or GGUF model is required.
+
+Usage: python -m Client.benchmarks.bench_agent --frames path/to/screens --steps 50 --output results.json
+"""
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+from functools import partial
+
+from ..config.settings import DEFAULT_CONFIG
+from ..control.actions import ActionExecutor
+from ..control.backends import NoOpInputBackend
+from ..core.agent import Agent
+from ..llm.model_loader import ModelLoader
+from .replay import ReplayCapture, StubLlama
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def run_benchmark(frames_dir, steps, token_latency, prompt_token_latency, overrides=None, responses=None):
+    config = dict(DEFAULT_CONFIG)
+    config.update({
+        "model_path": "stub.gguf",
+        "adaptive_settle": False,
+        "step_delay": 0.0,
+        "max_steps": steps,
+        "vision_cache_path": "",
+        "prompt_cache_dir": "",
+    })
+    config.update(overrides or {})
+    if (config.get("use_vision_model") or config.get("single_pass_multimodal")) and not config.get("vision_model_path"):
+        config["vision_model_path"] = "stub-vision.gguf"
+        config["clip_model_path"] = config.get("clip_model_path") or "stub-clip.gguf"
+
+    model_factory = partial(StubLlama, token_latency=token_latency, prompt_token_latency=prompt_token_latency,
+                            responses=responses)
+    capture_factory = partial(ReplayCapture, frames_dir)
+    agent = Agent(
+        config,
+        # The stub model ignores its chat handler, so no CLIP model is loaded
+        model_loader=ModelLoader(config, model_factory=model_factory, chat_handler_factory=lambda clip_model_path: None),
+        action_executor=ActionExecutor(screen_capture=capture_factory(), input_backend=NoOpInputBackend(), config=config),
+        capture_factory=capture_factory
+    )
+
+    start = time.perf_counter()
+    agent.start()
+    elapsed = time.perf_counter() - start
+
+    snapshot = agent.metrics.snapshot()
+    stages = {}
+    for name, hist in snapshot["histograms"].items():
+        stages[name] = {key: hist[key] for key in ("count", "mean", "min", "max", "sum")}
+
+    return {
+        "steps": agent.steps_completed,
+        "elapsed_seconds": elapsed,
+        "steps_per_second": agent.steps_completed / elapsed if elapsed > 0 else 0.0,
+        "actions": agent.actions_completed,
+        "actions_per_second": agent.actions_completed / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "stages": stages,
+        "settle": agent.settle_scheduler.get_stats() if agent.settle_scheduler else {},
+        "load_times": dict(agent.model_loader.load_times),
+        "config": {key: config[key] for key in sorted(overrides or {})},
+        "token_latency": token_latency,
+        "prompt_token_latency": prompt_token_latency,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline agent loop benchmark")
+    parser.add_argument("--frames", required=True, help="Directory of recorded screenshots")
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0, help="Seconds per evaluated prompt token")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=JSON",
+                        help="Config override, e.g. --set use_vision_model=true")
+    parser.add_argument("--responses", help="JSON file with a list of responses for the stub model to cycle through")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    overrides = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+
+    responses = None
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+
+    results = run_benchmark(args.frames, args.steps, args.token_latency, args.prompt_token_latency, overrides, responses)
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for screen capture.
+
+Compares the one-shot capture_screen path against a persistent ScreenCapture
+session. Requires a display.
+
+Usage: python -m Client.benchmarks.bench_capture --frames 100
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from ..control.screenshot import capture_screen, ScreenCapture
+
+def _measure(fn, frames, warmup):
+    for _ in range(warmup):
+        fn()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        fn()
+    elapsed = time.perf_counter() - start
+
+    # Allocation is measured in a separate pass so tracing does not skew timing
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    allocated = 0
+    for _ in range(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return {
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "ms_per_frame": elapsed * 1000 / frames,
+        "bytes_allocated_per_capture": allocated // frames,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen capture micro-benchmark")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"capture_screen": _measure(capture_screen, args.frames, args.warmup)}
+
+    session = ScreenCapture()
+    try:
+        results["ScreenCapture.grab"] = _measure(session.grab, args.frames, args.warmup)
+        results["ScreenCapture.grab+to_image"] = _measure(
+            lambda: session.grab().to_image(), args.frames, args.warmup
+        )
+    finally:
+        session.close()
+
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
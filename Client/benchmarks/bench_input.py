@@ -0,0 +1,76 @@
+"""
+Input backend latency benchmark.
+
+Times each input action (screen size lookup, instant move, click, key
+press, typing) on every available backend and reports per-action
+latency as JSON. It needs an X display; run it headlessly with:
+
+    xvfb-run -a python -m Client.benchmarks.bench_input --iterations 200
+
+Events go to whatever window has focus, so do not run it on a desktop
+you are using.
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from ..control import backends
+
+def _time_action(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+
+def bench_backend(backend, iterations, text="hello world"):
+    width, height = backend.size()
+    # Stay clear of the edges: a pointer left in a corner trips the fail-safe
+    # and every later action would fail
+    margin = max(1, min(width, height) // 10)
+    positions = [
+        (margin + i * 37 % (width - 2 * margin), margin + i * 53 % (height - 2 * margin))
+        for i in range(iterations)
+    ]
+    moves = iter(positions * 2)
+    return {
+        "size": _time_action(backend.size, iterations),
+        "move_to": _time_action(lambda: backend.move_to(*next(moves)), iterations),
+        "click": _time_action(backend.click, iterations),
+        "press": _time_action(lambda: backend.press("shift"), iterations),
+        "write": _time_action(lambda: backend.write(text), max(1, iterations // 10)),
+    }
+
+def run_benchmark(names, iterations):
+    results = {}
+    for name in names:
+        try:
+            backend = backends.create_backend(name)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = bench_backend(backend, iterations)
+        if hasattr(backend, "close"):
+            backend.close()
+    return {"iterations": iterations, "backends": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Input backend latency benchmark")
+    parser.add_argument("--backends", nargs="+", default=["xtest", "pyautogui"])
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print(json.dumps(run_benchmark(args.backends, args.iterations), indent=4))
+
+if __name__ == "__main__":
+    main()
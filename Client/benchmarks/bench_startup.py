@@ -0,0 +1,180 @@
+"""
+Startup-time benchmark.
+
+Starts a fresh interpreter per run with -X importtime and reports how long
+the client takes to reach each phase, counted from process spawn:
+
+- config: Client.main imported and the configuration loaded.
+- agent: the Agent constructed and its models loaded.
+- first_action: the first action executed.
+
+Each phase also reports total import time, the slowest imports and which
+heavy dependencies (llama_cpp, numpy, mss, PIL, pyautogui) were loaded.
+By default the agent runs the stub model on recorded screenshots with a
+no-op input backend; pass --config to load the real models it names.
+
+Usage: python -m Client.benchmarks.bench_startup --frames path/to/screens --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PHASES = ("config", "agent", "first_action")
+HEAVY_MODULES = ("llama_cpp", "numpy", "mss", "PIL", "pyautogui")
+IMPORTTIME_PREFIX = "import time:"
+
+def parse_importtime(stderr):
+    """Returns [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith(IMPORTTIME_PREFIX):
+            continue
+        fields = line[len(IMPORTTIME_PREFIX):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        imports.append((stripped, int(fields[0]), int(fields[1]), (len(name) - len(stripped) - 1) // 2))
+    return imports
+
+def _stub_config(config, work_dir):
+    config.settings.update({
+        "model_path": "stub.gguf",
+        "adaptive_settle": False,
+        "step_delay": 0.0,
+        "high_memory_path": os.path.join(work_dir, "high_memory.db"),
+        "vision_cache_path": "",
+        "prompt_cache_dir": "",
+    })
+
+def run_phase(phase, frames_dir, config_path=None, overrides=None):
+    """Runs phase in this process; returns time.time() at which it was ready."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Everything `python -m Client.main` imports before deciding whether to run
+        from .. import main  # noqa: F401
+        from ..config.settings import ConfigLoader
+        # Without --config, use a scratch file so the user's client_config.json is untouched
+        config = ConfigLoader(config_path or os.path.join(work_dir, "client_config.json"))
+        if config_path:
+            config.validate()
+        else:
+            _stub_config(config, work_dir)
+        config.settings.update(overrides or {})
+        if phase == "config":
+            return time.time()
+
+        from functools import partial
+        from ..control.actions import ActionExecutor
+        from ..control.backends import NoOpInputBackend
+        from ..core.agent import Agent
+        from ..llm.model_loader import ModelLoader
+        from .replay import ReplayCapture, StubLlama
+
+        model_loader = ModelLoader(config) if config_path else ModelLoader(
+            config, model_factory=StubLlama, chat_handler_factory=lambda clip_model_path: None
+        )
+        capture_factory = partial(ReplayCapture, frames_dir)
+        executor = ActionExecutor(screen_capture=capture_factory(), input_backend=NoOpInputBackend(), config=config)
+        if phase == "agent":
+            agent = Agent(config, model_loader=model_loader, action_executor=executor, capture_factory=capture_factory)
+            agent.model_loader.load_models()
+            ready = time.time()
+            agent.model_loader.unload_models()
+            return ready
+
+        # Shutdown after the first step is not part of time-to-first-action
+        first_action = []
+        for name in ("execute", "execute_batch"):
+            def timed(*args, _method=getattr(executor, name), **kwargs):
+                result = _method(*args, **kwargs)
+                if not first_action:
+                    first_action.append(time.time())
+                return result
+            setattr(executor, name, timed)
+        config.settings["max_steps"] = 1
+        agent = Agent(config, model_loader=model_loader, action_executor=executor, capture_factory=capture_factory)
+        agent.start()
+        if not first_action:
+            raise RuntimeError("The agent stopped before executing an action")
+        return first_action[0]
+
+def measure(phase, args, top):
+    command = [sys.executable, "-X", "importtime", "-m", __spec__.name, "--child", phase, "--frames", args.frames]
+    if args.config:
+        command += ["--config", args.config]
+    for item in args.set:
+        command += ["--set", item]
+    spawned = time.time()
+    proc = subprocess.run(command, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{phase} run failed:\n{proc.stderr[-4000:]}")
+    ready = json.loads(proc.stdout.strip().splitlines()[-1])["ready"]
+    imports = parse_importtime(proc.stderr)
+    loaded = {name for name, _, _, _ in imports}
+    slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "ready_seconds": ready - spawned,
+        "import_seconds": sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1e6,
+        "modules": len(imports),
+        "heavy_modules": [name for name in HEAVY_MODULES if name in loaded],
+        "slowest_imports": [{"module": name, "self_ms": us / 1000} for name, us, _, _ in slowest],
+    }
+
+def summarize(runs):
+    ready = [run["ready_seconds"] for run in runs]
+    imports = [run["import_seconds"] for run in runs]
+    # The slowest imports and loaded modules come from the median run
+    median_run = sorted(runs, key=lambda run: run["ready_seconds"])[len(runs) // 2]
+    return {
+        "runs": len(runs),
+        "ready_seconds": {"median": statistics.median(ready), "min": min(ready), "max": max(ready)},
+        "import_seconds": {"median": statistics.median(imports), "min": min(imports), "max": max(imports)},
+        "modules": median_run["modules"],
+        "heavy_modules": median_run["heavy_modules"],
+        "slowest_imports": median_run["slowest_imports"],
+    }
+
+def _parse_overrides(items):
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time-to-ready benchmark")
+    parser.add_argument("--frames", required=True, help="Directory of recorded screenshots")
+    parser.add_argument("--config", help="Client config to load real models from (default: stub model)")
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=list(PHASES))
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes per phase")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to report")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=JSON",
+                        help="Config override, e.g. --set use_vision_model=true")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--child", choices=PHASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        ready = run_phase(args.child, args.frames, args.config, _parse_overrides(args.set))
+        print(json.dumps({"ready": ready}))
+        return
+
+    results = {"python": sys.version.split()[0], "phases": {}}
+    for phase in args.phases:
+        results["phases"][phase] = summarize([measure(phase, args, args.top) for _ in range(max(1, args.repeat))])
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
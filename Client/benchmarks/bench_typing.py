@@ -0,0 +1,105 @@
+"""
+Typing throughput benchmark.
+
+Types sample texts through TypingEngine with each strategy and reports
+characters per second as JSON. With --backend pyautogui the keystrokes go
+to the focused window (use a scratch editor); the default simulated
+backend models per-keystroke injection cost without a display.
+
+With the defaults, fast types at typing_interval like per_char; pass
+--set typing_fast_interval=0 to measure unthrottled keystrokes.
+
+Usage: python -m Client.benchmarks.bench_typing --lengths 20 200 2000
+"""
+import argparse
+import json
+import logging
+import time
+
+from ..config.settings import DEFAULT_CONFIG
+from ..control import backends
+from ..control.keyboard import TypingEngine
+
+class SimulatedInputBackend(backends.NoOpInputBackend):
+    """No-op backend that sleeps like pyautogui: key_cost per keystroke plus the interval."""
+    name = "simulated"
+
+    def __init__(self, key_cost=0.001, **kwargs):
+        super().__init__(**kwargs)
+        self.key_cost = key_cost
+
+    def write(self, text, interval=0.0):
+        super().write(text, interval)
+        time.sleep(len(text) * (self.key_cost + interval))
+
+    def hotkey(self, *keys):
+        super().hotkey(*keys)
+        time.sleep(len(keys) * self.key_cost)
+
+class MemoryClipboard:
+    def __init__(self):
+        self.text = ""
+
+    def copy(self, text):
+        self.text = text
+
+    def paste(self):
+        return self.text
+
+def run_benchmark(lengths, backend="simulated", key_cost=0.001, overrides=None):
+    config = dict(DEFAULT_CONFIG)
+    config.update(overrides or {})
+    if backend == "pyautogui":
+        input_backend = backends.PyAutoGUIBackend()
+        clipboard = None
+    else:
+        input_backend = SimulatedInputBackend(key_cost=key_cost)
+        clipboard = MemoryClipboard()
+
+    results = []
+    for length in lengths:
+        text = ("The quick brown fox jumps over the lazy dog. " * (length // 45 + 1))[:length]
+        for strategy in TypingEngine.STRATEGIES:
+            engine = TypingEngine(
+                interval=config["typing_interval"],
+                fast_interval=config["typing_fast_interval"],
+                # Force the strategy under test
+                paste_threshold=1 if strategy == "paste" else 0,
+                paste_chunk_size=config["typing_paste_chunk_size"],
+                paste_delay=config["typing_paste_delay"],
+                paste_keys=config["typing_paste_keys"],
+                clipboard=clipboard,
+                backend=input_backend
+            )
+            engine.type_text(text, per_char=strategy == "per_char")
+            for used, stats in engine.get_stats().items():
+                results.append({"length": length, "strategy": used, "seconds": stats["seconds"],
+                                "chars_per_second": stats["chars_per_second"]})
+        auto = TypingEngine(
+            interval=config["typing_interval"],
+            fast_interval=config["typing_fast_interval"],
+            paste_threshold=config["typing_paste_threshold"],
+            clipboard=clipboard
+        ).choose_strategy(text)
+        results.append({"length": length, "strategy": "auto", "chooses": auto})
+    return {"backend": backend, "key_cost": key_cost, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Typing throughput benchmark")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--backend", choices=["simulated", "pyautogui"], default="simulated")
+    parser.add_argument("--key-cost", type=float, default=0.001, help="Simulated seconds per injected keystroke")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=JSON",
+                        help="Override a config value, e.g. --set typing_interval=0.02")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    overrides = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        overrides[key] = json.loads(value)
+
+    print(json.dumps(run_benchmark(args.lengths, args.backend, args.key_cost, overrides), indent=4))
+
+if __name__ == "__main__":
+    main()
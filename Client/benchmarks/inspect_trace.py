@@ -0,0 +1,37 @@
+"""
+Inspects a session trace recorded with trace_dir.
+
+Usage:
+    python -m Client.benchmarks.inspect_trace TRACE_DIR              # summary
+    python -m Client.benchmarks.inspect_trace TRACE_DIR --step 12    # one step as JSON
+    python -m Client.benchmarks.inspect_trace TRACE_DIR --frame 12 --output frame.png
+"""
+import argparse
+import json
+from pathlib import Path
+
+from ..core.trace import TraceReader
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a session trace")
+    parser.add_argument("trace_dir")
+    parser.add_argument("--step", type=int, help="Print this step (0-based) as JSON")
+    parser.add_argument("--frame", type=int, help="Save this step's frame to --output")
+    parser.add_argument("--output", default="frame.png")
+    args = parser.parse_args()
+
+    with TraceReader(args.trace_dir) as reader:
+        if args.step is not None:
+            print(json.dumps(reader.step(args.step), indent=4))
+        elif args.frame is not None:
+            data = reader.frame_bytes(args.frame)
+            if data is None:
+                print(f"Step {args.frame} has no frame")
+                return
+            Path(args.output).write_bytes(data)
+            print(f"Wrote {args.output}")
+        else:
+            print(json.dumps({"steps": len(reader), "frames": reader.frame_count, **reader.info}, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Offline replay components for benchmarking the agent loop without a
+display or a real GGUF model.
+"""
+import itertools
+import json
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ..control.screenshot import Frame
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp", ".webp"}
+
+DEFAULT_RESPONSES = [
+    {"action": "move_to", "params": {"x": 640, "y": 360}},
+    {"action": "left_click", "params": {"x": 200, "y": 150}},
+    {"action": "type_text", "params": {"text": "hello world"}},
+    {"action": "press_key", "params": {"key": "enter"}},
+    {"action": "hotkey", "params": {"keys": ["ctrl", "s"]}},
+]
+
+class ReplayCapture:
+    """
+    ScreenCapture stand-in that replays recorded screenshots from a directory.
+    Frames are decoded to BGRA once at load time and cycled on each grab.
+    """
+    def __init__(self, directory, limit=None):
+        paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        if limit:
+            paths = paths[:limit]
+        if not paths:
+            raise ValueError(f"No screenshots found in {directory}")
+        self.frames = [self._load(p) for p in paths]
+        self.region = None
+        self._index = 0
+
+    @staticmethod
+    def _load(path):
+        rgba = np.asarray(Image.open(path).convert("RGBA"))
+        # Match mss' BGRA layout
+        return np.ascontiguousarray(rgba[..., [2, 1, 0, 3]])
+
+    def grab(self, region=None):
+        array = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        if region:
+            left, top, width, height = region
+            array = np.ascontiguousarray(array[top:top + height, left:left + width])
+        return Frame(array, region, time.time())
+
+    def capture(self, region=None):
+        return self.grab(region).to_image()
+
+    def close(self):
+        pass
+
+class _StubState:
+    def __init__(self, input_ids, n_tokens):
+        self.input_ids = input_ids
+        self.n_tokens = n_tokens
+
+class StubLlama:
+    """
+    Deterministic stand-in for llama_cpp.Llama.
+
+    Tokenizes on whitespace, models KV prefix reuse like llama-cpp, and
+    sleeps prompt_token_latency per evaluated prompt token and
+    token_latency per generated token. Completions cycle through responses.
+    With a draft_model, completions are generated word by word and each
+    decode pass verifies the drafted words, costing token_latency once plus
+    prompt_token_latency per drafted word. As in llama.cpp, the drafts of
+    the last pass are left unverified in input_ids.
+    """
+    def __init__(self, model_path=None, chat_handler=None, n_ctx=2048, token_latency=0.02,
+                 prompt_token_latency=0.0005, responses=None, description=None, draft_model=None, **kwargs):
+        self.model_path = model_path
+        self.chat_handler = chat_handler
+        self.n_ctx = n_ctx
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.draft_model = draft_model
+        self.description = description or "A desktop with a text editor window open in the centre of the screen."
+        self._responses = itertools.cycle([json.dumps(r) for r in (responses or DEFAULT_RESPONSES)])
+        self._input_ids = np.zeros(0, dtype=np.intc)
+        self.n_tokens = 0
+
+    @property
+    def input_ids(self):
+        return self._input_ids[:self.n_tokens]
+
+    def tokenize(self, text, add_bos=True, special=False):
+        tokens = [zlib.crc32(word) % 32000 for word in text.split()]
+        return ([1] + tokens) if add_bos else tokens
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        tokens = np.asarray(tokens, dtype=np.intc)
+        time.sleep(self.prompt_token_latency * len(tokens))
+        self._input_ids = np.concatenate([self.input_ids, tokens])
+        self.n_tokens = len(self._input_ids)
+
+    def save_state(self):
+        return _StubState(self._input_ids.copy(), self.n_tokens)
+
+    def load_state(self, state):
+        self._input_ids = state.input_ids.copy()
+        self.n_tokens = state.n_tokens
+
+    def _evaluate_prompt(self, prompt):
+        tokens = self.tokenize(prompt.encode("utf-8"))
+        cached = self.input_ids
+        n = min(len(tokens) - 1, len(cached))
+        reused = 0
+        while reused < n and cached[reused] == tokens[reused]:
+            reused += 1
+        self.n_tokens = reused
+        self.eval(tokens[reused:])
+        return len(tokens)
+
+    def _chunks(self, text):
+        # Roughly four characters per token
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def _speculate(self, words):
+        """Yields words, several per decode pass when the draft model guesses them."""
+        targets = self.tokenize(" ".join(words).encode("utf-8"), add_bos=False)
+        i = 0
+        while i < len(targets):
+            draft = self.draft_model(self.input_ids)
+            accepted = 0
+            while accepted < len(draft) and i + accepted + 1 < len(targets) and draft[accepted] == targets[i + accepted]:
+                accepted += 1
+            time.sleep(self.token_latency + self.prompt_token_latency * len(draft))
+            # The accepted drafts plus the token sampled after them
+            count = accepted + 1
+            if i + count < len(targets) or accepted == len(draft):
+                # Rejected drafts are dropped and the sampled token takes their place
+                evaluated = targets[i:i + count]
+            else:
+                # Generation ends before the last draft is checked; like llama.cpp,
+                # its unverified tokens stay in input_ids
+                evaluated = list(targets[i:i + accepted]) + list(draft[accepted:])
+            self._input_ids = np.concatenate([self.input_ids, np.asarray(evaluated, dtype=np.intc)])
+            self.n_tokens = len(self._input_ids)
+            for word in words[i:i + count]:
+                yield word + " "
+            i += count
+
+    def __call__(self, prompt, max_tokens=16, stop=None, echo=False, stream=False, grammar=None, **kwargs):
+        prompt_tokens = self._evaluate_prompt(prompt)
+        if self.draft_model is not None:
+            words = next(self._responses).split()[:max_tokens]
+            if stream:
+                return ({"choices": [{"text": word}]} for word in self._speculate(words))
+            text = "".join(self._speculate(words))
+            return {
+                "choices": [{"text": text}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words)},
+            }
+        chunks = self._chunks(next(self._responses))[:max_tokens]
+        if stream:
+            return self._stream(chunks)
+        time.sleep(self.token_latency * len(chunks))
+        return {
+            "choices": [{"text": "".join(chunks)}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(chunks)},
+        }
+
+    def _stream(self, chunks):
+        for chunk in chunks:
+            time.sleep(self.token_latency)
+            yield {"choices": [{"text": chunk}]}
+
+    def embed(self, input, normalize=False, truncate=True, return_count=False):
+        # Hashed bag of words: texts sharing words get similar vectors
+        texts = [input] if isinstance(input, str) else input
+        vectors = []
+        for text in texts:
+            vector = np.zeros(256, dtype=np.float32)
+            for word in text.split():
+                vector[zlib.crc32(word.encode("utf-8")) % 256] += 1.0
+            time.sleep(self.prompt_token_latency * len(text.split()))
+            vectors.append(vector.tolist())
+        return vectors[0] if isinstance(input, str) else vectors
+
+    def create_chat_completion(self, messages, max_tokens=512, stream=False, **kwargs):
+        # A system message means single-pass mode: answer with an action, not a description
+        if any(m.get("role") == "system" for m in messages):
+            parts = [
+                m["content"] if isinstance(m["content"], str)
+                else " ".join(c.get("text", "") for c in m["content"] if c.get("type") == "text")
+                for m in messages
+            ]
+            # Like the llava handler, re-evaluate the whole prompt on every call
+            self.reset()
+            self._evaluate_prompt(" ".join(parts))
+            text = next(self._responses)
+        else:
+            text = self.description
+        chunks = self._chunks(text)[:max_tokens]
+        if stream:
+            return ({"choices": [{"delta": {"content": chunk}}]} for chunk in self._stream_text(chunks))
+        time.sleep(self.token_latency * len(chunks))
+        return {
+            "choices": [{"message": {"role": "assistant", "content": "".join(chunks)}}],
+            "usage": {"completion_tokens": len(chunks)},
+        }
+
+    def _stream_text(self, chunks):
+        for chunk in chunks:
+            time.sleep(self.token_latency)
+            yield chunk
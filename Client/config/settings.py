@@ -14,8 +14,82 @@ DEFAULT_CONFIG = {
     "clip_model_path": "",
     "context_size": 2048,
     "n_gpu_layers": 0,
+    "input_backend": "auto",
     "typing_interval": 0.05,
-    "action_duration": 0.2
+    "typing_fast_interval": None,
+    "typing_paste_threshold": 0,
+    "typing_paste_chunk_size": 1000,
+    "typing_paste_delay": 0.05,
+    "typing_paste_keys": [],
+    "action_duration": 0.2,
+    "drag_duration": 0.5,
+    "vision_cache_enabled": False,
+    "vision_cache_size": 64,
+    "vision_cache_max_distance": 0,
+    "vision_cache_hash_size": 16,
+    "vision_cache_path": "",
+    "screenshot_format": "png",
+    "screenshot_quality": 85,
+    "screenshot_max_dimension": 0,
+    "prompt_cache_dir": "",
+    "stream_completion": True,
+    "speculative_decoding": "",
+    "speculative_draft_model_path": "",
+    "speculative_num_pred_tokens": 10,
+    "speculative_max_ngram_size": 2,
+    "constrained_decoding": True,
+    "pipeline_mode": False,
+    "adaptive_settle": True,
+    "settle_stable_window": 0.3,
+    "settle_poll_interval": 0.05,
+    "settle_min_wait": 0.1,
+    "settle_max_wait": 5.0,
+    "settle_action_waits": {
+        "add_to_high_memory": [0.0, 0.0],
+        "screenshot": [0.0, 0.0],
+        "zoom": [0.0, 0.0],
+        "reset_zoom": [0.0, 0.0]
+    },
+    "metrics_enabled": False,
+    "metrics_jsonl_path": "",
+    "metrics_interval": 10.0,
+    "metrics_port": 0,
+    "profile_iterations": 0,
+    "profile_output_dir": "",
+    "step_delay": 1.0,
+    "max_batch_actions": 4,
+    "trace_dir": "",
+    "trace_chunk_size": 67108864,
+    "trace_max_pending_bytes": 67108864,
+    "trace_prompt_keyframe_interval": 50,
+    "batch_step_delay": 0.1,
+    "max_steps": 0,
+    "max_tokens": 512,
+    "context_safety_margin": 32,
+    "high_memory_path": "",
+    "high_memory_limit": 1000,
+    "high_memory_sync": "normal",
+    "episodic_memory_enabled": False,
+    "embedding_model_path": "",
+    "embedding_context_size": 512,
+    "episodic_top_k": 5,
+    "episodic_min_score": 0.0,
+    "episodic_approximate_threshold": 5000,
+    "event_metadata_budget": 65536,
+    "event_spill_dir": "",
+    "inference_server_url": "",
+    "inference_server_timeout": 300.0,
+    "n_threads": 0,
+    "n_batch": 512,
+    "use_mmap": True,
+    "use_mlock": False,
+    "prewarm_models": False,
+    "lazy_vision_model": False,
+    "model_warmup": True,
+    "single_pass_multimodal": False,
+    "multimodal_image_tokens": 576,
+    "observation_providers": [],
+    "observation_provider_options": {}
 }
 
 logger = logging.getLogger(__name__)
@@ -113,16 +187,31 @@ Comment=LLM Computer Control Client
         return str(path.resolve())
 
     def validate(self):
-        self.settings["model_path"] = self._resolve_model_path(
-            self.settings.get("model_path"), "model_path"
-        )
+        # Models are loaded by the inference server, not from local paths
+        if self.settings.get("inference_server_url"):
+            return
+
+        # In single-pass mode the multimodal model replaces the text model
+        single_pass = self.settings.get("single_pass_multimodal")
+        if not single_pass:
+            self.settings["model_path"] = self._resolve_model_path(
+                self.settings.get("model_path"), "model_path"
+            )
 
         # Validate vision settings if enabled
-        if self.settings.get("use_vision_model"):
+        if self.settings.get("use_vision_model") or single_pass:
             for field in ["vision_model_path", "clip_model_path"]:
                 self.settings[field] = self._resolve_model_path(
                     self.settings.get(field), field
                 )
 
+        speculative = self.settings.get("speculative_decoding") or ""
+        if speculative not in ("", "prompt_lookup", "draft_model"):
+            raise ValueError(f"Configuration Error: unknown speculative_decoding mode '{speculative}'.")
+        if speculative == "draft_model" and not single_pass:
+            self.settings["speculative_draft_model_path"] = self._resolve_model_path(
+                self.settings.get("speculative_draft_model_path"), "speculative_draft_model_path"
+            )
+
     def get(self, key, default=None):
         return self.settings.get(key, default)
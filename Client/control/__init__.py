@@ -1,4 +1,27 @@
-from .mouse import move_to, left_click, right_click, drag
-from .keyboard import type_text, press_key, hotkey
-from .screenshot import capture_screen, image_to_base64
-from .actions import ActionExecutor
+from .._lazy import lazy_exports
+
+_EXPORTS = {
+    "move_to": ".mouse",
+    "left_click": ".mouse",
+    "right_click": ".mouse",
+    "drag": ".mouse",
+    "type_text": ".keyboard",
+    "press_key": ".keyboard",
+    "hotkey": ".keyboard",
+    "capture_screen": ".screenshot",
+    "image_to_base64": ".screenshot",
+    "ScreenCapture": ".screenshot",
+    "Frame": ".screenshot",
+    "ImageEncoder": ".screenshot",
+    "LazyScreenshot": ".screenshot",
+    "ActionExecutor": ".actions",
+    "get_backend": ".backends",
+    "set_backend": ".backends",
+    "create_backend": ".backends",
+    "NoOpInputBackend": ".backends",
+    "XTestBackend": ".backends",
+    "Viewport": ".viewport"
+}
+
+__all__ = list(_EXPORTS)
+__getattr__ = lazy_exports(globals(), _EXPORTS)
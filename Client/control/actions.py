@@ -1,19 +1,160 @@
 import os
 import sys
+import time
+import inspect
 import logging
-from . import mouse, keyboard, screenshot
+from functools import partial
+from . import mouse, keyboard, screenshot, backends, viewport
+
+# JSON schema types for parameters whose default does not reveal their type
+PARAM_TYPE_HINTS = {
+    "x": {"type": "integer"},
+    "y": {"type": "integer"},
+    "start_x": {"type": "integer"},
+    "start_y": {"type": "integer"},
+    "end_x": {"type": "integer"},
+    "end_y": {"type": "integer"},
+    "width": {"type": "integer"},
+    "height": {"type": "integer"},
+    "text": {"type": "string"},
+    "key": {"type": "string"},
+    "keys": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+    "content": {"type": "string"},
+    "tags": {"type": "array", "items": {"type": "string"}},
+    "region": {"type": "array", "items": {"type": "integer"}, "minItems": 4, "maxItems": 4},
+}
+
+# Timing, the input backend and the viewport are controlled by the executor, not by the model
+NON_MODEL_PARAMS = {"duration", "interval", "backend", "viewport"}
+
+# Actions that change what the model is looking at; later steps of a batch
+# would refer to a view it has not seen, so these may only end a batch
+BATCH_FINAL_ACTIONS = {"screenshot", "zoom", "reset_zoom"}
+
+# Upper bound for a model-requested wait between batch steps, in seconds
+MAX_STEP_WAIT = 5.0
+
+def _param_schema(param):
+    if param.name in PARAM_TYPE_HINTS:
+        return dict(PARAM_TYPE_HINTS[param.name])
+    default = param.default
+    if isinstance(default, bool):
+        return {"type": "boolean"}
+    if isinstance(default, int):
+        return {"type": "integer"}
+    if isinstance(default, float):
+        return {"type": "number"}
+    if isinstance(default, str):
+        return {"type": "string"}
+    return {}
+
+def build_action_schema(actions, max_batch_actions=1):
+    """
+    Builds a JSON schema matching any valid action request for the given
+    {name: function} table, derived from the functions' signatures.
+    With max_batch_actions > 1 it also matches a batch request:
+    {"actions": [{"action": ..., "params": ..., "wait": seconds}, ...]}.
+    """
+    variants = _action_variants(actions)
+    if max_batch_actions <= 1:
+        return {"anyOf": variants}
+    steps = []
+    for variant in variants:
+        step = dict(variant, properties=dict(variant["properties"], wait={"type": "number"}))
+        steps.append(step)
+    batch = {
+        "type": "object",
+        "properties": {
+            "actions": {"type": "array", "items": {"anyOf": steps}, "minItems": 1, "maxItems": max_batch_actions}
+        },
+        "required": ["actions"],
+        "additionalProperties": False
+    }
+    return {"anyOf": variants + [batch]}
+
+def _action_variants(actions):
+    variants = []
+    for name, func in actions.items():
+        properties = {}
+        required = []
+        for param in inspect.signature(func).parameters.values():
+            if param.name in NON_MODEL_PARAMS or param.kind == param.VAR_KEYWORD:
+                continue
+            properties[param.name] = _param_schema(param)
+            if param.kind == param.VAR_POSITIONAL or param.default is param.empty:
+                required.append(param.name)
+        variants.append({
+            "type": "object",
+            "properties": {
+                "action": {"const": name},
+                "params": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": required,
+                    "additionalProperties": False
+                }
+            },
+            "required": ["action", "params"],
+            "additionalProperties": False
+        })
+    return variants
+
+def _bind_variadic(signature, params, action_name):
+    """
+    Splits params into (args, kwargs) for a call. A variadic parameter
+    (e.g. hotkey(*keys)) must be given as a list; raises ValueError otherwise.
+    """
+    kwargs = dict(params)
+    for name in NON_MODEL_PARAMS & kwargs.keys():
+        raise ValueError(f"Invalid params for action {action_name}: '{name}' cannot be set by the model")
+    args = ()
+    for param in signature.parameters.values():
+        if param.kind == param.VAR_POSITIONAL and param.name in kwargs:
+            value = kwargs.pop(param.name)
+            if not isinstance(value, list):
+                raise ValueError(f"Invalid {param.name} for action {action_name}: expected a list")
+            args = tuple(value)
+    return args, kwargs
+
+def is_batch_request(action_request):
+    return isinstance(action_request, dict) and "actions" in action_request and "action" not in action_request
 
 class ActionExecutor:
-    def __init__(self):
+    def __init__(self, screen_capture=None, input_backend=None, config=None):
+        config = config or {}
+        self.screen_capture = screen_capture or screenshot.ScreenCapture()
+        # Each executor drives its own backend; nothing process-wide is changed
+        self.backend = input_backend or backends.create_backend(config.get("input_backend", "auto"))
+        self._owns_backend = input_backend is None
+        logging.info("Using %s input backend", getattr(self.backend, "name", type(self.backend).__name__))
+        self.typing_engine = keyboard.TypingEngine(
+            interval=config.get("typing_interval", 0.05),
+            fast_interval=config.get("typing_fast_interval"),
+            paste_threshold=config.get("typing_paste_threshold", 0),
+            paste_chunk_size=config.get("typing_paste_chunk_size", 1000),
+            paste_delay=config.get("typing_paste_delay", 0.05),
+            paste_keys=config.get("typing_paste_keys"),
+            backend=self.backend
+        )
+        # inspect.signature per action function, computed on first use
+        self._signatures = {}
+        # Maps the observed image to the screen; updated by the agent for each observation
+        self.viewport = viewport.Viewport()
+        # Timing comes from configuration; the model only supplies positions
+        duration = config.get("action_duration", 0.2)
+        backend = self.backend
+        view = self.viewport
         self.actions = {
-            "move_to": mouse.move_to,
-            "left_click": mouse.left_click,
-            "right_click": mouse.right_click,
-            "drag": mouse.drag,
-            "type_text": keyboard.type_text,
-            "press_key": keyboard.press_key,
-            "hotkey": keyboard.hotkey,
-            "screenshot": screenshot.capture_screen
+            "move_to": partial(mouse.move_to, duration=duration, backend=backend, viewport=view),
+            "left_click": partial(mouse.left_click, duration=duration, backend=backend, viewport=view),
+            "right_click": partial(mouse.right_click, duration=duration, backend=backend, viewport=view),
+            "drag": partial(mouse.drag, duration=config.get("drag_duration", 0.5), backend=backend, viewport=view),
+            "type_text": self.typing_engine.type_text,
+            "press_key": partial(keyboard.press_key, backend=backend),
+            "hotkey": partial(keyboard.hotkey, backend=backend),
+            "screenshot": self.screen_capture.capture,
+            "zoom": partial(viewport.zoom, viewport=view),
+            "reset_zoom": partial(viewport.reset_zoom, viewport=view)
         }
         self._check_platform()
 
@@ -23,6 +164,21 @@ class ActionExecutor:
             if session_type == "wayland":
                 logging.warning("Wayland detected. Input injection may fail. X11 is recommended.")
 
+    def get_action_schema(self, extra_actions=None, max_batch_actions=1):
+        """
+        Returns a JSON schema for all executable actions, plus any
+        extra_actions ({name: function}) handled outside the executor.
+        """
+        actions = dict(self.actions)
+        if extra_actions:
+            actions.update(extra_actions)
+        return build_action_schema(actions, max_batch_actions)
+
+    def close(self):
+        self.screen_capture.close()
+        if self._owns_backend and hasattr(self.backend, "close"):
+            self.backend.close()
+
     def execute(self, action_request):
         """
         action_request: dict with "action" and "params"
@@ -42,14 +198,104 @@ class ActionExecutor:
         if action_name not in self.actions:
             return {"status": "error", "message": f"Unknown action: {action_name}"}
 
+        return self._call(action_name, self.actions[action_name], params)
+
+    def _signature(self, func):
+        signature = self._signatures.get(func)
+        if signature is None:
+            signature = self._signatures[func] = inspect.signature(func)
+        return signature
+
+    def _call(self, action_name, func, params):
         try:
-            func = self.actions[action_name]
-            result = func(**params)
+            args, kwargs = _bind_variadic(self._signature(func), params, action_name)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        try:
+            result = func(*args, **kwargs)
             return {"status": "success", "result": result}
         except Exception as e:
             logging.exception("Action execution failed: %s", e)
             return {"status": "error", "message": str(e)}
 
+    def execute_batch(self, batch_request, extra_actions=None, max_actions=0, step_delay=0.0):
+        """
+        Executes {"actions": [action_request, ...]} in order.
+
+        Every step is validated before the first one runs, so a malformed
+        batch has no effect. Each step may carry "wait" (seconds to pause
+        after it); otherwise step_delay is used between steps. Execution
+        stops at the first failing step and the results so far are returned.
+        extra_actions ({name: function}) are actions handled outside the
+        executor, e.g. memory writes.
+        """
+        actions = dict(self.actions)
+        if extra_actions:
+            actions.update(extra_actions)
+        steps = batch_request.get("actions") if isinstance(batch_request, dict) else None
+        if not isinstance(steps, list) or not steps:
+            return self._batch_result([], 0, "Invalid batch: 'actions' must be a non-empty list")
+        if max_actions and len(steps) > max_actions:
+            return self._batch_result([], len(steps), f"Invalid batch: {len(steps)} actions exceed the limit of {max_actions}")
+
+        for index, step in enumerate(steps):
+            error_msg = self._validate_step(step, actions, is_last=index == len(steps) - 1)
+            if error_msg:
+                return self._batch_result([], len(steps), f"Invalid step {index + 1}: {error_msg}")
+
+        results = []
+        for index, step in enumerate(steps):
+            action_name = step["action"].strip()
+            result = self._call(action_name, actions[action_name], step.get("params", {}))
+            result["action"] = action_name
+            results.append(result)
+            if result["status"] != "success":
+                message = f"Step {index + 1} ({action_name}) failed: {result.get('message')}"
+                return self._batch_result(results, len(steps), message)
+            if index < len(steps) - 1:
+                wait = step.get("wait", step_delay)
+                if wait > 0:
+                    time.sleep(min(wait, MAX_STEP_WAIT))
+        return self._batch_result(results, len(steps))
+
+    def _batch_result(self, results, total, error=None):
+        result = {
+            "status": "error" if error else "success",
+            "completed": sum(1 for r in results if r["status"] == "success"),
+            "total": total,
+            "results": results
+        }
+        if error:
+            result["message"] = error
+        return result
+
+    def _validate_step(self, step, actions, is_last):
+        """Returns an error message for an invalid batch step, or None."""
+        is_valid, error_msg = self.validate_request(step)
+        if not is_valid:
+            return error_msg
+        action_name = step["action"].strip()
+        if action_name not in actions:
+            return f"Unknown action: {action_name}"
+        if action_name in BATCH_FINAL_ACTIONS and not is_last:
+            return f"{action_name} changes the view and may only be the last action of a batch"
+        params = step.get("params", {})
+        if not isinstance(params, dict):
+            return f"Invalid params type: expected dict, got {type(params).__name__} for action {action_name}"
+        wait = step.get("wait", 0)
+        if isinstance(wait, bool) or not isinstance(wait, (int, float)) or wait < 0:
+            return f"Invalid wait for action {action_name}: must be a non-negative number of seconds"
+        signature = self._signature(actions[action_name])
+        try:
+            args, kwargs = _bind_variadic(signature, params, action_name)
+        except ValueError as e:
+            return str(e)
+        try:
+            signature.bind(*args, **kwargs)
+        except TypeError as e:
+            return f"Invalid params for action {action_name}: {e}"
+        return None
+
     def validate_request(self, action_request):
         if not isinstance(action_request, dict):
             return False, "Request must be a JSON object"
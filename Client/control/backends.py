@@ -0,0 +1,308 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+class PyAutoGUIBackend:
+    """Input backend that injects events through pyautogui."""
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        # Keep the fail-safe enabled: moving the mouse to a corner aborts the agent
+        pyautogui.FAILSAFE = True
+        self._pyautogui = pyautogui
+
+    def size(self):
+        return self._pyautogui.size()
+
+    def move_to(self, x, y, duration=0.0):
+        self._pyautogui.moveTo(x, y, duration=duration)
+
+    def click(self, button="left"):
+        self._pyautogui.click(button=button)
+
+    def drag_to(self, x, y, duration=0.0, button="left"):
+        self._pyautogui.dragTo(x, y, duration=duration, button=button)
+
+    def write(self, text, interval=0.0):
+        self._pyautogui.write(text, interval=interval)
+
+    def press(self, key):
+        self._pyautogui.press(key)
+
+    def hotkey(self, *keys):
+        self._pyautogui.hotkey(*keys)
+
+# pyautogui key names that differ from X keysym names
+XTEST_KEY_NAMES = {
+    "enter": "Return", "return": "Return", "\n": "Return", "\r": "Return",
+    "tab": "Tab", "\t": "Tab", "space": "space", " ": "space",
+    "esc": "Escape", "escape": "Escape", "backspace": "BackSpace",
+    "delete": "Delete", "del": "Delete", "insert": "Insert",
+    "home": "Home", "end": "End", "pageup": "Prior", "pgup": "Prior", "pagedown": "Next", "pgdn": "Next",
+    "up": "Up", "down": "Down", "left": "Left", "right": "Right",
+    "shift": "Shift_L", "shiftleft": "Shift_L", "shiftright": "Shift_R",
+    "ctrl": "Control_L", "ctrlleft": "Control_L", "ctrlright": "Control_R",
+    "alt": "Alt_L", "altleft": "Alt_L", "altright": "Alt_R", "option": "Alt_L",
+    "win": "Super_L", "winleft": "Super_L", "winright": "Super_R", "super": "Super_L", "command": "Super_L",
+    "capslock": "Caps_Lock", "numlock": "Num_Lock", "scrolllock": "Scroll_Lock",
+    "printscreen": "Print", "prtsc": "Print", "pause": "Pause", "menu": "Menu", "apps": "Menu",
+    "volumeup": "XF86AudioRaiseVolume", "volumedown": "XF86AudioLowerVolume", "volumemute": "XF86AudioMute",
+}
+
+XTEST_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+class FailSafeError(RuntimeError):
+    """The user moved the pointer into a screen corner to stop the agent."""
+
+class XTestBackend:
+    """
+    Input backend that injects events with the X11 XTEST extension.
+
+    Keeps one display connection, caches the screen size (refreshed when
+    the root window is resized, e.g. by RandR) and adds no pauses of its
+    own; only a non-zero move duration or typing interval takes time.
+    Like pyautogui, it refuses to act while the pointer is in a screen
+    corner, so the user can still stop the agent.
+    """
+    name = "xtest"
+    # Pointer motion steps per second when a move has a duration
+    MOTION_RATE = 60
+
+    def __init__(self, display=None, failsafe=True):
+        from Xlib import X, XK, display as xdisplay
+        from Xlib.ext import xtest
+        self._X = X
+        self._XK = XK
+        self._xtest = xtest
+        self._display = xdisplay.Display(display)
+        if not self._display.has_extension("XTEST"):
+            self._display.close()
+            raise RuntimeError("X server does not support the XTEST extension")
+        self._root = self._display.screen().root
+        self._lock = threading.Lock()
+        self._keycodes = {}
+        self.failsafe = failsafe
+        # Root resizes arrive as ConfigureNotify; RandR adds its own notification
+        self._root.change_attributes(event_mask=X.StructureNotifyMask)
+        if self._display.has_extension("RANDR"):
+            from Xlib.ext import randr
+            self._root.xrandr_select_input(randr.RRScreenChangeNotifyMask)
+        self._display.sync()
+        self._size = self._query_size()
+
+    def _query_size(self):
+        geometry = self._root.get_geometry()
+        return (geometry.width, geometry.height)
+
+    def size(self):
+        with self._lock:
+            # Only a pending change notification costs a round trip
+            if self._display.pending_events():
+                while self._display.pending_events():
+                    self._display.next_event()
+                self._size = self._query_size()
+                logging.info("Screen size changed to %dx%d", *self._size)
+            return self._size
+
+    def _check_failsafe(self):
+        if not self.failsafe:
+            return
+        pointer = self._root.query_pointer()
+        width, height = self._size
+        if pointer.root_x in (0, width - 1) and pointer.root_y in (0, height - 1):
+            raise FailSafeError("Fail-safe triggered: the pointer is in a screen corner")
+
+    def _motion(self, x, y):
+        self._xtest.fake_input(self._display, self._X.MotionNotify, x=int(x), y=int(y))
+
+    def _glide(self, x, y, duration):
+        if duration > 0:
+            pointer = self._root.query_pointer()
+            start_x, start_y = pointer.root_x, pointer.root_y
+            steps = max(1, int(duration * self.MOTION_RATE))
+            for i in range(1, steps):
+                self._motion(start_x + (x - start_x) * i / steps, start_y + (y - start_y) * i / steps)
+                self._display.flush()
+                time.sleep(duration / steps)
+        self._motion(x, y)
+
+    def move_to(self, x, y, duration=0.0):
+        with self._lock:
+            self._check_failsafe()
+            self._glide(x, y, duration)
+            self._display.sync()
+
+    def _button(self, button):
+        if button not in XTEST_BUTTONS:
+            raise ValueError(f"Unknown mouse button: {button}")
+        return XTEST_BUTTONS[button]
+
+    def click(self, button="left"):
+        detail = self._button(button)
+        with self._lock:
+            self._check_failsafe()
+            self._xtest.fake_input(self._display, self._X.ButtonPress, detail)
+            self._xtest.fake_input(self._display, self._X.ButtonRelease, detail)
+            self._display.sync()
+
+    def drag_to(self, x, y, duration=0.0, button="left"):
+        detail = self._button(button)
+        with self._lock:
+            self._check_failsafe()
+            self._xtest.fake_input(self._display, self._X.ButtonPress, detail)
+            self._glide(x, y, duration)
+            self._xtest.fake_input(self._display, self._X.ButtonRelease, detail)
+            self._display.sync()
+
+    def _keysym(self, key):
+        name = XTEST_KEY_NAMES.get(key.lower() if len(key) > 1 else key, key)
+        if len(name) == 1 and 0x20 <= ord(name) < 0x7f:
+            # Printable Latin-1 keysyms equal their code points
+            return ord(name)
+        keysym = self._XK.string_to_keysym(name)
+        if not keysym and len(name) > 1 and name[0] in "fF" and name[1:].isdigit():
+            keysym = self._XK.string_to_keysym(name.upper())
+        if not keysym:
+            raise ValueError(f"Unknown key: {key}")
+        return keysym
+
+    def _keycode(self, key):
+        """Returns (keycode, needs_shift) for a key name or character."""
+        cached = self._keycodes.get(key)
+        if cached is None:
+            keysym = self._keysym(key)
+            keycode = self._display.keysym_to_keycode(keysym)
+            if not keycode:
+                raise ValueError(f"Key {key!r} is not on the current keyboard layout")
+            # Keysyms in the second column of the keycode's mapping need shift
+            needs_shift = self._display.keycode_to_keysym(keycode, 0) != keysym
+            cached = self._keycodes[key] = (keycode, needs_shift)
+        return cached
+
+    def _key(self, event_type, keycode):
+        self._xtest.fake_input(self._display, event_type, keycode)
+
+    def _tap(self, key):
+        keycode, needs_shift = self._keycode(key)
+        shift = self._keycode("shift")[0] if needs_shift else None
+        if shift:
+            self._key(self._X.KeyPress, shift)
+        self._key(self._X.KeyPress, keycode)
+        self._key(self._X.KeyRelease, keycode)
+        if shift:
+            self._key(self._X.KeyRelease, shift)
+
+    def write(self, text, interval=0.0):
+        # Resolve every character first so an unknown one types nothing
+        for ch in set(text):
+            self._keycode(ch)
+        with self._lock:
+            self._check_failsafe()
+            for ch in text:
+                self._tap(ch)
+                if interval > 0:
+                    self._display.sync()
+                    time.sleep(interval)
+            self._display.sync()
+
+    def press(self, key):
+        with self._lock:
+            self._check_failsafe()
+            self._tap(key)
+            self._display.sync()
+
+    def hotkey(self, *keys):
+        resolved = [self._keycode(key) for key in keys]
+        keycodes = [keycode for keycode, _ in resolved]
+        shifted = [i for i, (_, needs_shift) in enumerate(resolved) if needs_shift]
+        if shifted:
+            # A shifted character (e.g. "+" in ctrl++) needs shift held before it is pressed
+            shift = self._keycode("shift")[0]
+            if shift not in keycodes:
+                keycodes.insert(shifted[0], shift)
+        with self._lock:
+            self._check_failsafe()
+            for keycode in keycodes:
+                self._key(self._X.KeyPress, keycode)
+            for keycode in reversed(keycodes):
+                self._key(self._X.KeyRelease, keycode)
+            self._display.sync()
+
+    def close(self):
+        with self._lock:
+            self._display.close()
+
+class NoOpInputBackend:
+    """
+    Input backend that performs no I/O and only records calls.
+    Used for headless benchmarks and replay runs.
+    """
+    name = "noop"
+
+    def __init__(self, screen_size=(1920, 1080)):
+        self.screen_size = tuple(screen_size)
+        self.calls = []
+
+    def size(self):
+        return self.screen_size
+
+    def move_to(self, x, y, duration=0.0):
+        self.calls.append(("move_to", x, y))
+
+    def click(self, button="left"):
+        self.calls.append(("click", button))
+
+    def drag_to(self, x, y, duration=0.0, button="left"):
+        self.calls.append(("drag_to", x, y, button))
+
+    def write(self, text, interval=0.0):
+        self.calls.append(("write", len(text)))
+
+    def press(self, key):
+        self.calls.append(("press", key))
+
+    def hotkey(self, *keys):
+        self.calls.append(("hotkey",) + tuple(keys))
+
+BACKENDS = {
+    "xtest": XTestBackend,
+    "pyautogui": PyAutoGUIBackend,
+    "noop": NoOpInputBackend,
+}
+
+def create_backend(name="auto"):
+    """
+    Creates an input backend by name. "auto" uses XTEST on an X11 session
+    and falls back to pyautogui if it is unavailable.
+    """
+    if name != "auto":
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown input backend '{name}'. Available: auto, {', '.join(BACKENDS)}")
+        return BACKENDS[name]()
+    is_x11 = (sys.platform.startswith("linux") and os.environ.get("DISPLAY")
+              and os.environ.get("XDG_SESSION_TYPE", "").lower() != "wayland")
+    if is_x11:
+        try:
+            return XTestBackend()
+        except Exception as e:
+            logging.warning("XTEST input backend unavailable (%s); falling back to pyautogui", e)
+    return PyAutoGUIBackend()
+
+# Default for the module-level mouse and keyboard functions when no backend
+# is passed; ActionExecutor passes its own
+_backend = None
+
+def get_backend():
+    """Returns the process default input backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+        logging.info("Using %s input backend", _backend.name)
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
@@ -1,67 +1,157 @@
-import pyautogui
 import logging
+import re
 import sys
 import time
 try:
     import pyperclip
 except ImportError:
     pyperclip = None
+from .backends import get_backend
 
-def type_text(text, interval=0.05):
-    # Check if text is ASCII
-    is_ascii = all(ord(c) < 128 for c in text)
+# Runs of text the input backend can type (ASCII) and runs it cannot
+_TEXT_RUNS = re.compile(r"[\x00-\x7f]+|[^\x00-\x7f]+")
 
-    if is_ascii:
-        try:
-            logging.info("Typing text via pyautogui.write")
-            pyautogui.write(text, interval=interval)
-            return
-        except Exception as e:
-            logging.exception("Error in pyautogui.write: %s. Attempting fallback.", e)
+class ClipboardError(RuntimeError):
+    """The clipboard could not be used; nothing was pasted."""
 
-    # Non-ASCII or failed ASCII write
-    try:
-        _type_text_fallback(text)
-    except Exception as fallback_e:
-        logging.exception("Fallback type_text failed: %s", fallback_e)
-        raise
+class TypingEngine:
+    """
+    Types text with the cheapest strategy that works for it:
 
-def _type_text_fallback(text):
-    if pyperclip is None:
-        raise ImportError("pyperclip is required for non-ASCII text fallback")
+    - fast: ASCII text is injected as keystrokes fast_interval seconds
+      apart (interval unless set; the pace applications are known to keep
+      up with).
+    - paste: non-ASCII text, and ASCII text of at least paste_threshold
+      characters if a threshold is set, is pasted through the clipboard in
+      chunks of paste_chunk_size characters with paste_keys.
+    - per_char: keystrokes interval seconds apart and never a paste for
+      ASCII text, for fields that reject paste or drop fast input.
+      Non-ASCII runs are still pasted, since the backend cannot type them.
 
-    original_clipboard = None
-    try:
-        original_clipboard = pyperclip.paste()
-    except Exception:
-        logging.debug("Could not save original clipboard")
+    Pasting long ASCII text is off by default: the paste shortcut differs
+    between applications (terminals use ctrl+shift+v), so it is opt-in.
+    Throughput per strategy is kept in stats (characters and seconds).
+    """
+    STRATEGIES = ("paste", "fast", "per_char")
 
-    try:
-        logging.info("Typing text via pyperclip fallback")
-        pyperclip.copy(text)
-        if sys.platform == "darwin":
-            pyautogui.hotkey("command", "v")
-        else:
-            pyautogui.hotkey("ctrl", "v")
-        time.sleep(0.05)
-    finally:
-        if original_clipboard is not None:
+    def __init__(self, interval=0.05, fast_interval=None, paste_threshold=0,
+                 paste_chunk_size=1000, paste_delay=0.05, paste_keys=None, clipboard=None, backend=None):
+        self.interval = interval
+        self.fast_interval = interval if fast_interval is None else fast_interval
+        # 0 pastes only text the backend cannot type
+        self.paste_threshold = paste_threshold
+        self.paste_chunk_size = max(1, paste_chunk_size)
+        self.paste_delay = paste_delay
+        self.paste_keys = tuple(paste_keys) if paste_keys else (
+            ("command", "v") if sys.platform == "darwin" else ("ctrl", "v")
+        )
+        # Anything with pyperclip's copy()/paste(); None if unavailable
+        self.clipboard = clipboard if clipboard is not None else pyperclip
+        # Input backend keystrokes go to; None means the process default
+        self.backend = backend
+        self.stats = {name: {"calls": 0, "chars": 0, "seconds": 0.0} for name in self.STRATEGIES}
+
+    def choose_strategy(self, text, per_char=False):
+        if per_char:
+            return "per_char"
+        long_text = self.paste_threshold > 0 and len(text) >= self.paste_threshold
+        if self.clipboard is not None and (not text.isascii() or long_text):
+            return "paste"
+        return "fast"
+
+    def type_text(self, text, per_char=False):
+        """Action: types text, one character at a time if per_char is set."""
+        if not text:
+            return
+        strategy = self.choose_strategy(text, per_char)
+        start = time.perf_counter()
+        if strategy == "paste":
             try:
-                pyperclip.copy(original_clipboard)
-            except Exception:
-                logging.debug("Could not restore original clipboard")
+                self._paste(text)
+            except ClipboardError as e:
+                if not text.isascii():
+                    raise
+                logging.warning("%s; typing instead.", e)
+                strategy = "fast"
+                start = time.perf_counter()
+                self._type(text, self.fast_interval)
+        else:
+            self._type(text, self.interval if strategy == "per_char" else self.fast_interval)
+        self._record(strategy, len(text), time.perf_counter() - start)
+
+    def _type(self, text, interval):
+        for run in _TEXT_RUNS.findall(text):
+            if run.isascii():
+                (self.backend or get_backend()).write(run, interval=interval)
+            else:
+                self._paste(run)
+
+    def _paste(self, text):
+        if self.clipboard is None:
+            raise ClipboardError("pyperclip is required to paste non-ASCII text")
+
+        original_clipboard = None
+        try:
+            original_clipboard = self.clipboard.paste()
+        except Exception:
+            logging.debug("Could not save original clipboard")
+
+        try:
+            for i in range(0, len(text), self.paste_chunk_size):
+                try:
+                    self.clipboard.copy(text[i:i + self.paste_chunk_size])
+                except Exception as e:
+                    if i == 0:
+                        raise ClipboardError(f"Could not copy to the clipboard: {e}") from e
+                    raise
+                (self.backend or get_backend()).hotkey(*self.paste_keys)
+                # Give the application time to read the clipboard before it changes
+                time.sleep(self.paste_delay)
+        finally:
+            if original_clipboard is not None:
+                try:
+                    self.clipboard.copy(original_clipboard)
+                except Exception:
+                    logging.debug("Could not restore original clipboard")
+
+    def _record(self, strategy, chars, elapsed):
+        stats = self.stats[strategy]
+        stats["calls"] += 1
+        stats["chars"] += chars
+        stats["seconds"] += elapsed
+        logging.debug("Typed %d characters via %s in %.3fs", chars, strategy, elapsed)
+
+    def get_stats(self):
+        """Per-strategy totals plus characters per second."""
+        result = {}
+        for name, stats in self.stats.items():
+            if stats["calls"]:
+                result[name] = dict(stats, chars_per_second=stats["chars"] / stats["seconds"] if stats["seconds"] > 0 else 0.0)
+        return result
+
+# Engine for the module-level type_text(); ActionExecutor uses its own
+_engine = None
+
+def get_typing_engine():
+    global _engine
+    if _engine is None:
+        _engine = TypingEngine()
+    return _engine
+
+def type_text(text, per_char=False):
+    get_typing_engine().type_text(text, per_char=per_char)
 
-def press_key(key):
+def press_key(key, backend=None):
     try:
         # PyAutoGUI handles special keys if they are in its KEYBOARD_KEYS list
-        pyautogui.press(key)
+        (backend or get_backend()).press(key)
     except Exception as e:
         logging.exception("Error in press_key: %s", e)
         raise
 
-def hotkey(*keys):
+def hotkey(*keys, backend=None):
     try:
-        pyautogui.hotkey(*keys)
+        (backend or get_backend()).hotkey(*keys)
     except Exception as e:
         logging.exception("Error in hotkey: %s", e)
         raise
@@ -1,53 +1,60 @@
-import pyautogui
 import logging
+from .backends import get_backend
 
-# Disable PyAutoGUI fail-safe for this application as the LLM needs control
-# But we should be careful. Actually, let's keep it enabled but warn.
-pyautogui.FAILSAFE = True
-
-def validate_coordinates(x, y):
-    screen_width, screen_height = pyautogui.size()
+def validate_coordinates(x, y, backend=None):
+    screen_width, screen_height = (backend or get_backend()).size()
     if not (0 <= x < screen_width and 0 <= y < screen_height):
         raise ValueError(f"Coordinates ({x}, {y}) are out of bounds for screen size {screen_width}x{screen_height}")
 
-def move_to(x, y, duration=0.2):
+def _to_screen(viewport, x, y):
+    # Coordinates are in the observed image; without a viewport they are screen pixels
+    return viewport.to_screen(x, y) if viewport is not None else (x, y)
+
+def move_to(x, y, duration=0.2, backend=None, viewport=None):
+    backend = backend or get_backend()
     try:
-        validate_coordinates(x, y)
-        pyautogui.moveTo(x, y, duration=duration)
+        x, y = _to_screen(viewport, x, y)
+        validate_coordinates(x, y, backend)
+        backend.move_to(x, y, duration=duration)
     except Exception:
         logging.exception("Error in move_to")
         raise
 
-def left_click(x=None, y=None, duration=0.1):
+def left_click(x=None, y=None, duration=0.1, backend=None, viewport=None):
     if (x is None) != (y is None):
         raise ValueError("Both x and y must be provided together or both must be None.")
 
+    backend = backend or get_backend()
     try:
         if x is not None and y is not None:
-            move_to(x, y, duration=duration)
-        pyautogui.click()
+            move_to(x, y, duration=duration, backend=backend, viewport=viewport)
+        backend.click()
     except Exception:
         logging.exception("Error in left_click")
         raise
 
-def right_click(x=None, y=None, duration=0.1):
+def right_click(x=None, y=None, duration=0.1, backend=None, viewport=None):
     if (x is None) != (y is None):
         raise ValueError("Both x and y must be provided together or both must be None.")
 
+    backend = backend or get_backend()
     try:
         if x is not None and y is not None:
-            move_to(x, y, duration=duration)
-        pyautogui.rightClick()
+            move_to(x, y, duration=duration, backend=backend, viewport=viewport)
+        backend.click(button="right")
     except Exception:
         logging.exception("Error in right_click")
         raise
 
-def drag(start_x, start_y, end_x, end_y, button='left', duration=0.5):
+def drag(start_x, start_y, end_x, end_y, button='left', duration=0.5, backend=None, viewport=None):
+    backend = backend or get_backend()
     try:
-        validate_coordinates(start_x, start_y)
-        validate_coordinates(end_x, end_y)
-        pyautogui.moveTo(start_x, start_y)
-        pyautogui.dragTo(end_x, end_y, duration=duration, button=button)
+        start_x, start_y = _to_screen(viewport, start_x, start_y)
+        end_x, end_y = _to_screen(viewport, end_x, end_y)
+        validate_coordinates(start_x, start_y, backend)
+        validate_coordinates(end_x, end_y, backend)
+        backend.move_to(start_x, start_y)
+        backend.drag_to(end_x, end_y, duration=duration, button=button)
     except Exception:
         logging.exception("Error in drag")
         raise
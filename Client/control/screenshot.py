@@ -1,9 +1,20 @@
-import mss
-import mss.tools
+import numpy as np
 from PIL import Image
 import io
 import base64
 import logging
+import threading
+import time
+
+_mss = None
+
+def _load_mss():
+    """Returns the mss module, imported on first capture so importing this module needs no display."""
+    global _mss
+    if _mss is None:
+        import mss
+        _mss = mss
+    return _mss
 
 def capture_screen(region=None):
     """
@@ -11,6 +22,7 @@ def capture_screen(region=None):
     region: tuple of (left, top, width, height)
     Returns a PIL Image object.
     """
+    mss = _load_mss()
     try:
         with mss.mss() as sct:
             if region:
@@ -30,6 +42,213 @@ def capture_screen(region=None):
         logging.exception("Unexpected error in capture_screen: %s", e)
         raise
 
+class Frame:
+    """
+    A captured frame exposed as a (height, width, 4) BGRA NumPy array.
+
+    The array is a view over the owning ScreenCapture's buffer, so it is only
+    valid until the next grab. Use copy() or to_image() to keep it longer.
+    """
+    __slots__ = ("array", "region", "timestamp", "_image")
+
+    def __init__(self, array, region, timestamp):
+        self.array = array
+        self.region = region
+        self.timestamp = timestamp
+        self._image = None
+
+    @property
+    def size(self):
+        return (self.array.shape[1], self.array.shape[0])
+
+    @property
+    def width(self):
+        return self.array.shape[1]
+
+    @property
+    def height(self):
+        return self.array.shape[0]
+
+    def copy(self):
+        """Returns a Frame that owns its pixels and survives further grabs."""
+        frame = Frame(self.array.copy(), self.region, self.timestamp)
+        frame._image = self._image
+        return frame
+
+    def to_image(self):
+        """Converts to an RGB PIL Image on first use and caches the result."""
+        if self._image is None:
+            self._image = Image.frombuffer("RGB", self.size, self.array, "raw", "BGRX", 0, 1)
+        return self._image
+
+class ScreenCapture:
+    """
+    Long-lived screen capture engine.
+
+    Keeps a single mss grabber open and copies each grab into a reusable
+    BGRA buffer instead of allocating a new PIL Image per call.
+    """
+    def __init__(self, region=None):
+        self.region = region
+        self._sct = None
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def _get_grabber(self):
+        if self._sct is None:
+            self._sct = _load_mss().mss()
+        return self._sct
+
+    def _get_buffer(self, height, width):
+        if self._buffer is None or self._buffer.shape[:2] != (height, width):
+            self._buffer = np.empty((height, width, 4), dtype=np.uint8)
+        return self._buffer
+
+    def grab(self, region=None):
+        """
+        Grabs a frame.
+        region: tuple of (left, top, width, height); defaults to the primary monitor.
+        Returns a Frame whose array is a view over the reusable buffer.
+        """
+        region = region or self.region
+        mss = _load_mss()
+        with self._lock:
+            try:
+                sct = self._get_grabber()
+                if region:
+                    left, top, width, height = region
+                    monitor = {"top": top, "left": left, "width": width, "height": height}
+                else:
+                    monitor = sct.monitors[1] # Primary monitor
+
+                sct_img = sct.grab(monitor)
+                width, height = sct_img.size
+                buffer = self._get_buffer(height, width)
+                np.copyto(buffer, np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(height, width, 4))
+            except mss.exception.ScreenShotError as e:
+                logging.warning("mss capture failed, falling back to pyautogui: %s", e)
+                self._close_grabber()
+                import pyautogui
+                image = pyautogui.screenshot(region=region)
+                rgba = np.asarray(image.convert("RGBA"))
+                buffer = self._get_buffer(rgba.shape[0], rgba.shape[1])
+                buffer[..., 0] = rgba[..., 2]
+                buffer[..., 1] = rgba[..., 1]
+                buffer[..., 2] = rgba[..., 0]
+                buffer[..., 3] = 255
+            except Exception as e:
+                logging.exception("Unexpected error in ScreenCapture.grab: %s", e)
+                raise
+            return Frame(buffer, region, time.time())
+
+    def capture(self, region=None):
+        """Drop-in replacement for capture_screen that reuses the grabber. Returns a PIL Image."""
+        return self.grab(region).to_image()
+
+    def _close_grabber(self):
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            except Exception:
+                logging.debug("Error closing mss grabber", exc_info=True)
+            self._sct = None
+
+    def close(self):
+        with self._lock:
+            self._close_grabber()
+            self._buffer = None
+
+class ImageEncoder:
+    """
+    Configurable screenshot encoder.
+
+    format: "png", "jpeg", "webp" or "raw" (uncompressed BMP, no encode cost).
+    quality: lossy quality for jpeg/webp (1-100).
+    max_dimension: if set, images are downscaled so the longest side fits.
+    """
+    FORMATS = {
+        "png": ("PNG", "image/png"),
+        "jpeg": ("JPEG", "image/jpeg"),
+        "jpg": ("JPEG", "image/jpeg"),
+        "webp": ("WEBP", "image/webp"),
+        "raw": ("BMP", "image/bmp"),
+    }
+
+    def __init__(self, format="png", quality=85, max_dimension=None):
+        format = str(format).lower()
+        if format not in self.FORMATS:
+            raise ValueError(f"Unsupported screenshot format '{format}'. Expected one of: {', '.join(self.FORMATS)}")
+        self.format = format
+        self.pil_format, self.mime_type = self.FORMATS[format]
+        self.quality = int(quality)
+        self.max_dimension = int(max_dimension) if max_dimension else None
+
+    def target_size(self, width, height):
+        """Returns the (width, height) an image of the given size is encoded at."""
+        if self.max_dimension and max(width, height) > self.max_dimension:
+            scale = self.max_dimension / max(width, height)
+            return (max(1, round(width * scale)), max(1, round(height * scale)))
+        return (width, height)
+
+    def prepare(self, image):
+        """Applies the optional downscale."""
+        size = self.target_size(image.width, image.height)
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return image
+
+    def encode(self, image):
+        image = self.prepare(image)
+        buffered = io.BytesIO()
+        if self.pil_format in ("JPEG", "WEBP"):
+            image.save(buffered, format=self.pil_format, quality=self.quality)
+        else:
+            image.save(buffered, format=self.pil_format)
+        return buffered.getvalue()
+
+    def to_base64(self, image):
+        return base64.b64encode(self.encode(image)).decode('utf-8')
+
+    def to_data_url(self, image):
+        return f"data:{self.mime_type};base64,{self.to_base64(image)}"
+
+class LazyScreenshot:
+    """
+    A captured frame that is converted and encoded only when a consumer asks.
+
+    The PIL image must be requested before the next grab on the same
+    ScreenCapture, since the frame is a view over its buffer.
+    """
+    def __init__(self, frame, encoder=None):
+        self.frame = frame
+        self.encoder = encoder or ImageEncoder()
+        self._image = None
+        self._base64 = None
+        self.encode_seconds = None
+
+    @property
+    def mime_type(self):
+        return self.encoder.mime_type
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = self.frame.to_image()
+        return self._image
+
+    @property
+    def base64(self):
+        if self._base64 is None:
+            image = self.image
+            start = time.perf_counter()
+            self._base64 = self.encoder.to_base64(image)
+            self.encode_seconds = time.perf_counter() - start
+        return self._base64
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime_type};base64,{self.base64}"
+
 def image_to_base64(image):
     try:
         buffered = io.BytesIO()
@@ -0,0 +1,126 @@
+import threading
+
+class Viewport:
+    """
+    Maps coordinates in the observed image to screen coordinates.
+
+    The observation shows `region` (left, top, width, height in screen
+    pixels) as an image of `image_size`. The region is the full screen
+    unless the model zoomed in; the image is smaller than the region when
+    observations are downscaled. Mouse actions pass their coordinates
+    through to_screen(), so the model always works in image coordinates.
+
+    Each ActionExecutor owns one; the agent updates it on the main thread
+    for every observation.
+    """
+    def __init__(self):
+        self.zoom_region = None
+        self.region = None
+        self.image_size = None
+        self._lock = threading.Lock()
+
+    def update(self, region, image_size):
+        """Records the mapping for the observation just shown to the model."""
+        with self._lock:
+            self.region = tuple(int(v) for v in region)
+            self.image_size = tuple(int(v) for v in image_size)
+
+    def to_screen(self, x, y):
+        """
+        Maps image coordinates to the centre of the screen pixel block they
+        cover. Raises ValueError for a point outside the observed image.
+        """
+        with self._lock:
+            if self.region is None or self.image_size is None:
+                return x, y
+            left, top, width, height = self.region
+            image_width, image_height = self.image_size
+        if not (0 <= x < image_width and 0 <= y < image_height):
+            raise ValueError(
+                f"Coordinates ({x}, {y}) are outside the observed {image_width}x{image_height} image"
+            )
+        return (
+            left + int((x + 0.5) * width / image_width),
+            top + int((y + 0.5) * height / image_height)
+        )
+
+    def to_image(self, x, y):
+        """Maps screen coordinates into the observed image; returns None if outside the view."""
+        with self._lock:
+            if self.region is None or self.image_size is None:
+                return x, y
+            left, top, width, height = self.region
+            image_width, image_height = self.image_size
+        if not (left <= x < left + width and top <= y < top + height):
+            return None
+        return int((x - left) * image_width / width), int((y - top) * image_height / height)
+
+    def mapping(self):
+        """Hashable description of the current mapping, for cache keys."""
+        with self._lock:
+            return (self.region, self.image_size)
+
+    def to_screen_rect(self, x, y, width, height):
+        """Maps an image-space rectangle to a screen-space (left, top, width, height)."""
+        with self._lock:
+            if self.region is None or self.image_size is None:
+                return (int(x), int(y), int(width), int(height))
+            region_left, region_top, region_width, region_height = self.region
+            image_width, image_height = self.image_size
+        # Scale the edges (not pixel centres) and clip to the observed region
+        x0 = max(0.0, min(x, image_width))
+        y0 = max(0.0, min(y, image_height))
+        x1 = max(x0, min(x + width, image_width))
+        y1 = max(y0, min(y + height, image_height))
+        left = region_left + int(x0 * region_width / image_width)
+        top = region_top + int(y0 * region_height / image_height)
+        right = region_left + int(x1 * region_width / image_width)
+        bottom = region_top + int(y1 * region_height / image_height)
+        return (left, top, right - left, bottom - top)
+
+    def zoom(self, x, y, width, height, min_size=32):
+        """Restricts the next observations to a region given in image coordinates."""
+        left, top, w, h = self.to_screen_rect(x, y, width, height)
+        if w < min_size or h < min_size:
+            raise ValueError(f"Zoom region {w}x{h} is smaller than the minimum of {min_size}x{min_size} screen pixels")
+        with self._lock:
+            self.zoom_region = (left, top, w, h)
+        return self.zoom_region
+
+    def reset_zoom(self):
+        with self._lock:
+            self.zoom_region = None
+
+    def describe(self, has_image=True):
+        """
+        One line telling the model which coordinate space it is working in,
+        or "" while that is plain screen coordinates. has_image says whether
+        the model sees the image (or only text derived from the screen).
+        """
+        with self._lock:
+            if self.region is None or self.image_size is None:
+                return ""
+            left, top, width, height = self.region
+            image_width, image_height = self.image_size
+            zoomed = self.zoom_region is not None
+        if not zoomed and left == 0 and top == 0 and (width, height) == (image_width, image_height):
+            return ""
+        if has_image:
+            text = f"The screenshot is {image_width}x{image_height}; use its pixel coordinates for mouse actions."
+        else:
+            text = (f"Mouse actions use a {image_width}x{image_height} coordinate space"
+                    f" covering the screen area at ({left}, {top}) of size {width}x{height}.")
+        if zoomed:
+            text += (f" The view is zoomed in on the screen area at ({left}, {top}) of size {width}x{height};"
+                     " call reset_zoom() to see the whole screen again.")
+        return text
+
+def zoom(x, y, width, height, viewport):
+    """Action: observe only the given image-space rectangle, at up to native resolution."""
+    left, top, w, h = viewport.zoom(x, y, width, height)
+    return f"Zoomed in on screen area ({left}, {top}) of size {w}x{h}"
+
+def reset_zoom(viewport):
+    """Action: observe the whole screen again."""
+    viewport.reset_zoom()
+    return "Zoom reset to the whole screen"
@@ -1,2 +1,9 @@
-from .agent import Agent
-from .context import ContextBuilder
+from .._lazy import lazy_exports
+
+_EXPORTS = {
+    "Agent": ".agent",
+    "ContextBuilder": ".context"
+}
+
+__all__ = list(_EXPORTS)
+__getattr__ = lazy_exports(globals(), _EXPORTS)
@@ -1,32 +1,522 @@
 import json
 import logging
+import threading
 import time
 import re
-from .context import ContextBuilder
-from ..control.actions import ActionExecutor
-from ..control.screenshot import image_to_base64
+from pathlib import Path
+import numpy as np
+from .context import ContextBuilder, TokenCounter
+from .metrics import MetricsRegistry, MetricsExporter, LoopProfiler
+from .pipeline import ObservationPipeline, frame_fingerprint
+from .response_parser import StreamingActionParser
+from .trace import TraceRecorder
+from ..control.actions import ActionExecutor, is_batch_request
+from ..control.screenshot import ImageEncoder, LazyScreenshot, ScreenCapture
 from ..llm.model_loader import ModelLoader
+from ..memory.episodic import EpisodicMemory
 from ..memory.manager import MemoryManager
 from ..config.info_loader import load_info
 
+class SettleScheduler:
+    """
+    Adaptive post-action wait.
+
+    Polls cheap subsampled frames after an action and returns as soon as the
+    screen has stayed unchanged for stable_window seconds, bounded by
+    per-action minimum and maximum waits. Settle times are recorded per action.
+    """
+    def __init__(self, stable_window=0.3, poll_interval=0.05, min_wait=0.1, max_wait=5.0,
+                 action_waits=None, change_threshold=0.002, thumbnail_width=64):
+        self.stable_window = stable_window
+        self.poll_interval = poll_interval
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.action_waits = action_waits or {}
+        self.change_threshold = change_threshold
+        self.thumbnail_width = thumbnail_width
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def get_waits(self, action_name):
+        waits = self.action_waits.get(action_name)
+        if waits:
+            return float(waits[0]), float(waits[1])
+        return self.min_wait, self.max_wait
+
+    def _thumbnail(self, capture):
+        array = capture.grab().array
+        step = max(1, array.shape[1] // self.thumbnail_width)
+        # Copy, since the frame is a view over the capture's reusable buffer
+        return np.array(array[::step, ::step, :3])
+
+    def _changed(self, previous, current):
+        if previous.shape != current.shape:
+            return True
+        changed = np.count_nonzero(np.any(previous != current, axis=2))
+        return changed > self.change_threshold * previous.shape[0] * previous.shape[1]
+
+    def wait(self, action_name, capture):
+        """Blocks until the screen settles after action_name. Returns the time waited."""
+        min_wait, max_wait = self.get_waits(action_name)
+        start = time.monotonic()
+        if max_wait <= 0:
+            self._record(action_name, 0.0, False)
+            return 0.0
+        if self._cancelled.wait(min_wait):
+            return time.monotonic() - start
+
+        timed_out = False
+        previous = self._thumbnail(capture)
+        stable_since = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - stable_since >= self.stable_window:
+                break
+            if now - start >= max_wait:
+                timed_out = True
+                break
+            if self._cancelled.wait(self.poll_interval):
+                break
+            current = self._thumbnail(capture)
+            if self._changed(previous, current):
+                stable_since = time.monotonic()
+            previous = current
+
+        elapsed = time.monotonic() - start
+        self._record(action_name, elapsed, timed_out)
+        return elapsed
+
+    def _record(self, action_name, elapsed, timed_out):
+        with self._lock:
+            entry = self.stats.setdefault(action_name, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+            entry["count"] += 1
+            entry["total"] += elapsed
+            entry["max"] = max(entry["max"], elapsed)
+            if timed_out:
+                entry["timeouts"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                name: dict(entry, mean=entry["total"] / entry["count"])
+                for name, entry in self.stats.items()
+            }
+
+    def cancel(self):
+        self._cancelled.set()
+
+class ObservationProvider:
+    """
+    Produces a piece of observation text cheaply, without the vision model.
+
+    Subclasses implement collect() (the costly part) and optionally
+    signature(), a cheap change check: while it returns the same value,
+    the cached text is reused. Returning None means "always refresh".
+    Per-provider call counts, refreshes and time are kept in `stats`.
+    Screen positions are reported in the coordinates of `viewport` (the
+    observed image), if one is set.
+    """
+    name = "provider"
+
+    def __init__(self):
+        self.viewport = None
+        self._text = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "refreshes": 0, "seconds": 0.0, "refresh_seconds": 0.0, "chars": 0}
+
+    def signature(self):
+        return None
+
+    def collect(self):
+        raise NotImplementedError
+
+    def _view_mapping(self):
+        return self.viewport.mapping() if self.viewport is not None else None
+
+    def observe(self):
+        with self._lock:
+            start = time.perf_counter()
+            signature = self.signature()
+            refreshed = signature is None or signature != self._signature or self._text is None
+            if refreshed:
+                self._text = self.collect()
+                self._signature = signature
+            elapsed = time.perf_counter() - start
+            self.stats["calls"] += 1
+            self.stats["seconds"] += elapsed
+            if refreshed:
+                self.stats["refreshes"] += 1
+                self.stats["refresh_seconds"] += elapsed
+            self.stats["chars"] = len(self._text or "")
+            return self._text, elapsed
+
+    def close(self):
+        pass
+
+def _describe_rect(viewport, left, top, width, height):
+    """Formats a screen rectangle in the model's (observed image) coordinates."""
+    if viewport is None:
+        return f"at ({left}, {top}) size {width}x{height}"
+    region, _ = viewport.mapping()
+    if region is not None:
+        # Only the part inside the observed region is addressable
+        view_left, view_top, view_width, view_height = region
+        x0, y0 = max(left, view_left), max(top, view_top)
+        x1 = min(left + width, view_left + view_width)
+        y1 = min(top + height, view_top + view_height)
+        if x1 <= x0 or y1 <= y0:
+            return "outside the current view"
+        left, top, width, height = x0, y0, x1 - x0, y1 - y0
+    x0, y0 = viewport.to_image(left, top)
+    x1, y1 = viewport.to_image(left + width - 1, top + height - 1)
+    return f"at ({x0}, {y0}) size {x1 - x0 + 1}x{y1 - y0 + 1}"
+
+class X11WindowProvider(ObservationProvider):
+    """
+    Lists top-level windows (focused first) with titles and positions, read
+    from the EWMH properties of the window manager. Property and structure
+    change events mark the list dirty, so it is only re-read on change.
+    """
+    name = "x11_windows"
+
+    def __init__(self, max_windows=20, display=None):
+        super().__init__()
+        from Xlib import X, display as xdisplay
+        self._X = X
+        self.max_windows = max_windows
+        self.display = xdisplay.Display(display)
+        self.root = self.display.screen().root
+        self._atoms = {
+            name: self.display.intern_atom(name)
+            for name in ("_NET_CLIENT_LIST", "_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "UTF8_STRING")
+        }
+        self.root.change_attributes(event_mask=X.PropertyChangeMask)
+        self.display.flush()
+        self._generation = 0
+
+    def signature(self):
+        # Any property/structure event since the last check means something changed
+        changed = False
+        while self.display.pending_events():
+            self.display.next_event()
+            changed = True
+        if changed:
+            self._generation += 1
+        # Window positions are reported in view coordinates, which zooming changes
+        return (self._generation, self._view_mapping())
+
+    def _property(self, window, atom, prop_type=None):
+        prop = window.get_full_property(self._atoms[atom], prop_type or self._X.AnyPropertyType)
+        return prop.value if prop is not None else None
+
+    def _title(self, window):
+        title = self._property(window, "_NET_WM_NAME", self._atoms["UTF8_STRING"])
+        if title is not None:
+            return title.decode("utf-8", errors="replace") if isinstance(title, bytes) else str(title)
+        return window.get_wm_name() or ""
+
+    def collect(self):
+        from Xlib.error import XError
+        X = self._X
+        client_ids = list(self._property(self.root, "_NET_CLIENT_LIST") or [])
+        active = self._property(self.root, "_NET_ACTIVE_WINDOW")
+        active_id = active[0] if active is not None and len(active) else None
+        # Stacking order is bottom to top; show the focused window first, then the most recent
+        client_ids.reverse()
+        if active_id in client_ids:
+            client_ids.remove(active_id)
+            client_ids.insert(0, active_id)
+
+        lines = []
+        for window_id in client_ids[:self.max_windows]:
+            window = self.display.create_resource_object("window", window_id)
+            try:
+                window.change_attributes(event_mask=X.PropertyChangeMask | X.StructureNotifyMask)
+                title = self._title(window)
+                wm_class = window.get_wm_class()
+                geometry = window.get_geometry()
+                origin = self.root.translate_coords(window, 0, 0)
+            except XError:
+                # The window closed while we were reading it
+                continue
+            app = f" ({wm_class[1]})" if wm_class else ""
+            focused = "[focused] " if window_id == active_id else ""
+            rect = _describe_rect(self.viewport, origin.x, origin.y, geometry.width, geometry.height)
+            lines.append(f"- {focused}{title}{app} {rect}\n")
+        self.display.flush()
+        if not lines:
+            return "Open windows: none"
+        omitted = len(client_ids) - self.max_windows
+        if omitted > 0:
+            lines.append(f"({omitted} more windows)\n")
+        return "Open windows:\n" + "".join(lines).rstrip("\n")
+
+    def close(self):
+        self.display.close()
+
+class AccessibilityProvider(ObservationProvider):
+    """
+    Dumps the names, roles and text of widgets in the focused window through
+    the AT-SPI accessibility API (no OCR). A listener thread receives AT-SPI
+    events: window activation switches the window to dump, and text, state
+    and child changes in its application mark the dump stale, so the tree
+    is only re-read after something changed.
+    """
+    name = "accessibility"
+    EVENTS = ("window:activate", "window:deactivate", "object:text-changed",
+              "object:state-changed", "object:children-changed")
+
+    def __init__(self, max_depth=8, max_items=60, max_text=200):
+        super().__init__()
+        import pyatspi
+        self._pyatspi = pyatspi
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_text = max_text
+        # Guards the focused window and the change counter, which the listener thread updates
+        self._event_lock = threading.Lock()
+        self._generation = 0
+        # The only full walk of the desktop; later window changes arrive as events
+        self._app, self._window = self._active_window()
+        pyatspi.Registry.registerEventListener(self._on_event, *self.EVENTS)
+        self._thread = threading.Thread(target=pyatspi.Registry.start, name="AccessibilityEvents", daemon=True)
+        self._thread.start()
+
+    def _active_window(self):
+        pyatspi = self._pyatspi
+        desktop = pyatspi.Registry.getDesktop(0)
+        for app in desktop:
+            if app is None:
+                continue
+            for window in app:
+                if window is not None and window.getState().contains(pyatspi.STATE_ACTIVE):
+                    return app, window
+        return None, None
+
+    def _on_event(self, event):
+        with self._event_lock:
+            if event.type.startswith("window:activate"):
+                self._app, self._window = event.host_application, event.source
+            elif event.type.startswith("window:deactivate"):
+                if event.source == self._window:
+                    self._app, self._window = None, None
+            elif self._app is not None and event.host_application != self._app:
+                # A change in a window that is not being dumped
+                return
+            self._generation += 1
+
+    def signature(self):
+        with self._event_lock:
+            return (self._generation, self._view_mapping())
+
+    def _text_of(self, accessible):
+        try:
+            text = accessible.queryText()
+            return text.getText(0, min(text.characterCount, self.max_text))
+        except NotImplementedError:
+            return ""
+
+    def collect(self):
+        pyatspi = self._pyatspi
+        with self._event_lock:
+            window = self._window
+        if window is None:
+            return "Focused window: none"
+        lines = []
+        stack = [(window, 0)]
+        while stack and len(lines) < self.max_items:
+            accessible, depth = stack.pop()
+            try:
+                state = accessible.getState()
+                if depth and not state.contains(pyatspi.STATE_SHOWING):
+                    continue
+                role = accessible.getRoleName()
+                name = accessible.name or ""
+                text = self._text_of(accessible) if role in ("text", "entry", "paragraph", "terminal") else ""
+                if name or text:
+                    extents = accessible.queryComponent().getExtents(pyatspi.DESKTOP_COORDS)
+                    rect = _describe_rect(self.viewport, extents.x, extents.y, extents.width, extents.height)
+                    focused = " [focused]" if state.contains(pyatspi.STATE_FOCUSED) else ""
+                    value = f": {text!r}" if text else ""
+                    lines.append(f"{'  ' * min(depth, 4)}- {role} \"{name}\"{value}{focused} {rect}\n")
+                if depth < self.max_depth:
+                    children = [accessible.getChildAtIndex(i) for i in range(accessible.childCount)]
+                    stack.extend((child, depth + 1) for child in reversed(children) if child is not None)
+            except Exception:
+                # Widgets can disappear while the tree is walked
+                continue
+        return f"Focused window \"{window.name}\" widgets:\n" + "".join(lines).rstrip("\n")
+
+    def close(self):
+        pyatspi = self._pyatspi
+        pyatspi.Registry.deregisterEventListener(self._on_event, *self.EVENTS)
+        pyatspi.Registry.stop()
+        self._thread.join(1.0)
+
+class TextFileProvider(ObservationProvider):
+    """
+    Reads an observation written to disk by an external tool (for example an
+    accessibility dumper), re-reading it only when its mtime or size changes.
+    """
+    name = "text_file"
+
+    def __init__(self, path, max_chars=4000, title="UI state"):
+        super().__init__()
+        self.path = Path(path)
+        self.max_chars = max_chars
+        self.title = title
+
+    def signature(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return ("missing",)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def collect(self):
+        try:
+            with open(self.path, "r", errors="replace") as f:
+                text = f.read(self.max_chars + 1)
+        except OSError as e:
+            return f"{self.title}: unavailable ({e})"
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars] + " [...]"
+        return f"{self.title}:\n{text.strip()}"
+
+OBSERVATION_PROVIDERS = {
+    X11WindowProvider.name: X11WindowProvider,
+    AccessibilityProvider.name: AccessibilityProvider,
+    TextFileProvider.name: TextFileProvider,
+}
+
+def build_observation_providers(names, options=None, viewport=None):
+    """
+    Creates the named providers, reporting positions in viewport coordinates;
+    ones whose dependencies are missing are skipped with a warning.
+    """
+    providers = []
+    for name in names or []:
+        cls = OBSERVATION_PROVIDERS.get(name)
+        if cls is None:
+            logging.warning("Unknown observation provider '%s'. Available: %s", name, ", ".join(OBSERVATION_PROVIDERS))
+            continue
+        try:
+            provider = cls(**((options or {}).get(name) or {}))
+            provider.viewport = viewport
+            providers.append(provider)
+            logging.info("Observation provider '%s' enabled.", name)
+        except Exception as e:
+            logging.warning("Observation provider '%s' unavailable: %s", name, e)
+    return providers
+
 class Agent:
-    def __init__(self, config):
+    def __init__(self, config, model_loader=None, action_executor=None, capture_factory=None):
         self.config = config
-        self.model_loader = ModelLoader(config)
-        self.memory_manager = MemoryManager()
-        self.action_executor = ActionExecutor()
+        self.model_loader = model_loader or ModelLoader(config)
+        self.single_pass = bool(config.get("single_pass_multimodal", False))
+        episodic_memory = None
+        if config.get("episodic_memory_enabled", False):
+            episodic_memory = EpisodicMemory(
+                self.model_loader.embed,
+                approximate_threshold=config.get("episodic_approximate_threshold", 5000),
+                min_score=config.get("episodic_min_score", 0.0)
+            )
+        self.memory_manager = MemoryManager(
+            high_memory_path=config.get("high_memory_path") or None,
+            high_memory_limit=config.get("high_memory_limit", 1000),
+            high_memory_sync=config.get("high_memory_sync", "normal"),
+            episodic_memory=episodic_memory,
+            episodic_top_k=config.get("episodic_top_k", 5),
+            event_metadata_budget=config.get("event_metadata_budget", 65536),
+            event_spill_dir=config.get("event_spill_dir") or None
+        )
+        # Creates ScreenCapture-like objects; the pipeline thread needs its own
+        self.capture_factory = capture_factory or ScreenCapture
+        self.action_executor = action_executor or ActionExecutor(screen_capture=self.capture_factory(), config=config)
+        self.image_encoder = ImageEncoder(
+            format=config.get("screenshot_format", "png"),
+            quality=config.get("screenshot_quality", 85),
+            max_dimension=config.get("screenshot_max_dimension", 0)
+        )
         self.info_text = load_info()
-        self.context_builder = ContextBuilder(self.info_text, self.memory_manager)
+        # The executor's viewport maps the observed image to the screen; only
+        # the main thread updates it (in _observe)
+        self.viewport = self.action_executor.viewport
+        self.observation_providers = build_observation_providers(
+            config.get("observation_providers", []),
+            config.get("observation_provider_options", {}),
+            self.viewport
+        )
+        self.max_batch_actions = max(1, int(config.get("max_batch_actions", 4)))
+        self.batch_step_delay = config.get("batch_step_delay", 0.1)
+        if config.get("constrained_decoding", True):
+            try:
+                self.model_loader.set_action_schema(self.action_executor.get_action_schema(
+                    extra_actions={"add_to_high_memory": self.memory_manager.add_to_high_memory},
+                    max_batch_actions=self.max_batch_actions
+                ))
+            except Exception as e:
+                logging.warning("Failed to build action grammar; decoding will be unconstrained: %s", e)
+        self.context_builder = ContextBuilder(
+            self.info_text,
+            self.memory_manager,
+            token_counter=TokenCounter(self.model_loader.count_tokens, self.model_loader.count_tokens_batch),
+            context_size=config.get("context_size", 2048),
+            max_tokens=config.get("max_tokens", 512),
+            safety_margin=config.get("context_safety_margin", 32),
+            # In single-pass mode the screenshot's image tokens share the context
+            reserved_tokens=config.get("multimodal_image_tokens", 576) if self.single_pass else 0,
+            recent_events=self.memory_manager.prompt_events,
+            max_batch_actions=self.max_batch_actions
+        )
+        self.settle_scheduler = None
+        if config.get("adaptive_settle", True):
+            self.settle_scheduler = SettleScheduler(
+                stable_window=config.get("settle_stable_window", 0.3),
+                poll_interval=config.get("settle_poll_interval", 0.05),
+                min_wait=config.get("settle_min_wait", 0.1),
+                max_wait=config.get("settle_max_wait", 5.0),
+                action_waits=config.get("settle_action_waits", {})
+            )
+        self.metrics = MetricsRegistry()
+        self.metrics_exporter = None
         self.running = False
         self._stopped = False
+        self._pipeline = None
+        self._pipeline_capture = None
         self.consecutive_errors = 0
         self.max_consecutive_errors = config.get("max_consecutive_errors", 5)
         self.base_backoff = config.get("base_backoff", 1.0)
+        self.step_delay = config.get("step_delay", 1.0)
+        self.max_steps = config.get("max_steps", 0)
+        self.trace = None
+        if config.get("trace_dir"):
+            self.trace = TraceRecorder(
+                Path(config.get("trace_dir")) / time.strftime("%Y%m%d-%H%M%S"),
+                chunk_size=config.get("trace_chunk_size", 64 * 1024 * 1024),
+                max_pending_bytes=config.get("trace_max_pending_bytes", 64 * 1024 * 1024),
+                keyframe_interval=config.get("trace_prompt_keyframe_interval", 50)
+            )
+            logging.info("Recording session trace to %s", self.trace.directory)
+        # Prompt and raw completion of the last decision, for the trace
+        self._last_prompt = None
+        self._last_response = None
+        self.steps_completed = 0
+        # Individual actions executed; a batch step counts each of its actions
+        self.actions_completed = 0
+        self._start_time = None
 
     def start(self):
         logging.info("Starting Agent...")
+        self._start_time = time.perf_counter()
         try:
             self.model_loader.load_models()
+            try:
+                self.model_loader.prime_prompt_prefix(self.context_builder.get_prompt_prefix())
+            except Exception as e:
+                logging.warning("Failed to prime prompt prefix cache: %s", e)
             self.running = True
             self._stopped = False
             self._main_loop()
@@ -42,83 +532,136 @@ class Agent:
             return
         logging.info("Stopping Agent...")
         self.running = False
+        if self.settle_scheduler is not None:
+            self.settle_scheduler.cancel()
+        if self.metrics_exporter is not None:
+            try:
+                self.metrics_exporter.stop()
+            except Exception as e:
+                logging.exception("Error stopping metrics exporter: %s", e)
+            self.metrics_exporter = None
+        try:
+            self._stop_pipeline()
+        except Exception as e:
+            logging.exception("Error stopping observation pipeline: %s", e)
         if self.model_loader:
             try:
                 self.model_loader.unload_models()
             except Exception as e:
                 logging.exception("Error unloading models: %s", e)
-        self._stopped = True
-
-    def _main_loop(self):
-        while self.running:
+        if self.action_executor:
             try:
-                # 1. Capture State
-                response = self.action_executor.execute({"action": "screenshot"})
-                if response.get("status") == "error":
-                    raise RuntimeError(f"Failed to capture screenshot: {response.get('message')}")
-
-                screenshot = response.get("result")
-                if screenshot is None:
-                    raise RuntimeError("Screenshot action returned success but no result.")
+                self.action_executor.close()
+            except Exception as e:
+                logging.exception("Error closing action executor: %s", e)
+        if self.memory_manager:
+            try:
+                self.memory_manager.close()
+            except Exception as e:
+                logging.exception("Error closing memory manager: %s", e)
+        for provider in self.observation_providers:
+            try:
+                provider.close()
+            except Exception as e:
+                logging.exception("Error closing observation provider %s: %s", provider.name, e)
+        if self.trace is not None:
+            try:
+                self.trace.close()
+                logging.info("Session trace: %s", self.trace.stats)
+            except Exception as e:
+                logging.exception("Error closing session trace: %s", e)
+        self._stopped = True
 
-                base64_img = image_to_base64(screenshot)
+    def _start_metrics(self):
+        if not self.config.get("metrics_enabled"):
+            return
+        self.metrics_exporter = MetricsExporter(
+            self.metrics,
+            jsonl_path=self.config.get("metrics_jsonl_path") or None,
+            interval=self.config.get("metrics_interval", 10.0),
+            port=self.config.get("metrics_port", 0),
+            extra_fn=self._extra_metrics
+        )
+        self.metrics_exporter.start()
 
-                if self.config.get("use_vision_model"):
-                    logging.info("Generating screenshot description...")
-                    description = self.model_loader.describe_image(base64_img)
-                    observation = f"Screenshot description: {description}"
-                else:
-                    observation = "Screenshot captured (multi-modal support enabled if model supports it)."
+    def _extra_metrics(self):
+        extra = {}
+        if self.settle_scheduler is not None:
+            extra["settle"] = self.settle_scheduler.get_stats()
+        if self.model_loader.vision_cache is not None:
+            extra["vision_cache"] = self.model_loader.vision_cache.stats()
+        extra["load_times"] = dict(self.model_loader.load_times)
+        if self.model_loader.speculation is not None:
+            extra["speculation"] = self.model_loader.speculation.summary()
+        typing_engine = getattr(self.action_executor, "typing_engine", None)
+        if typing_engine is not None:
+            extra["typing"] = typing_engine.get_stats()
+        if self.observation_providers:
+            extra["observation_providers"] = {p.name: dict(p.stats) for p in self.observation_providers}
+        if self.trace is not None:
+            extra["trace"] = dict(self.trace.stats)
+        if self._pipeline is not None:
+            extra["pipeline"] = dict(self._pipeline.stats)
+        extra["memory"] = self.memory_manager.get_memory_usage()
+        return extra
 
-                # 2. Build Context
-                prompt = self.context_builder.get_full_prompt(observation)
+    def _main_loop(self):
+        self._start_metrics()
+        profiler = LoopProfiler(
+            self.config.get("profile_iterations", 0),
+            self.config.get("profile_output_dir") or "profile"
+        )
+        profiler.start()
 
-                # 3. Query LLM
-                logging.info("Querying LLM...")
-                response_text = self.model_loader.generate_completion(prompt)
-                if response_text is None:
-                    logging.error("LLM generate_completion returned None.")
-                    response_text = ""
+        if self.config.get("pipeline_mode"):
+            if self.config.get("use_vision_model") and not self.single_pass:
+                self._start_pipeline()
+            else:
+                logging.info("pipeline_mode only applies to a separate vision model; ignoring it.")
 
-                logging.debug("LLM Response (full): %s", response_text)
-                logging.info("LLM Response (truncated): %s", response_text[:100] + ("..." if len(response_text) > 100 else ""))
+        while self.running:
+            step_start = time.perf_counter()
+            try:
+                # 1. Capture State
+                screenshot, observation = self._observe()
 
-                # 4. Parse Response
-                action_request = self._parse_response(response_text)
+                # 2-4. Build Context, Query LLM, Parse Response
+                action_request = self._decide(observation, screenshot)
                 if not action_request:
                     logging.warning("Failed to parse LLM response. Retrying...")
-                    time.sleep(1)
+                    self._trace_step(screenshot.frame.array, observation, None, None)
+                    self._delay(self.step_delay)
                     continue
 
                 # 5. Execute Action
-                if not isinstance(action_request, dict) or "action" not in action_request:
-                    result = {"status": "error", "message": "Malformed action_request: missing 'action'"}
-                else:
-                    logging.info("Executing action: %s", action_request.get("action"))
-                    action_name = action_request["action"]
-                    params = action_request.get("params", {})
-
-                    if action_name == "add_to_high_memory":
-                        if isinstance(params, dict) and "content" in params:
-                            content = params["content"]
-                            try:
-                                self.memory_manager.add_to_high_memory(content)
-                                result = {"status": "success", "message": "Added to high memory"}
-                            except Exception as e:
-                                result = {"status": "error", "message": str(e)}
-                        else:
-                            result = {"status": "error", "message": "Malformed action_request: missing 'params/content'"}
-                    else:
-                        result = self.action_executor.execute(action_request)
+                # The capture buffer is reused by the screenshot action and the
+                # next observation, so the traced frame is copied before acting
+                frame = screenshot.frame.array.copy() if self.trace is not None else None
+                result = self._act(action_request)
+                if self.steps_completed == 0 and self._start_time is not None:
+                    # Includes model loading; this is what a restart costs
+                    first_action = time.perf_counter() - self._start_time
+                    logging.info("Time to first action: %.2fs", first_action)
+                    self.metrics.observe("time_to_first_action_seconds", first_action)
+                    self._start_time = None
 
                 # 6. Record to Memory
-                if isinstance(action_request, dict) and "action" in action_request:
-                    self.memory_manager.add_event("action", f"Executed {action_request['action']}", {"result": result})
-                self.memory_manager.add_event("observation", observation)
+                self._record(action_request, result, observation)
+                self._trace_step(frame, observation, action_request, result, copy_frame=False)
+                if is_batch_request(action_request):
+                    self.actions_completed += result.get("completed", 0)
+                elif result.get("status") == "success":
+                    self.actions_completed += 1
 
                 self.consecutive_errors = 0
-                # Small delay between loops
-                time.sleep(1)
+                # Wait for the screen to settle before the next observation
+                self._wait_for_settle(self._last_action_name(action_request, result))
+                self.metrics.observe("step_seconds", time.perf_counter() - step_start)
+                profiler.step()
+                self.steps_completed += 1
+                if self.max_steps and self.steps_completed >= self.max_steps:
+                    logging.info("Completed %d steps; stopping.", self.steps_completed)
+                    break
 
             except Exception as e:
                 self.consecutive_errors += 1
@@ -134,12 +677,269 @@ class Agent:
                 logging.info("Waiting %.2f seconds before retry...", backoff_delay)
                 time.sleep(backoff_delay)
 
+        profiler.finish()
+
+    def _start_pipeline(self):
+        # The pipeline thread gets its own grabber; mss handles are not shared across threads
+        capture = self.capture_factory()
+        self._pipeline = ObservationPipeline(
+            capture,
+            lambda: self.viewport.zoom_region,
+            lambda frame, cancel: self.model_loader.describe_image(
+                LazyScreenshot(frame, self.image_encoder), cancel=cancel
+            )
+        )
+        self._pipeline.start()
+        self._pipeline_capture = capture
+
+    def _stop_pipeline(self):
+        if self._pipeline is not None:
+            self._pipeline.stop()
+            self._pipeline = None
+        if self._pipeline_capture is not None:
+            self._pipeline_capture.close()
+            self._pipeline_capture = None
+
+    def _wait_for_settle(self, action_name):
+        if self.settle_scheduler is None:
+            self._delay(self.step_delay)
+            return
+        with self.metrics.time("settle"):
+            waited = self.settle_scheduler.wait(action_name, self.action_executor.screen_capture)
+        logging.debug("Screen settled after %.2f seconds (%s)", waited, action_name)
+
+    def _delay(self, delay):
+        with self.metrics.time("settle"):
+            time.sleep(delay)
+
+    def _observe(self):
+        """
+        Captures the screen and builds the observation text.
+        Returns (screenshot, observation).
+        """
+        capture = self.action_executor.screen_capture
+        viewport = self.viewport
+        try:
+            with self.metrics.time("capture"):
+                # Only the zoomed-in region is grabbed, if the model asked for one
+                frame = capture.grab(viewport.zoom_region)
+        except Exception as e:
+            raise RuntimeError(f"Failed to capture screenshot: {e}") from e
+        # Mouse coordinates from the model refer to the image it is shown
+        viewport.update(
+            frame.region or (0, 0, frame.width, frame.height),
+            self.image_encoder.target_size(frame.width, frame.height)
+        )
+
+        # Encoding is deferred until a consumer needs the data URL
+        screenshot = LazyScreenshot(frame, self.image_encoder)
+
+        parts = []
+        if self.single_pass:
+            # The screenshot itself goes to the multimodal model with the prompt
+            parts.append("The current screenshot is attached.")
+        elif self.config.get("use_vision_model"):
+            description = self._describe(screenshot)
+            parts.append(f"Screenshot description: {description}")
+        parts.extend(self._provider_observations())
+        if not parts:
+            parts.append("Screenshot captured (multi-modal support enabled if model supports it).")
+        # Zoom and downscaling change the coordinate space whether or not the model sees the image
+        view_note = viewport.describe(has_image=self.single_pass or bool(self.config.get("use_vision_model")))
+        if view_note:
+            parts.append(view_note)
+        observation = "\n".join(parts)
+        return screenshot, observation
+
+    def _describe(self, screenshot):
+        """Returns the vision description of screenshot, from the pipeline stage if it already made one."""
+        fingerprint = None
+        if self._pipeline is not None:
+            fingerprint = frame_fingerprint(screenshot.frame)
+            with self.metrics.time("pipeline_wait"):
+                description = self._pipeline.take(fingerprint)
+            if description is not None:
+                logging.info("Using the screenshot description prepared during the last step.")
+                self._pipeline.arm(fingerprint, description)
+                return description
+        logging.info("Generating screenshot description...")
+        start = time.perf_counter()
+        description = self.model_loader.describe_image(screenshot)
+        elapsed = time.perf_counter() - start
+        if screenshot.encode_seconds is not None:
+            self.metrics.observe("encode_seconds", screenshot.encode_seconds)
+            elapsed -= screenshot.encode_seconds
+        self.metrics.observe("vision_seconds", elapsed)
+        if self._pipeline is not None:
+            # Speculate on the frames that follow while the model decides and acts
+            self._pipeline.arm(fingerprint, description)
+        return description
+
+    def _provider_observations(self):
+        """Collects text from the configured observation providers (cached until their input changes)."""
+        texts = []
+        for provider in self.observation_providers:
+            try:
+                text, elapsed = provider.observe()
+            except Exception as e:
+                logging.warning("Observation provider '%s' failed: %s", provider.name, e)
+                continue
+            self.metrics.observe(f"provider_{provider.name}_seconds", elapsed)
+            if text:
+                texts.append(text)
+        return texts
+
+    def _decide(self, observation, screenshot=None):
+        """Builds the prompt, queries the LLM and returns the parsed action request (or None)."""
+        with self.metrics.time("prompt_build"):
+            if self.single_pass:
+                prefix = self.context_builder.get_prompt_prefix()
+                tail = self.context_builder.get_prompt_tail(observation)
+                self._last_prompt = prefix + tail
+            else:
+                prompt = self.context_builder.get_full_prompt(observation)
+                self._last_prompt = prompt
+
+        logging.info("Querying LLM...")
+        action_request = None
+        constrained = self.model_loader.action_schema is not None
+        # Streaming stops at the object's closing brace. With a grammar that
+        # only skips the optional trailing space and the end-of-generation
+        # token, but the two settings no longer exclude each other
+        stream = self.config.get("stream_completion", True)
+        with self.metrics.time("generate"):
+            if self.single_pass and stream:
+                response_text, action_request = self._stream_action(
+                    self.model_loader.stream_multimodal_completion(prefix, tail, screenshot)
+                )
+            elif self.single_pass:
+                response_text = self.model_loader.generate_multimodal_completion(prefix, tail, screenshot)
+            elif stream:
+                response_text, action_request = self._stream_action(self.model_loader.stream_completion(prompt))
+            else:
+                response_text = self.model_loader.generate_completion(prompt)
+        self.metrics.record_generation(self.model_loader.last_generation)
+        if response_text is None:
+            logging.error("LLM generate_completion returned None.")
+            response_text = ""
+        self._last_response = response_text
+
+        logging.debug("LLM Response (full): %s", response_text)
+        logging.info("LLM Response (truncated): %s", response_text[:100] + ("..." if len(response_text) > 100 else ""))
+
+        with self.metrics.time("parse"):
+            if constrained and action_request is None:
+                # The grammar guarantees one action (or batch) object; no scanning needed
+                try:
+                    action_request = json.loads(response_text)
+                except json.JSONDecodeError:
+                    logging.warning("Constrained completion was not valid JSON (likely truncated).")
+            if action_request is None:
+                action_request = self._parse_response(response_text)
+        return action_request
+
+    def _act(self, action_request):
+        """Executes an action request (or batch of them) and returns its result dict."""
+        if is_batch_request(action_request):
+            return self._act_batch(action_request)
+        if not isinstance(action_request, dict) or "action" not in action_request:
+            return {"status": "error", "message": "Malformed action_request: missing 'action'"}
+
+        logging.info("Executing action: %s", action_request.get("action"))
+        action_name = action_request["action"]
+        params = action_request.get("params", {})
+
+        if action_name == "add_to_high_memory":
+            if isinstance(params, dict) and "content" in params:
+                content = params["content"]
+                try:
+                    self.memory_manager.add_to_high_memory(content, params.get("tags"))
+                    return {"status": "success", "message": "Added to high memory"}
+                except Exception as e:
+                    return {"status": "error", "message": str(e)}
+            return {"status": "error", "message": "Malformed action_request: missing 'params/content'"}
+
+        with self.metrics.time("execute"):
+            return self.action_executor.execute(action_request)
+
+    def _act_batch(self, batch_request):
+        if self.max_batch_actions <= 1:
+            return {"status": "error", "message": "Action batches are disabled; send one action at a time"}
+        steps = batch_request.get("actions")
+        if isinstance(steps, list):
+            logging.info("Executing batch: %s", ", ".join(str(step.get("action")) for step in steps if isinstance(step, dict)))
+        with self.metrics.time("execute"):
+            result = self.action_executor.execute_batch(
+                batch_request,
+                extra_actions={"add_to_high_memory": self.memory_manager.add_to_high_memory},
+                max_actions=self.max_batch_actions,
+                step_delay=self.batch_step_delay
+            )
+        self.metrics.observe("batch_actions", result["completed"])
+        if result["status"] != "success":
+            logging.warning("Batch stopped after %d/%d actions: %s",
+                            result["completed"], result["total"], result.get("message"))
+        return result
+
+    def _last_action_name(self, action_request, result):
+        """The action whose effects the screen is settling from."""
+        if is_batch_request(action_request):
+            results = result.get("results") if isinstance(result, dict) else None
+            return results[-1]["action"] if results else None
+        return action_request.get("action") if isinstance(action_request, dict) else None
+
+    def _trace_step(self, frame, observation, action_request, result, copy_frame=True):
+        if self.trace is None:
+            return
+        with self.metrics.time("trace"):
+            # The recorder numbers records itself; steps_completed repeats
+            # for steps whose response could not be parsed
+            self.trace.record_step(
+                frame=frame,
+                copy_frame=copy_frame,
+                steps_completed=self.steps_completed,
+                prompt=self._last_prompt,
+                completion=self._last_response,
+                action=action_request,
+                result=result,
+                observation=observation
+            )
+
+    def _record(self, action_request, result, observation):
+        if is_batch_request(action_request):
+            names = [r["action"] for r in result.get("results", [])]
+            content = f"Executed batch {result.get('completed', 0)}/{result.get('total', 0)}: {', '.join(names) or 'none'}"
+            if result.get("status") != "success":
+                content += f" (stopped: {result.get('message')})"
+            self.memory_manager.add_event("action", content, {"result": result})
+        elif isinstance(action_request, dict) and "action" in action_request:
+            self.memory_manager.add_event("action", f"Executed {action_request['action']}", {"result": result})
+        self.memory_manager.add_event("observation", observation)
+
+    def _stream_action(self, stream):
+        """
+        Feeds a completion stream through an incremental parser and cancels
+        generation as soon as a complete action object has been emitted.
+        Returns (response_text, action_request or None).
+        """
+        parser = StreamingActionParser()
+        try:
+            for chunk in stream:
+                if parser.feed(chunk) is not None:
+                    logging.debug("Complete action received; cancelling generation.")
+                    break
+        finally:
+            stream.close()
+        return parser.text, parser.result
+
     def _parse_response(self, text):
         # 1. Look for fenced JSON blocks
         fenced_match = re.search(r"```json\s*(.*?)\s*```", text, re.DOTALL)
         if fenced_match:
             try:
-                return json.loads(fenced_match.group(1))
+                parsed = json.loads(fenced_match.group(1))
+                # A bare list of actions is read as a batch
+                return {"actions": parsed} if isinstance(parsed, list) else parsed
             except json.JSONDecodeError:
                 pass
 
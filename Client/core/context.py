@@ -1,7 +1,83 @@
+from collections import OrderedDict
+
+class TokenCounter:
+    """
+    Counts tokens with the model tokenizer, caching results per segment.
+    Prompt segments (prefix, event and memory lines) are immutable, so
+    their counts are reused across steps. batch_fn, if given, counts a list
+    of texts in one call; prefetch() uses it so that a remote tokenizer is
+    asked once per step rather than once per new segment.
+    """
+    def __init__(self, tokenize_fn=None, batch_fn=None, cache_size=4096):
+        self.tokenize_fn = tokenize_fn
+        self.batch_fn = batch_fn
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def count(self, text, cache=True):
+        if not text:
+            return 0
+        if cache and text in self._cache:
+            self._cache.move_to_end(text)
+            return self._cache[text]
+        if self.tokenize_fn is not None:
+            n = self.tokenize_fn(text)
+        else:
+            # Rough estimate when no tokenizer is available
+            n = len(text) // 4 + 1
+        if cache:
+            self._store(text, n)
+        return n
+
+    def _store(self, text, n):
+        self._cache[text] = n
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def prefetch(self, texts, uncached=()):
+        """
+        Counts the segments of texts that are not cached yet, plus every text
+        of uncached, in one batch; returns the counts of uncached.
+        """
+        missing = list(dict.fromkeys(t for t in texts if t and t not in self._cache))
+        volatile = list(uncached)
+        pending = missing + [t for t in volatile if t]
+        counts = {}
+        if pending and self.batch_fn is not None:
+            counts = dict(zip(pending, self.batch_fn(pending)))
+        elif pending:
+            counts = {t: self.count(t, cache=False) for t in pending}
+        for t in missing:
+            self._store(t, counts[t])
+        return [counts.get(t, 0) for t in volatile]
+
+    def truncate(self, text, max_tokens, marker=" [...]"):
+        """Shortens text (keeping its start) until it fits in max_tokens."""
+        if max_tokens <= 0:
+            return ""
+        n = self.count(text, cache=False)
+        while n > max_tokens and text:
+            keep = max(0, int(len(text) * max_tokens / n * 0.9) - len(marker))
+            text = text[:keep] + marker if keep else ""
+            n = self.count(text, cache=False)
+        return text
+
 class ContextBuilder:
-    def __init__(self, info_text, memory_manager):
+    def __init__(self, info_text, memory_manager, token_counter=None, context_size=2048,
+                 max_tokens=512, safety_margin=32, recent_events=10, reserved_tokens=0,
+                 max_batch_actions=1):
         self.info_text = info_text
         self.memory_manager = memory_manager
+        self.token_counter = token_counter
+        self.context_size = context_size
+        self.max_tokens = max_tokens
+        self.safety_margin = safety_margin
+        self.recent_events = recent_events
+        # Context taken by non-text input, e.g. image tokens in single-pass mode
+        self.reserved_tokens = reserved_tokens
+        self.max_batch_actions = max_batch_actions
+        self.last_budget = None
+        self._prompt_prefix = None
 
     def build_system_prompt(self):
         return """You are an AI agent that has full control over a computer.
@@ -13,28 +89,137 @@ Available Actions:
 - left_click(x=None, y=None): Left click at current position or at (x, y).
 - right_click(x=None, y=None): Right click at current position or at (x, y).
 - drag(start_x, start_y, end_x, end_y, button='left'): Drag from start to end coordinates.
-- type_text(text): Type the provided text.
+- type_text(text, per_char=False): Type the provided text. Set per_char=true only for fields that reject pasted or fast input.
 - press_key(key): Press a specific key (e.g., 'enter', 'tab', 'esc').
-- hotkey(*keys): Press a combination of keys (e.g., 'ctrl', 'c').
+- hotkey(keys): Press a combination of keys given as a list (e.g., ['ctrl', 'c']).
 - screenshot(): Take a screenshot of the current screen.
-- add_to_high_memory(content): Save important information to persistent memory (max 10 items).
+- zoom(x, y, width, height): Observe only this rectangle of the current screenshot, in more detail. Coordinates then refer to the zoomed view.
+- reset_zoom(): Observe the whole screen again.
+- add_to_high_memory(content): Save important information to persistent memory.
 
 Response Format:
 You MUST respond with a valid JSON object containing the next action to take.
 Example: {{"action": "left_click", "params": {{"x": 100, "y": 200}}}}
-
+""" + self._batch_instructions() + """
 Current Machine Information:
 {info_text}
 
-{memory_context}
 """
 
-    def get_full_prompt(self, current_observation=None):
-        memory_context = self.memory_manager.get_full_context_string()
-        system_prompt = self.build_system_prompt().format(
-            info_text=self.info_text,
-            memory_context=memory_context
+    def _batch_instructions(self):
+        if self.max_batch_actions <= 1:
+            return ""
+        return f"""
+When you are sure of several consecutive steps, you may send up to {self.max_batch_actions} actions at once; they run in order and stop at the first failure.
+Each action may set "wait", the seconds to pause before the next one. zoom, reset_zoom and screenshot may only be the last action.
+Example: {{{{"actions": [{{{{"action": "left_click", "params": {{{{"x": 300, "y": 40}}}}}}}}, {{{{"action": "type_text", "params": {{{{"text": "hello"}}}}}}}}, {{{{"action": "press_key", "params": {{{{"key": "enter"}}}}}}}}]}}}}
+"""
+
+    def get_prompt_prefix(self):
+        """
+        Returns the static part of the prompt (instructions, actions, machine info).
+        It is built once and kept byte-identical so the model can reuse its KV cache.
+        """
+        if self._prompt_prefix is None:
+            self._prompt_prefix = self.build_system_prompt().format(info_text=self.info_text)
+        return self._prompt_prefix
+
+    def get_prompt_tail(self, current_observation=None):
+        """Returns the per-step part of the prompt (memory and observation)."""
+        observation = current_observation or 'No observation available.'
+        if self.token_counter is None:
+            memory_context = self.memory_manager.get_full_context_string(current_observation)
+            return f"{memory_context}\n\n\nCurrent Observation: {observation}\n\nNext Action (JSON):"
+        return self._assemble_tail(observation)
+
+    def _assemble_tail(self, observation):
+        """
+        Packs the tail into the space left after the prefix and the reserved
+        generation tokens. Priority: observation, persistent memories, recent
+        events newest first (the oldest are elided first), then past events
+        retrieved from episodic memory for this observation.
+        """
+        counter = self.token_counter
+        obs_template = "\n\n\nCurrent Observation: {}\n\nNext Action (JSON):"
+        memory_lines = self.memory_manager.get_high_memory_lines()
+        event_lines = self.memory_manager.get_short_term_lines(self.recent_events)
+        # Count every new segment and the observation in one tokenizer call
+        obs_tokens, = counter.prefetch(
+            [self.get_prompt_prefix(), obs_template.format(""), "\n\n",
+             "Persistent Memories:\n", "No persistent memories.", "Recent Events:\n", "No recent events.",
+             *memory_lines, *event_lines],
+            uncached=[observation]
         )
 
-        prompt = f"{system_prompt}\n\nCurrent Observation: {current_observation or 'No observation available.'}\n\nNext Action (JSON):"
-        return prompt
+        budget = self.context_size - self.max_tokens - self.safety_margin - self.reserved_tokens
+        budget -= counter.count(self.get_prompt_prefix())
+
+        # The observation always gets in, but may use at most half the budget
+        overhead = counter.count(obs_template.format(""))
+        if obs_tokens > budget // 2 - overhead:
+            observation = counter.truncate(observation, budget // 2 - overhead)
+            obs_tokens = counter.count(observation, cache=False)
+        budget -= obs_tokens + overhead
+
+        memory_section, budget, memories_included = self._pack(
+            memory_lines, budget, "Persistent Memories:\n", "No persistent memories.", newest_first=False
+        )
+
+        event_section, budget, events_included = self._pack(
+            event_lines, budget - counter.count("\n\n"), "Recent Events:\n", "No recent events.", newest_first=True
+        )
+
+        relevant_section, relevant_included = "", 0
+        relevant_lines = self.memory_manager.get_relevant_event_lines(observation)
+        if relevant_lines:
+            counter.prefetch(["Relevant Past Events:\n", *relevant_lines])
+            section, budget, relevant_included = self._pack(
+                relevant_lines, budget - counter.count("\n\n"), "Relevant Past Events:\n", "", newest_first=False
+            )
+            if relevant_included:
+                relevant_section = "\n\n" + section
+
+        self.last_budget = {
+            "remaining_tokens": budget,
+            "memories_included": memories_included,
+            "memories_available": len(memory_lines),
+            "events_included": events_included,
+            "events_available": len(event_lines),
+            "relevant_events_included": relevant_included,
+        }
+        return f"{memory_section}\n\n{event_section}{relevant_section}" + obs_template.format(observation)
+
+    def _pack(self, lines, budget, header, empty_text, newest_first):
+        """Adds lines while they fit; returns (section_text, remaining_budget, lines_included)."""
+        counter = self.token_counter
+        if not lines:
+            return empty_text, budget - counter.count(empty_text), 0
+
+        budget -= counter.count(header)
+        ordered = list(reversed(lines)) if newest_first else list(lines)
+        included = []
+        for line in ordered:
+            n = counter.count(line)
+            if n > budget:
+                # Keep a shortened version of the line if a useful amount fits
+                if budget >= 32:
+                    shortened = counter.truncate(line.rstrip("\n"), budget - 1) + "\n"
+                    included.append(shortened)
+                    budget -= counter.count(shortened, cache=False)
+                break
+            included.append(line)
+            budget -= n
+
+        omitted = len(lines) - len(included)
+        if newest_first:
+            included.reverse()
+        text = header
+        if omitted and newest_first:
+            text += f"({omitted} older entries omitted)\n"
+        text += "".join(included)
+        if omitted and not newest_first:
+            text += f"({omitted} more entries omitted)\n"
+        return text, budget, len(included)
+
+    def get_full_prompt(self, current_observation=None):
+        return self.get_prompt_prefix() + self.get_prompt_tail(current_observation)
@@ -0,0 +1,236 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum, min and max."""
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "min": self.min,
+                "max": self.max,
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+            }
+
+class MetricsRegistry:
+    """
+    Named histograms for the agent loop.
+
+    Stage timings are recorded as "<stage>_seconds"; other values (token
+    counts, rates) use the buckets given on first observation.
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def histogram(self, name, buckets=TIME_BUCKETS):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(buckets))
+        return histogram
+
+    def observe(self, name, value, buckets=TIME_BUCKETS):
+        self.histogram(name, buckets).observe(value)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{stage}_seconds", time.perf_counter() - start)
+
+    def record_generation(self, stats):
+        """Records the token statistics reported by ModelLoader.last_generation."""
+        if not stats:
+            return
+        for key in ("prompt_tokens", "prompt_tokens_evaluated", "generated_tokens"):
+            if stats.get(key) is not None:
+                self.observe(key, stats[key], TOKEN_BUCKETS)
+        if stats.get("tokens_per_second") is not None:
+            self.observe("tokens_per_second", stats["tokens_per_second"], RATE_BUCKETS)
+        if stats.get("time_to_first_token") is not None:
+            self.observe("time_to_first_token_seconds", stats["time_to_first_token"])
+        if stats.get("draft_acceptance_rate") is not None:
+            self.observe("draft_acceptance_rate", stats["draft_acceptance_rate"], RATIO_BUCKETS)
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self.histograms.items())
+        return {
+            "timestamp": time.time(),
+            "uptime": time.time() - self.started,
+            "histograms": {name: h.snapshot() for name, h in items},
+        }
+
+    def to_prometheus(self, prefix="autollm"):
+        lines = []
+        with self._lock:
+            items = sorted(self.histograms.items())
+        for name, histogram in items:
+            snap = histogram.snapshot()
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for le, count in snap["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum {snap['sum']}")
+            lines.append(f"{metric}_count {snap['count']}")
+        return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """
+    Periodically appends registry snapshots to a JSONL file and serves the
+    Prometheus text format on localhost.
+    """
+    def __init__(self, registry, jsonl_path=None, interval=10.0, port=0, extra_fn=None):
+        self.registry = registry
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.interval = interval
+        self.port = port
+        self.extra_fn = extra_fn
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        if self.jsonl_path is not None:
+            self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+            self._thread.start()
+        if self.port:
+            self._start_server()
+
+    def _start_server(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("metrics: " + format, *args)
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            logging.warning("Could not start metrics endpoint on port %s: %s", self.port, e)
+            return
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        logging.info("Serving metrics on http://127.0.0.1:%d/metrics", self.port)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        snapshot = self.registry.snapshot()
+        if self.extra_fn is not None:
+            try:
+                snapshot.update(self.extra_fn())
+            except Exception:
+                logging.debug("Error collecting extra metrics", exc_info=True)
+        try:
+            self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.jsonl_path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+        except Exception as e:
+            logging.exception("Error writing metrics snapshot: %s", e)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+            self.write_snapshot()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class LoopProfiler:
+    """
+    Profiles the first N loop iterations with cProfile and tracemalloc,
+    then writes <output_dir>/agent.prof and <output_dir>/allocations.txt.
+    """
+    def __init__(self, iterations, output_dir):
+        self.remaining = int(iterations)
+        self.output_dir = Path(output_dir)
+        self._profile = None
+
+    def start(self):
+        if self.remaining <= 0:
+            return
+        import cProfile
+        import tracemalloc
+        tracemalloc.start(25)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def step(self):
+        if self._profile is None:
+            return
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.finish()
+
+    def finish(self):
+        if self._profile is None:
+            return
+        import tracemalloc
+        self._profile.disable()
+        allocations = tracemalloc.take_snapshot().statistics("lineno")
+        tracemalloc.stop()
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self._profile.dump_stats(str(self.output_dir / "agent.prof"))
+            with open(self.output_dir / "allocations.txt", "w") as f:
+                for stat in allocations[:50]:
+                    f.write(f"{stat}\n")
+            logging.info("Wrote loop profile to %s", self.output_dir)
+        except Exception as e:
+            logging.exception("Error writing loop profile: %s", e)
+        self._profile = None
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+def frame_fingerprint(frame):
+    """Exact-content key of a Frame: its region plus a digest of its pixels."""
+    digest = hashlib.blake2b(np.ascontiguousarray(frame.array).data, digest_size=16)
+    digest.update(repr((frame.region, frame.array.shape)).encode("utf-8"))
+    return digest.digest()
+
+class ObservationPipeline:
+    """
+    Speculative vision stage for the agent loop.
+
+    While the main thread decides on and executes an action, a background
+    thread polls the screen with its own capture. Once a frame has been
+    identical for two polls, and differs from every frame already
+    described, it encodes the frame and runs the vision pass on it.
+
+    When the main thread needs the next observation, it captures the
+    settled frame and calls take() with that frame's fingerprint. If the
+    stage described the same content, take() returns that description,
+    waiting for it if the pass is still running. Otherwise take() cancels
+    the pass in flight and returns None, and the caller describes the frame
+    itself.
+
+    capture: ScreenCapture-like object used only by the stage thread.
+    region_fn: returns the region to grab (the current zoom region or None).
+    describe_fn: callable(frame, cancel_event) returning a description, or
+        None if cancel_event was set before it finished.
+    """
+    def __init__(self, capture, region_fn, describe_fn, poll_interval=0.2, keep=4):
+        self.capture = capture
+        self._region_fn = region_fn
+        self._describe_fn = describe_fn
+        self.poll_interval = poll_interval
+        self._keep = keep
+        # fingerprint -> description, for frames already described
+        self._described = OrderedDict()
+        self._in_flight = None
+        self._cancel = threading.Event()
+        self._armed = False
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.stats = {"hits": 0, "misses": 0, "described": 0, "cancelled": 0}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ObservationPipeline", daemon=True)
+        self._thread.start()
+
+    def arm(self, fingerprint, description):
+        """
+        Records the description the main thread just used and starts
+        speculating on the frames that follow it.
+        """
+        with self._condition:
+            self._remember(fingerprint, description)
+            self._armed = True
+            self._condition.notify_all()
+
+    def take(self, fingerprint):
+        """
+        Stops speculating and returns the description of the frame with this
+        fingerprint, or None if the stage has not described it.
+        """
+        with self._condition:
+            self._armed = False
+            if self._in_flight not in (None, fingerprint):
+                self._cancel.set()
+            # Wait for the stage to finish; the vision model serves one caller at a time
+            while self._in_flight is not None and not self._stop_event.is_set():
+                self._condition.wait(0.1)
+            description = self._described.get(fingerprint)
+            self.stats["hits" if description is not None else "misses"] += 1
+            return description
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self._cancel.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logging.warning("Observation pipeline did not stop within %.1f seconds.", timeout)
+            self._thread = None
+
+    def _remember(self, fingerprint, description):
+        self._described[fingerprint] = description
+        self._described.move_to_end(fingerprint)
+        while len(self._described) > self._keep:
+            self._described.popitem(last=False)
+
+    def _run(self):
+        previous = None
+        while not self._stop_event.is_set():
+            with self._condition:
+                while not self._armed and not self._stop_event.is_set():
+                    previous = None
+                    self._condition.wait()
+            if self._stop_event.is_set():
+                return
+            try:
+                frame = self.capture.grab(self._region_fn())
+                fingerprint = frame_fingerprint(frame)
+                with self._condition:
+                    # Unsettled frames are not worth a vision pass
+                    start = (self._armed and fingerprint == previous
+                             and fingerprint not in self._described)
+                    if start:
+                        self._in_flight = fingerprint
+                        self._cancel.clear()
+                previous = fingerprint
+                if start:
+                    self._describe(frame, fingerprint)
+            except Exception:
+                logging.exception("Speculative observation failed")
+            self._stop_event.wait(self.poll_interval)
+
+    def _describe(self, frame, fingerprint):
+        description = None
+        try:
+            description = self._describe_fn(frame, self._cancel)
+        finally:
+            with self._condition:
+                if description is not None and not self._cancel.is_set():
+                    self._remember(fingerprint, description)
+                    self.stats["described"] += 1
+                else:
+                    self.stats["cancelled"] += 1
+                self._in_flight = None
+                self._condition.notify_all()
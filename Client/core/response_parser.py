@@ -0,0 +1,88 @@
+import json
+
+class StreamingActionParser:
+    """
+    Incremental parser for streamed LLM output.
+
+    Tracks brace balance, JSON strings and ``` fenced blocks as text arrives,
+    so a complete action object can be returned as soon as its closing brace
+    is emitted instead of waiting for the full completion.
+    """
+    def __init__(self):
+        self.text = ""
+        self.result = None
+        self._pos = 0
+        self._depth = 0
+        self._start = -1
+        self._in_string = False
+        self._escape = False
+        self._fence = None
+
+    def feed(self, chunk):
+        """
+        Appends a chunk of generated text.
+        Returns the action dict once a complete, valid action object has been
+        seen, otherwise None.
+        """
+        if self.result is not None:
+            return self.result
+
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            i = self._pos
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == "`" and self._depth == 0:
+                if len(text) - i < 3:
+                    # Could be the start of a fence; wait for more text
+                    return None
+                if text.startswith("```", i):
+                    if self._fence is None:
+                        newline = text.find("\n", i + 3)
+                        if newline == -1:
+                            return None
+                        self._fence = text[i + 3:newline].strip().lower() or "json"
+                        self._pos = newline + 1
+                    else:
+                        self._fence = None
+                        self._pos = i + 3
+                    continue
+            elif self._fence not in (None, "json"):
+                # Braces inside non-JSON code blocks are not actions
+                pass
+            elif ch == '"' and self._depth > 0:
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pos = i + 1
+                    candidate = self._try_load(text[self._start:i + 1])
+                    if candidate is not None:
+                        self.result = candidate
+                        return candidate
+                    continue
+
+            self._pos += 1
+
+        return None
+
+    def _try_load(self, candidate):
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(obj, dict) and ("action" in obj or isinstance(obj.get("actions"), list)):
+            return obj
+        return None
@@ -0,0 +1,353 @@
+"""
+Session traces: a per-step record of what the agent saw, asked and did.
+
+A trace is a directory of append-only chunk files plus two fixed-size
+index files, so a reader can memory-map it and jump to any step:
+
+- chunk-NNNNNN.bin: records of an 8-byte header (b"AT", kind, 0, uint32
+  length) followed by the payload. Kind b"F" is a PNG frame, b"S" a
+  zlib-compressed JSON step.
+- steps.idx: per step, <step uint64, chunk uint32, offset uint64, length uint32>.
+- frames.idx: per distinct frame, <blake2b-128 digest, chunk, offset, length>.
+- trace.json: format version and settings.
+
+Frames are stored once per distinct pixel content (by hash). Prompts are
+stored as the span that differs from the previous step's prompt, with a
+full copy every keyframe_interval steps to bound reconstruction.
+Client.benchmarks.inspect_trace prints steps and extracts frames.
+"""
+import hashlib
+import io
+import itertools
+import json
+import logging
+import mmap
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+TRACE_VERSION = 1
+RECORD_HEADER = struct.Struct("<2scxI")
+STEP_ENTRY = np.dtype([("step", "<u8"), ("chunk", "<u4"), ("offset", "<u8"), ("length", "<u4")])
+# Digests are raw bytes; an "S16" field would strip trailing NULs
+FRAME_ENTRY = np.dtype([("digest", "u1", (16,)), ("chunk", "<u4"), ("offset", "<u8"), ("length", "<u4")])
+# Bytes charged against max_pending_bytes for a queued step besides its fields
+STEP_OVERHEAD = 256
+
+def _field_size(value):
+    """Approximate bytes a queued step field holds on to."""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    return len(json.dumps(value, default=str))
+
+def _common_prefix(a, b):
+    """Length of the common prefix of two strings, by binary search over C-level slice compares."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix(a, b, limit):
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def prompt_delta(previous, prompt):
+    """Encodes prompt as the span that differs from previous."""
+    prefix = _common_prefix(previous, prompt)
+    suffix = _common_suffix(previous, prompt, min(len(previous), len(prompt)) - prefix)
+    return {"prefix": prefix, "suffix": suffix, "text": prompt[prefix:len(prompt) - suffix]}
+
+def apply_prompt_delta(previous, delta):
+    suffix = previous[len(previous) - delta["suffix"]:] if delta["suffix"] else ""
+    return previous[:delta["prefix"]] + delta["text"] + suffix
+
+class TraceRecorder:
+    """
+    Writes a session trace from a background thread.
+
+    record_step() only copies the frame and queues the step; hashing, PNG
+    encoding and file I/O happen on the writer thread. Everything queued
+    (frames, prompts, completions and other fields) counts against
+    max_pending_bytes. When the writer falls behind, the frame is dropped
+    first, then fields that no longer fit (listed in the step's
+    "dropped_fields"), and only if not even an empty step fits is the
+    whole step dropped, instead of stalling the loop or growing without
+    bound.
+
+    Steps are numbered by the recorder, once per record_step() call, so
+    every record has its own number; a dropped step leaves a gap.
+    """
+    def __init__(self, directory, chunk_size=64 * 1024 * 1024, max_pending_bytes=64 * 1024 * 1024,
+                 keyframe_interval=50, frame_compress_level=1):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.max_pending_bytes = max_pending_bytes
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.frame_compress_level = frame_compress_level
+        self.stats = {"steps": 0, "frames_written": 0, "frames_deduplicated": 0,
+                      "frames_dropped": 0, "fields_dropped": 0, "steps_dropped": 0, "bytes_written": 0}
+        self._steps = itertools.count()
+        self._queue = queue.Queue()
+        self._pending_bytes = 0
+        self._pending_lock = threading.Lock()
+        self._frame_digests = set()
+        self._previous_prompt = None
+        self._prompts_since_keyframe = 0
+        self._chunk_index = -1
+        self._chunk = None
+        self._chunk_offset = 0
+        with open(self.directory / "trace.json", "w") as f:
+            json.dump({"version": TRACE_VERSION, "created": time.time(),
+                       "keyframe_interval": self.keyframe_interval}, f)
+        self._steps_index = open(self.directory / "steps.idx", "ab")
+        self._frames_index = open(self.directory / "frames.idx", "ab")
+        self._thread = threading.Thread(target=self._run, name="TraceWriter", daemon=True)
+        self._thread.start()
+
+    def record_step(self, frame=None, copy_frame=True, **fields):
+        """
+        Queues one step and returns its number. frame is a BGRA array,
+        copied here since capture buffers are reused; pass copy_frame=False
+        for a copy the caller took itself. fields must be JSON-serialisable,
+        and a "prompt" field is delta-encoded.
+        """
+        step = next(self._steps)
+        sizes = {key: _field_size(value) for key, value in fields.items()}
+        dropped = []
+        keep_frame = False
+        with self._pending_lock:
+            available = self.max_pending_bytes - self._pending_bytes
+            size = STEP_OVERHEAD
+            if size <= available:
+                for key, field_size in sizes.items():
+                    if size + field_size <= available:
+                        size += field_size
+                    else:
+                        dropped.append(key)
+                keep_frame = frame is not None and size + frame.nbytes <= available
+                if keep_frame:
+                    size += frame.nbytes
+                self._pending_bytes += size
+        if size > available:
+            self.stats["steps_dropped"] += 1
+            return step
+        if dropped:
+            # A dropped prompt is stored as None, so the next delta refers to the last stored one
+            fields.update((key, None) for key in dropped)
+            fields["dropped_fields"] = dropped
+            self.stats["fields_dropped"] += len(dropped)
+        if frame is not None and not keep_frame:
+            self.stats["frames_dropped"] += 1
+        frame_copy = np.array(frame, copy=copy_frame) if keep_frame else None
+        self._queue.put((step, time.time(), frame_copy, size, fields, frame is not None))
+        return step
+
+    def close(self):
+        """Writes everything still queued and closes the files."""
+        self._queue.put(None)
+        self._thread.join()
+        for f in (self._chunk, self._steps_index, self._frames_index):
+            if f is not None:
+                f.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            step, timestamp, frame, size, fields, had_frame = item
+            try:
+                self._write_step(step, timestamp, frame, fields, had_frame)
+            except Exception:
+                logging.exception("Failed to write trace step %s", step)
+            finally:
+                with self._pending_lock:
+                    self._pending_bytes -= size
+
+    def _write_record(self, kind, payload):
+        length = RECORD_HEADER.size + len(payload)
+        if self._chunk is None or (self._chunk_offset and self._chunk_offset + length > self.chunk_size):
+            if self._chunk is not None:
+                self._chunk.close()
+            self._chunk_index += 1
+            self._chunk = open(self.directory / f"chunk-{self._chunk_index:06d}.bin", "ab")
+            self._chunk_offset = self._chunk.tell()
+        offset = self._chunk_offset
+        self._chunk.write(RECORD_HEADER.pack(b"AT", kind, len(payload)))
+        self._chunk.write(payload)
+        self._chunk_offset += length
+        self.stats["bytes_written"] += length
+        return self._chunk_index, offset + RECORD_HEADER.size, len(payload)
+
+    def _write_frame(self, frame):
+        digest = hashlib.blake2b(frame.data, digest_size=16).digest()
+        if digest in self._frame_digests:
+            self.stats["frames_deduplicated"] += 1
+            return digest
+        height, width = frame.shape[:2]
+        image = Image.frombuffer("RGB", (width, height), frame, "raw", "BGRX", 0, 1)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", compress_level=self.frame_compress_level)
+        chunk, offset, length = self._write_record(b"F", buffer.getvalue())
+        # Data must be on disk before the index entry that points to it
+        self._chunk.flush()
+        entry = np.zeros(1, dtype=FRAME_ENTRY)
+        entry[0] = (np.frombuffer(digest, dtype=np.uint8), chunk, offset, length)
+        self._frames_index.write(entry.tobytes())
+        self._frames_index.flush()
+        self._frame_digests.add(digest)
+        self.stats["frames_written"] += 1
+        return digest
+
+    def _encode_prompt(self, prompt):
+        if self._previous_prompt is None or self._prompts_since_keyframe >= self.keyframe_interval - 1:
+            self._prompts_since_keyframe = 0
+            encoded = {"full": prompt}
+        else:
+            self._prompts_since_keyframe += 1
+            encoded = prompt_delta(self._previous_prompt, prompt)
+        self._previous_prompt = prompt
+        return encoded
+
+    def _write_step(self, step, timestamp, frame, fields, had_frame):
+        record = {"step": step, "timestamp": timestamp}
+        if frame is not None:
+            record["frame"] = self._write_frame(np.ascontiguousarray(frame)).hex()
+        elif had_frame:
+            record["frame_dropped"] = True
+        for key, value in fields.items():
+            if key == "prompt" and value is not None:
+                value = self._encode_prompt(value)
+            record[key] = value
+        payload = zlib.compress(json.dumps(record, default=str).encode("utf-8"), 1)
+        chunk, offset, length = self._write_record(b"S", payload)
+        self._chunk.flush()
+        self._steps_index.write(np.array([(step, chunk, offset, length)], dtype=STEP_ENTRY).tobytes())
+        self._steps_index.flush()
+        self.stats["steps"] += 1
+
+class TraceReader:
+    """
+    Random access to a trace. Chunks are memory-mapped, so reading a step
+    or frame only touches its bytes. Reconstructed prompts are cached, so
+    walking steps in order decodes each delta once.
+    """
+    def __init__(self, directory, prompt_cache_size=64):
+        self.directory = Path(directory)
+        with open(self.directory / "trace.json") as f:
+            self.info = json.load(f)
+        self.steps = self._load_index("steps.idx", STEP_ENTRY)
+        frames = self._load_index("frames.idx", FRAME_ENTRY)
+        self._frames = {entry["digest"].tobytes(): entry for entry in frames}
+        self._maps = {}
+        self._files = {}
+        self._prompts = OrderedDict()
+        self._prompt_cache_size = prompt_cache_size
+
+    def _load_index(self, name, dtype):
+        path = self.directory / name
+        if not path.exists():
+            return np.zeros(0, dtype=dtype)
+        data = path.read_bytes()
+        # Ignore a partially written trailing entry
+        usable = len(data) - len(data) % dtype.itemsize
+        return np.frombuffer(data[:usable], dtype=dtype)
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def frame_count(self):
+        """Number of distinct frames stored."""
+        return len(self._frames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        for f in self._files.values():
+            f.close()
+        self._maps.clear()
+        self._files.clear()
+
+    def _payload(self, chunk, offset, length):
+        m = self._maps.get(chunk)
+        if m is None:
+            f = open(self.directory / f"chunk-{int(chunk):06d}.bin", "rb")
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._files[chunk] = f
+            self._maps[chunk] = m
+        # Slicing an mmap copies just these bytes and leaves no buffer exported
+        return m[int(offset):int(offset) + int(length)]
+
+    def _raw_step(self, index):
+        entry = self.steps[index]
+        return json.loads(zlib.decompress(self._payload(entry["chunk"], entry["offset"], entry["length"])))
+
+    def step(self, index):
+        """Returns step record number index (0-based), with its prompt reconstructed."""
+        record = self._raw_step(index)
+        if "prompt" in record and record["prompt"] is not None:
+            record["prompt"] = self.prompt(index, record["prompt"])
+        return record
+
+    def prompt(self, index, encoded=None):
+        if index in self._prompts:
+            self._prompts.move_to_end(index)
+            return self._prompts[index]
+        if encoded is None:
+            encoded = self._raw_step(index).get("prompt")
+        if encoded is None:
+            return None
+        if "full" in encoded:
+            prompt = encoded["full"]
+        else:
+            # Deltas are relative to the closest earlier step that had a prompt
+            previous_index = index - 1
+            while previous_index >= 0 and self._raw_step(previous_index).get("prompt") is None:
+                previous_index -= 1
+            prompt = apply_prompt_delta(self.prompt(previous_index), encoded)
+        self._prompts[index] = prompt
+        if len(self._prompts) > self._prompt_cache_size:
+            self._prompts.popitem(last=False)
+        return prompt
+
+    def frame_bytes(self, index):
+        """Returns the PNG bytes of step index's frame, or None."""
+        digest = self._raw_step(index).get("frame")
+        if digest is None:
+            return None
+        entry = self._frames.get(bytes.fromhex(digest))
+        if entry is None:
+            return None
+        return self._payload(entry["chunk"], entry["offset"], entry["length"])
+
+    def frame(self, index):
+        data = self.frame_bytes(index)
+        return Image.open(io.BytesIO(data)) if data is not None else None
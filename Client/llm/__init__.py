@@ -1 +1,9 @@
-from .model_loader import ModelLoader
+from .._lazy import lazy_exports
+
+_EXPORTS = {
+    "ModelLoader": ".model_loader",
+    "RemoteLlama": ".remote"
+}
+
+__all__ = list(_EXPORTS)
+__getattr__ = lazy_exports(globals(), _EXPORTS)
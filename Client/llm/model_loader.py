@@ -1,110 +1,832 @@
+import hashlib
+import json
 import logging
-from llama_cpp import Llama
-try:
-    from llama_cpp.llava import LlavaChatHandler
-except ImportError:
-    LlavaChatHandler = None
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+from PIL import Image
+
+# llama_cpp is imported on first use: it loads the native library, which
+# processes that never load a model (or use the inference server) don't need
+
+def load_llama(**kwargs):
+    """Default model factory: constructs a llama_cpp.Llama."""
+    from llama_cpp import Llama
+    return Llama(**kwargs)
+
+def llava_chat_handler():
+    """Returns the LLaVA chat handler class of the installed llama-cpp-python, or None."""
+    try:
+        from llama_cpp.llava import LlavaChatHandler
+    except ImportError:
+        # llama-cpp-python ships the LLaVA handler in llama_chat_format
+        try:
+            from llama_cpp.llama_chat_format import Llava15ChatHandler as LlavaChatHandler
+        except ImportError:
+            return None
+    return LlavaChatHandler
+
+def perceptual_hash(image, hash_size=16):
+    """
+    Computes a difference hash (dHash) of a PIL Image.
+    Returns an int with hash_size * hash_size bits; visually similar
+    images produce hashes with a small Hamming distance.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def content_hash(image):
+    """Exact-content key of a PIL Image: any pixel change gives a different key."""
+    digest = hashlib.blake2b(image.tobytes(), digest_size=16)
+    digest.update(f"{image.mode}{image.size}".encode("utf-8"))
+    return int.from_bytes(digest.digest(), "big")
+
+# Prompt prefix state files: header (magic, format version, cache key digest,
+# metadata length), JSON metadata describing each field, then the raw field data
+PREFIX_STATE_MAGIC = b"ALPS"
+PREFIX_STATE_VERSION = 1
+PREFIX_STATE_HEADER = struct.Struct("<4sI32sI")
+
+def save_prefix_state(path, key, state):
+    """
+    Writes a model state (llama_cpp's LlamaState or similar) to path.
+    Fields must be ints, bytes or numpy arrays; nothing is pickled.
+    """
+    fields = {}
+    chunks = []
+    offset = 0
+    for name, value in vars(state).items():
+        if isinstance(value, np.ndarray):
+            data = np.ascontiguousarray(value)
+            if data.dtype.hasobject:
+                raise TypeError(f"State field '{name}' holds Python objects")
+            entry = {"kind": "array", "dtype": data.dtype.str, "shape": list(data.shape)}
+            data = data.tobytes()
+        elif isinstance(value, (bytes, bytearray)):
+            entry = {"kind": "bytes"}
+            data = bytes(value)
+        elif isinstance(value, (int, np.integer)):
+            fields[name] = {"kind": "int", "value": int(value)}
+            continue
+        else:
+            raise TypeError(f"Cannot store state field '{name}' of type {type(value).__name__}")
+        entry.update(offset=offset, length=len(data))
+        fields[name] = entry
+        chunks.append(data)
+        offset += len(data)
+    metadata = json.dumps({"fields": fields}).encode("utf-8")
+    # Use a temporary file for atomic write
+    temp_path = path.with_suffix(".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(PREFIX_STATE_HEADER.pack(PREFIX_STATE_MAGIC, PREFIX_STATE_VERSION, key, len(metadata)))
+        f.write(metadata)
+        for data in chunks:
+            f.write(data)
+    temp_path.replace(path)
+
+def load_prefix_state(path, key):
+    """
+    Reads a state written by save_prefix_state. Raises ValueError if the
+    file is not a prefix state of this format version for this key.
+    """
+    with open(path, "rb") as f:
+        header = f.read(PREFIX_STATE_HEADER.size)
+        if len(header) != PREFIX_STATE_HEADER.size:
+            raise ValueError("truncated header")
+        magic, version, stored_key, metadata_length = PREFIX_STATE_HEADER.unpack(header)
+        if magic != PREFIX_STATE_MAGIC or version != PREFIX_STATE_VERSION:
+            raise ValueError("not a prefix state file of this version")
+        if stored_key != key:
+            raise ValueError("state was saved for a different model or prefix")
+        fields = json.loads(f.read(metadata_length))["fields"]
+        data = f.read()
+    values = {}
+    for name, entry in fields.items():
+        if entry["kind"] == "int":
+            values[name] = int(entry["value"])
+            continue
+        start, length = int(entry["offset"]), int(entry["length"])
+        if start + length > len(data):
+            raise ValueError(f"truncated field '{name}'")
+        raw = data[start:start + length]
+        if entry["kind"] == "bytes":
+            values[name] = raw
+        else:
+            dtype = np.dtype(entry["dtype"])
+            if dtype.hasobject:
+                raise ValueError(f"field '{name}' has an object dtype")
+            values[name] = np.frombuffer(raw, dtype=dtype).reshape(entry["shape"])
+    # Llama.load_state only reads these attributes
+    return SimpleNamespace(**values)
+
+def prewarm_file(path, chunk_size=16 * 1024 * 1024):
+    """Reads a file sequentially so its pages are in the OS page cache before mmap."""
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while f.readinto(view):
+            pass
+
+class VisionCache:
+    """
+    LRU cache of vision descriptions.
+
+    With max_distance 0 (the default) screens are keyed by exact content,
+    so only an unchanged screen hits. With max_distance > 0 they are keyed
+    by perceptual hash and a lookup hits when a stored hash is within
+    max_distance bits of the query; small UI changes (a typed word, a
+    toggled checkbox) can then return the previous screen's description.
+    If storage_path is set, entries are persisted so a restarted agent
+    starts with a warm cache.
+    """
+    def __init__(self, capacity=64, max_distance=0, hash_size=16, storage_path=None, model_id=None):
+        self.capacity = max(1, int(capacity))
+        self.max_distance = max(0, int(max_distance))
+        self.hash_size = int(hash_size)
+        self.storage_path = Path(storage_path) if storage_path else None
+        self.model_id = model_id
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def key_type(self):
+        return "dhash" if self.max_distance > 0 else "exact"
+
+    def hash_image(self, image):
+        if self.max_distance > 0:
+            return perceptual_hash(image, self.hash_size)
+        return content_hash(image)
+
+    def get(self, image_hash):
+        with self._lock:
+            key = image_hash
+            if key not in self.entries:
+                key = None
+                if self.max_distance > 0:
+                    best = self.max_distance + 1
+                    for candidate in self.entries:
+                        distance = (candidate ^ image_hash).bit_count()
+                        if distance < best:
+                            key, best = candidate, distance
+            if key is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+    def put(self, image_hash, description):
+        with self._lock:
+            self.entries[image_hash] = description
+            self.entries.move_to_end(image_hash)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        self._save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.entries),
+        }
+
+    def _load(self):
+        if not self.storage_path or not self.storage_path.exists():
+            return
+        try:
+            with open(self.storage_path, "r") as f:
+                data = json.load(f)
+            if (data.get("hash_size") != self.hash_size or data.get("model_id") != self.model_id
+                    or data.get("key_type", "dhash") != self.key_type):
+                logging.info("Discarding vision cache built for a different model or key type.")
+                return
+            for key, description in data.get("entries", [])[-self.capacity:]:
+                self.entries[int(key, 16)] = description
+        except Exception as e:
+            logging.exception("Error loading vision cache: %s", e)
+            self.entries.clear()
+
+    def _save(self):
+        if not self.storage_path:
+            return
+        with self._lock:
+            data = {
+                "hash_size": self.hash_size,
+                "key_type": self.key_type,
+                "model_id": self.model_id,
+                "entries": [[format(k, "x"), v] for k, v in self.entries.items()],
+            }
+        try:
+            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+            # Use a temporary file for atomic write
+            temp_path = self.storage_path.with_suffix(".tmp")
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            temp_path.replace(self.storage_path)
+        except Exception as e:
+            logging.exception("Error saving vision cache: %s", e)
 
 class ModelLoader:
-    def __init__(self, config):
+    def __init__(self, config, model_factory=None, chat_handler_factory=None):
         self.config = config
+        # Callable with Llama's constructor signature; replaceable for offline benchmarks
+        self.model_factory = model_factory or load_llama
+        # Resolved from llama_cpp when a vision model is loaded, if not given
+        self.chat_handler_factory = chat_handler_factory
+        # When set, models are served by the shared inference server instead of loaded here
+        self.server_url = config.get("inference_server_url") or None
+        # One multimodal model picks actions straight from the screenshot; no text model is loaded
+        self.single_pass = bool(config.get("single_pass_multimodal", False))
         self.text_model = None
         self.vision_model = None
+        self.embedding_model = None
+        self._embedding_lock = threading.Lock()
+        self._vision_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Seconds spent per load stage (prewarm, load, warmup, total)
+        self.load_times = {}
         self.vision_model_failed = False
         self.vision_model_error = None
+        self.vision_cache = None
+        self.action_schema = None
+        self.action_grammar = None
+        self.last_generation = None
+        # Tracks draft acceptance when speculative decoding is on
+        self.speculation = None
+        # Counting reused prompt tokens needs an extra tokenize, so it is opt-in
+        self.track_prompt_tokens = bool(config.get("metrics_enabled", False))
+        if config.get("vision_cache_enabled", False):
+            self.vision_cache = VisionCache(
+                capacity=config.get("vision_cache_size", 64),
+                max_distance=config.get("vision_cache_max_distance", 0),
+                hash_size=config.get("vision_cache_hash_size", 16),
+                storage_path=config.get("vision_cache_path") or None,
+                model_id=config.get("vision_model_path") or None
+            )
+
+    def _remote_model(self, role):
+        from .remote import RemoteLlama
+        return RemoteLlama(self.server_url, role=role, timeout=self.config.get("inference_server_timeout", 300.0))
+
+    def _connect_server(self):
+        logging.info("Connecting to inference server at %s...", self.server_url)
+        text_model = self._remote_model("text")
+        try:
+            roles = text_model.health().get("roles", [])
+        except Exception:
+            logging.exception("Failed to reach inference server")
+            raise
+        if self.single_pass:
+            if "vision" not in roles:
+                raise RuntimeError("single_pass_multimodal requires a vision model on the inference server")
+            self.vision_model = self._remote_model("vision")
+            logging.info("Using remote multimodal model.")
+            return
+        self.text_model = text_model
+        logging.info("Using remote text model.")
+
+        if self.config.get("use_vision_model"):
+            if "vision" in roles:
+                self.vision_model = self._remote_model("vision")
+                logging.info("Using remote vision model.")
+            else:
+                self.vision_model_failed = True
+                self.vision_model_error = RuntimeError("inference server has no vision model loaded")
+                logging.error("use_vision_model is True but the inference server has no vision model.")
+
+    def _model_kwargs(self, n_ctx=None):
+        """Constructor options shared by every local model."""
+        kwargs = {
+            "n_ctx": n_ctx or self.config.get("context_size", 2048),
+            "n_gpu_layers": self.config.get("n_gpu_layers", 0),
+            "n_batch": self.config.get("n_batch", 512),
+            "use_mmap": self.config.get("use_mmap", True),
+            "use_mlock": self.config.get("use_mlock", False),
+            "verbose": False
+        }
+        if self.config.get("n_threads"):
+            kwargs["n_threads"] = self.config.get("n_threads")
+        return kwargs
+
+    def _timed(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._load_lock:
+                self.load_times[stage] = self.load_times.get(stage, 0.0) + time.perf_counter() - start
 
     def load_models(self):
+        if self.server_url:
+            self._connect_server()
+            return
+
+        start = time.perf_counter()
+        if self.single_pass:
+            self._load_single_pass_model()
+            self.load_times["total"] = time.perf_counter() - start
+            return
+
         model_path = self.config.get("model_path")
         if not model_path:
             raise ValueError("model_path not specified in config")
 
+        vision_path = self._vision_model_path()
+        lazy_vision = vision_path and self.config.get("lazy_vision_model", False)
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="ModelLoad") as pool:
+            # llama.cpp releases the GIL while loading, so both loads make progress
+            text_future = pool.submit(self._load_text_model, model_path)
+            if vision_path and not lazy_vision:
+                pool.submit(self._load_vision_model, vision_path)
+            elif lazy_vision and self.config.get("prewarm_models", False):
+                # Read the weights into the page cache in the background so the deferred load is fast
+                threading.Thread(
+                    target=self._timed, args=("vision_prewarm", prewarm_file, vision_path),
+                    name="VisionPrewarm", daemon=True
+                ).start()
+            text_future.result()
+
+        if self.config.get("model_warmup", True):
+            self._timed("warmup", self._warm_up)
+        self.load_times["total"] = time.perf_counter() - start
+        logging.info("Model load times: %s", ", ".join(
+            f"{stage}={seconds:.2f}s" for stage, seconds in self.load_times.items()
+        ))
+
+    def _load_single_pass_model(self):
+        vision_model_path = self.config.get("vision_model_path")
+        if not vision_model_path:
+            raise ValueError("single_pass_multimodal requires vision_model_path")
+        if not (self.config.get("clip_model_path") and self._chat_handler_factory()):
+            raise ValueError("single_pass_multimodal requires clip_model_path and a llava chat handler")
+        self._load_vision_model(vision_model_path)
+        if self.vision_model_failed:
+            raise RuntimeError(f"Failed to load multimodal model: {self.vision_model_error}")
+
+    def _vision_model_path(self):
+        if not self.config.get("use_vision_model"):
+            return None
+        vision_model_path = self.config.get("vision_model_path")
+        if not vision_model_path:
+            logging.warning("use_vision_model is True but vision_model_path is not specified.")
+        return vision_model_path or None
+
+    def _load_text_model(self, model_path):
         try:
+            if self.config.get("prewarm_models", False):
+                self._timed("text_prewarm", prewarm_file, model_path)
+            kwargs = dict(self._model_kwargs(), model_path=model_path)
+            if self.config.get("speculative_decoding"):
+                from .speculative import build_draft_model
+                self.speculation = self._timed("draft_load", build_draft_model, self.config, self.model_factory, self._model_kwargs())
+            if self.speculation is not None:
+                kwargs["draft_model"] = self.speculation
+                logging.info("Speculative decoding with %s drafts.", self.speculation.name)
             logging.info("Loading text model from %s...", model_path)
-            self.text_model = Llama(
-                model_path=model_path,
-                n_ctx=self.config.get("context_size", 2048),
-                n_gpu_layers=self.config.get("n_gpu_layers", 0),
-                verbose=False
-            )
+            self.text_model = self._timed("text_load", self.model_factory, **kwargs)
             logging.info("Text model loaded successfully.")
         except Exception:
             logging.exception("Failed to load text model")
             raise
 
-        if self.config.get("use_vision_model"):
-            vision_model_path = self.config.get("vision_model_path")
+    def _chat_handler_factory(self):
+        if self.chat_handler_factory is None:
+            self.chat_handler_factory = llava_chat_handler()
+        return self.chat_handler_factory
+
+    def _load_vision_model(self, vision_model_path):
+        try:
+            chat_handler = None
             clip_model_path = self.config.get("clip_model_path")
+            if clip_model_path and self._chat_handler_factory():
+                logging.info("Initializing vision chat handler with %s...", clip_model_path)
+                chat_handler = self._timed("clip_load", self.chat_handler_factory, clip_model_path=clip_model_path)
 
-            if not vision_model_path:
-                logging.warning("use_vision_model is True but vision_model_path is not specified.")
-            else:
-                try:
-                    chat_handler = None
-                    if clip_model_path and LlavaChatHandler:
-                        logging.info("Initializing vision chat handler with %s...", clip_model_path)
-                        chat_handler = LlavaChatHandler(clip_model_path=clip_model_path)
-
-                    logging.info("Loading vision model from %s...", vision_model_path)
-                    self.vision_model = Llama(
-                        model_path=vision_model_path,
-                        chat_handler=chat_handler,
-                        n_ctx=self.config.get("context_size", 2048),
-                        n_gpu_layers=self.config.get("n_gpu_layers", 0),
-                        verbose=False
-                    )
-                    logging.info("Vision model loaded successfully.")
-                except Exception as e:
-                    self.vision_model_failed = True
-                    self.vision_model_error = e
-                    logging.exception("Failed to load vision model")
-
-    def generate_completion(self, prompt, max_tokens=512, stop=None):
+            if self.config.get("prewarm_models", False):
+                self._timed("vision_prewarm", prewarm_file, vision_model_path)
+            logging.info("Loading vision model from %s...", vision_model_path)
+            self.vision_model = self._timed("vision_load", self.model_factory, **dict(
+                self._model_kwargs(), model_path=vision_model_path, chat_handler=chat_handler
+            ))
+            logging.info("Vision model loaded successfully.")
+        except Exception as e:
+            self.vision_model_failed = True
+            self.vision_model_error = e
+            logging.exception("Failed to load vision model")
+
+    def _ensure_vision_model(self):
+        """Loads a lazily configured vision model on first use."""
+        if self.vision_model is not None or self.vision_model_failed or self.server_url:
+            return
+        vision_path = self._vision_model_path()
+        if not vision_path:
+            return
+        with self._vision_lock:
+            if self.vision_model is None and not self.vision_model_failed:
+                self._load_vision_model(vision_path)
+
+    def _warm_up(self):
+        """
+        Runs one short evaluation so first-use costs (page faults, buffer
+        allocation, thread start-up) are not paid by the first real step.
+        """
+        try:
+            tokens = self.text_model.tokenize(b"Hello", add_bos=True, special=False)
+            self.text_model.eval(tokens)
+            self.text_model.reset()
+        except Exception as e:
+            logging.warning("Model warm-up failed: %s", e)
+
+    def set_action_schema(self, schema):
+        """
+        Constrains every text completion to the given JSON schema by compiling
+        it to a llama.cpp GBNF grammar. With an inference server the schema is
+        sent with each request and compiled there. Passing None removes the
+        constraint.
+        """
+        grammar = None
+        if schema is not None and not self.server_url:
+            from llama_cpp import LlamaGrammar
+            grammar = LlamaGrammar.from_json_schema(json.dumps(schema), verbose=False)
+        self.action_schema = schema
+        self.action_grammar = grammar
+
+    def _constraint(self):
+        """Keyword arguments that constrain a completion to the action schema."""
+        if self.server_url:
+            return {"json_schema": self.action_schema} if self.action_schema is not None else {}
+        return {"grammar": self.action_grammar}
+
+    def _prefix_state_key(self, prefix):
+        """Returns (path, key digest) for the saved state of prefix, or (None, None)."""
+        cache_dir = self.config.get("prompt_cache_dir")
+        if not cache_dir:
+            return None, None
+        import llama_cpp
+        key = hashlib.sha256()
+        for part in (
+            llama_cpp.__version__,
+            str(self.config.get("model_path")),
+            str(self.config.get("context_size", 2048)),
+            prefix,
+        ):
+            key.update(part.encode("utf-8"))
+            key.update(b"\0")
+        return Path(cache_dir) / f"prefix_{key.hexdigest()[:32]}.state", key.digest()
+
+    def prime_prompt_prefix(self, prefix):
+        """
+        Evaluates the static prompt prefix into the text model's KV cache.
+
+        Subsequent completions whose prompt starts with this prefix only
+        evaluate the remaining tokens, via llama-cpp's prefix matching. If
+        prompt_cache_dir is set, the evaluated state is saved to disk and
+        restored on later runs instead of being re-evaluated.
+        """
+        if self.single_pass:
+            # The llava chat handler re-evaluates the whole prompt on every call
+            logging.debug("Prompt prefix priming is not used in single-pass mode.")
+            return
         if not self.text_model:
             raise RuntimeError("Text model not loaded")
 
+        if self.server_url:
+            # The server keeps the prefix in the KV cache of the slot this client is pinned to
+            self.text_model.prime(prefix)
+            return
+
+        state_path, state_key = self._prefix_state_key(prefix)
+        if state_path is not None and state_path.exists():
+            try:
+                state = load_prefix_state(state_path, state_key)
+                self.text_model.load_state(state)
+                logging.info("Restored prompt prefix state (%d tokens) from %s", state.n_tokens, state_path)
+                return
+            except Exception as e:
+                logging.warning("Could not restore prompt prefix state from %s: %s", state_path, e)
+
+        tokens = self.text_model.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+        logging.info("Evaluating prompt prefix (%d tokens)...", len(tokens))
+        self.text_model.reset()
+        self.text_model.eval(tokens)
+
+        if state_path is not None:
+            try:
+                state_path.parent.mkdir(parents=True, exist_ok=True)
+                save_prefix_state(state_path, state_key, self.text_model.save_state())
+                logging.info("Saved prompt prefix state to %s", state_path)
+            except Exception as e:
+                logging.warning("Could not save prompt prefix state to %s: %s", state_path, e)
+
+    def count_tokens(self, text):
+        """Counts tokens with the action model's tokenizer (no BOS)."""
+        model = self.vision_model if self.single_pass else self.text_model
+        if not model:
+            raise RuntimeError("Text model not loaded")
+        return len(model.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+    def count_tokens_batch(self, texts):
+        """Counts tokens for several texts; a remote model tokenizes them in one request."""
+        model = self.vision_model if self.single_pass else self.text_model
+        if not model:
+            raise RuntimeError("Text model not loaded")
+        if self.server_url:
+            return [len(tokens) for tokens in model.tokenize_batch(texts, add_bos=False, special=True)]
+        return [self.count_tokens(text) for text in texts]
+
+    def _load_embedding_model(self):
+        if self.server_url:
+            self.embedding_model = self._remote_model("embedding")
+            return
+        # llama.cpp only returns embeddings from a context created with embedding=True,
+        # so this is a second context; weights are memory-mapped and shared with the text model
+        model_path = self.config.get("embedding_model_path") or self.config.get("model_path")
+        if not model_path:
+            raise ValueError("model_path not specified in config")
+        logging.info("Loading embedding model from %s...", model_path)
+        self.embedding_model = self._timed("embedding_load", self.model_factory, **dict(
+            self._model_kwargs(n_ctx=self.config.get("embedding_context_size", 512)),
+            model_path=model_path,
+            embedding=True
+        ))
+
+    def embed(self, texts):
+        """
+        Returns an (len(texts), dim) float32 array of embeddings. The embedding
+        model is loaded on first use. Per-token outputs (models without a
+        pooling layer) are mean-pooled.
+        """
+        with self._embedding_lock:
+            if self.embedding_model is None:
+                self._load_embedding_model()
+            vectors = self.embedding_model.embed(list(texts), truncate=True)
+        return np.stack([
+            np.asarray(v, dtype=np.float32).reshape(-1, np.shape(v)[-1]).mean(axis=0) for v in vectors
+        ])
+
+    def _prompt_token_stats(self, prompt):
+        """Returns (prompt_tokens, tokens_to_evaluate) given the current KV cache contents."""
+        tokens = self.text_model.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+        cached = self.text_model.input_ids
+        n = min(len(tokens) - 1, len(cached))
+        reused = 0
+        if n > 0:
+            mismatch = np.flatnonzero(np.asarray(tokens[:n]) != cached[:n])
+            reused = int(mismatch[0]) if len(mismatch) else n
+        return len(tokens), len(tokens) - reused
+
+    def _begin_generation(self, prompt):
+        stats = {"prompt_tokens": None, "prompt_tokens_evaluated": None}
+        # The KV cache of a remote model is not visible here. Scoring speculation
+        # needs the prompt length to know where generation ended
+        tracked = self.track_prompt_tokens or self.speculation is not None
+        if tracked and not self.server_url and not self.single_pass:
+            try:
+                stats["prompt_tokens"], stats["prompt_tokens_evaluated"] = self._prompt_token_stats(prompt)
+            except Exception:
+                logging.debug("Could not count prompt tokens", exc_info=True)
+        if self.speculation is not None and not self.single_pass:
+            self.speculation.begin()
+        stats["start"] = time.perf_counter()
+        return stats
+
+    def _end_generation(self, stats, generated_tokens, first_token_time=None):
+        start = stats.pop("start")
+        elapsed = time.perf_counter() - start
+        stats["generated_tokens"] = generated_tokens
+        stats["seconds"] = elapsed
+        decode_time = elapsed
+        if first_token_time is not None:
+            # Time to first token is dominated by prompt evaluation
+            stats["time_to_first_token"] = first_token_time - start
+            decode_time = elapsed - stats["time_to_first_token"]
+        stats["tokens_per_second"] = generated_tokens / decode_time if decode_time > 0 and generated_tokens else None
+        if self.speculation is not None and not self.single_pass:
+            model = self.text_model
+            speculation = self.speculation.settle(
+                model.input_ids[:model.n_tokens], generated_tokens, decode_time, stats["prompt_tokens"]
+            )
+            stats["draft_tokens"] = speculation["drafted"]
+            stats["accepted_draft_tokens"] = speculation["accepted"]
+            stats["draft_acceptance_rate"] = speculation["acceptance_rate"]
+        self.last_generation = stats
+
+    def generate_completion(self, prompt, max_tokens=None, stop=None):
+        if not self.text_model:
+            raise RuntimeError("Text model not loaded")
+
+        if max_tokens is None:
+            max_tokens = self.config.get("max_tokens", 512)
+        stats = self._begin_generation(prompt)
         response = self.text_model(
             prompt,
             max_tokens=max_tokens,
             stop=stop,
-            echo=False
+            echo=False,
+            **self._constraint()
         )
+        usage = response.get('usage') or {}
+        if stats["prompt_tokens"] is None:
+            stats["prompt_tokens"] = usage.get('prompt_tokens')
+        self._end_generation(stats, usage.get('completion_tokens', 0))
         return response['choices'][0]['text']
 
-    def describe_image(self, base64_image):
+    def stream_completion(self, prompt, max_tokens=None, stop=None):
+        """
+        Yields the completion text chunk by chunk as tokens are generated.
+        Closing the generator cancels the remaining generation.
+        """
+        if not self.text_model:
+            raise RuntimeError("Text model not loaded")
+
+        if max_tokens is None:
+            max_tokens = self.config.get("max_tokens", 512)
+        stats = self._begin_generation(prompt)
+        stream = self.text_model(
+            prompt,
+            max_tokens=max_tokens,
+            stop=stop,
+            echo=False,
+            stream=True,
+            **self._constraint()
+        )
+        generated = 0
+        first_token_time = None
+        try:
+            for chunk in stream:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                # Each streamed chunk corresponds to one sampled token
+                generated += 1
+                yield chunk['choices'][0]['text']
+        finally:
+            stream.close()
+            self._end_generation(stats, generated, first_token_time)
+
+    def _multimodal_messages(self, system_prompt, user_text, screenshot):
+        # Static instructions go in the system message; the screenshot precedes the per-step text
+        return [
+            {"role": "system", "content": system_prompt},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": screenshot.data_url}},
+                    {"type": "text", "text": user_text}
+                ]
+            }
+        ]
+
+    def generate_multimodal_completion(self, system_prompt, user_text, screenshot, max_tokens=None):
         """
-        Generates a description of the provided base64 image using the vision model.
+        Single-pass mode: the multimodal model sees the screenshot and the
+        action prompt together and returns the action text directly.
+        screenshot: a LazyScreenshot-like object exposing `data_url`.
         """
+        if not self.vision_model:
+            raise RuntimeError("Multimodal model not loaded")
+
+        if max_tokens is None:
+            max_tokens = self.config.get("max_tokens", 512)
+        stats = self._begin_generation(user_text)
+        response = self.vision_model.create_chat_completion(
+            messages=self._multimodal_messages(system_prompt, user_text, screenshot),
+            max_tokens=max_tokens,
+            **self._constraint()
+        )
+        usage = response.get('usage') or {}
+        stats["prompt_tokens"] = usage.get('prompt_tokens')
+        self._end_generation(stats, usage.get('completion_tokens', 0))
+        return response['choices'][0]['message']['content']
+
+    def stream_multimodal_completion(self, system_prompt, user_text, screenshot, max_tokens=None):
+        """Streaming variant of generate_multimodal_completion; closing the generator cancels generation."""
+        if not self.vision_model:
+            raise RuntimeError("Multimodal model not loaded")
+
+        if max_tokens is None:
+            max_tokens = self.config.get("max_tokens", 512)
+        stats = self._begin_generation(user_text)
+        stream = self.vision_model.create_chat_completion(
+            messages=self._multimodal_messages(system_prompt, user_text, screenshot),
+            max_tokens=max_tokens,
+            **self._constraint(),
+            stream=True
+        )
+        generated = 0
+        first_token_time = None
+        try:
+            for chunk in stream:
+                text = chunk['choices'][0].get('delta', {}).get('content')
+                if not text:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                generated += 1
+                yield text
+        finally:
+            stream.close()
+            self._end_generation(stats, generated, first_token_time)
+
+    def describe_image(self, screenshot, image=None, cancel=None):
+        """
+        Generates a description of the provided screenshot using the vision model.
+        screenshot: a base64 PNG string, or a LazyScreenshot-like object exposing
+            `image` and `data_url`, which is only encoded on a cache miss.
+        image: optional PIL Image used as the vision cache key.
+        cancel: optional threading.Event; the description is streamed and
+            abandoned (returning None) as soon as it is set.
+        """
+        self._ensure_vision_model()
         if self.vision_model_failed:
             return f"Vision model failed to load: {self.vision_model_error}"
         if not self.vision_model:
             return "Vision model not configured."
 
+        if isinstance(screenshot, str):
+            image_url = f"data:image/png;base64,{screenshot}"
+        else:
+            image_url = None
+            if image is None and self.vision_cache is not None:
+                image = screenshot.image
+
+        image_hash = None
+        if self.vision_cache is not None and image is not None:
+            image_hash = self.vision_cache.hash_image(image)
+            cached = self.vision_cache.get(image_hash)
+            if cached is not None:
+                logging.info("Vision cache hit (%s)", self.vision_cache.stats())
+                return cached
+
         # Note: For multi-modal GGUF (like LLaVA), llama-cpp-python typically needs
         # a CLIP adapter. This implementation assumes the vision_model is either
         # a multi-modal model or handles image input via a chat-like interface.
 
         try:
+            if image_url is None:
+                image_url = screenshot.data_url
+
             # If the model is a Chat completion compatible model, we use chat format
             messages = [
                 {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": "Describe this computer screen for a text-based AI assistant. What do you see? What windows are open? What are the coordinates of important elements?"},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+                        {"type": "image_url", "image_url": {"url": image_url}}
                     ]
                 }
             ]
 
             # This requires the vision_model to have a chat_handler set up during initialization.
-            response = self.vision_model.create_chat_completion(
-                messages=messages,
-                max_tokens=512
-            )
-            return response['choices'][0]['message']['content']
+            if cancel is None:
+                response = self.vision_model.create_chat_completion(
+                    messages=messages,
+                    max_tokens=512
+                )
+                description = response['choices'][0]['message']['content']
+            else:
+                description = self._stream_description(messages, cancel)
+                if description is None:
+                    return None
+            if image_hash is not None:
+                self.vision_cache.put(image_hash, description)
+            return description
         except Exception as e:
             logging.exception("Vision description failed")
             return f"Error describing image: {e}"
 
+    def _stream_description(self, messages, cancel):
+        if cancel.is_set():
+            return None
+        stream = self.vision_model.create_chat_completion(messages=messages, max_tokens=512, stream=True)
+        parts = []
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    return None
+                parts.append(chunk['choices'][0].get('delta', {}).get('content') or "")
+        finally:
+            stream.close()
+        return "".join(parts)
+
     def unload_models(self):
         if self.text_model:
             del self.text_model
@@ -112,6 +834,9 @@ class ModelLoader:
         if self.vision_model:
             del self.vision_model
             self.vision_model = None
+        if self.embedding_model:
+            del self.embedding_model
+            self.embedding_model = None
 
         # Reset failure states
         self.vision_model_failed = False
@@ -0,0 +1,106 @@
+import json
+import os
+import socket
+import urllib.error
+import urllib.request
+
+def default_client_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class RemoteLlama:
+    """
+    Proxy for a model held by the shared inference server (Server/inference).
+
+    Implements the subset of llama_cpp.Llama used by ModelLoader, so the
+    rest of the client works unchanged. `role` selects the server model:
+    "text", "vision" or "embedding".
+    """
+    def __init__(self, base_url, role="text", client_id=None, timeout=300.0):
+        self.base_url = base_url.rstrip("/")
+        self.role = role
+        self.client_id = client_id or default_client_id()
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            headers={"Content-Type": "application/json", "X-Client-Id": self.client_id}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except Exception:
+                message = e.reason
+            raise RuntimeError(f"Inference server error ({e.code}) on {path}: {message}") from None
+
+    def _post(self, path, payload):
+        with self._request(path, payload) as response:
+            return json.loads(response.read())
+
+    def health(self):
+        with self._request("/health") as response:
+            return json.loads(response.read())
+
+    def tokenize(self, text, add_bos=True, special=False):
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", errors="replace")
+        payload = {"text": text, "add_bos": add_bos, "special": special, "role": self.role}
+        return self._post("/v1/tokenize", payload)["tokens"]
+
+    def tokenize_batch(self, texts, add_bos=True, special=False):
+        """Tokenizes several strings in one request; returns one token list per string."""
+        payload = {"texts": list(texts), "add_bos": add_bos, "special": special, "role": self.role}
+        return self._post("/v1/tokenize", payload)["tokens"]
+
+    def prime(self, prompt):
+        """Evaluates prompt into this client's server slot so later completions reuse it."""
+        self._post("/v1/prime", {"prompt": prompt})
+
+    @staticmethod
+    def _constrain(payload, grammar, json_schema):
+        # A compiled LlamaGrammar cannot be sent; the server builds and caches
+        # the grammar from the schema
+        if grammar is not None:
+            raise ValueError("RemoteLlama takes json_schema instead of a compiled grammar")
+        if json_schema is not None:
+            payload["json_schema"] = json_schema
+
+    def __call__(self, prompt, max_tokens=16, stop=None, echo=False, stream=False, grammar=None,
+                 json_schema=None, **kwargs):
+        payload = dict(kwargs, prompt=prompt, max_tokens=max_tokens, stop=stop, stream=stream)
+        self._constrain(payload, grammar, json_schema)
+        if not stream:
+            return self._post("/v1/completions", payload)
+        return self._stream(self._request("/v1/completions", payload))
+
+    def _stream(self, response):
+        # Closing this generator closes the connection, which cancels generation on the server
+        try:
+            for line in response:
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[len(b"data: "):].strip()
+                if data == b"[DONE]":
+                    return
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(f"Inference server error: {chunk['error']}")
+                yield chunk
+        finally:
+            response.close()
+
+    def create_chat_completion(self, messages, max_tokens=512, grammar=None, stream=False, json_schema=None, **kwargs):
+        payload = dict(kwargs, messages=messages, max_tokens=max_tokens, stream=stream)
+        self._constrain(payload, grammar, json_schema)
+        if not stream:
+            return self._post("/v1/chat/completions", payload)
+        return self._stream(self._request("/v1/chat/completions", payload))
+
+    def embed(self, input, normalize=False, truncate=True, return_count=False):
+        response = self._post("/v1/embeddings", {"input": input})
+        vectors = [item["embedding"] for item in response["data"]]
+        return vectors[0] if isinstance(input, str) else vectors
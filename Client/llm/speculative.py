@@ -0,0 +1,149 @@
+import logging
+import os
+import threading
+import llama_cpp
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+SPECULATIVE_MODES = ("", "prompt_lookup", "draft_model")
+
+class DraftModel(LlamaDraftModel):
+    """
+    Drafts tokens greedily with a small GGUF model that shares the main
+    model's vocabulary. The draft model's KV cache follows the main
+    model's tokens, so each call only evaluates what changed.
+    """
+    def __init__(self, model, num_pred_tokens=10):
+        self.model = model
+        self.num_pred_tokens = num_pred_tokens
+        self._eos = model.token_eos()
+        self._n_vocab = model.n_vocab()
+
+    def _next_token(self):
+        logits = np.ctypeslib.as_array(llama_cpp.llama_get_logits_ith(self.model.ctx, -1), shape=(self._n_vocab,))
+        return int(np.argmax(logits))
+
+    def __call__(self, input_ids, /, **kwargs):
+        model = self.model
+        cached = model.input_ids[:model.n_tokens]
+        n = min(len(cached), len(input_ids) - 1)
+        common = 0
+        if n > 0:
+            mismatch = np.flatnonzero(cached[:n] != input_ids[:n])
+            common = int(mismatch[0]) if len(mismatch) else n
+        # eval() drops the KV cache past n_tokens before decoding
+        model.n_tokens = common
+        model.eval(input_ids[common:].tolist())
+
+        room = model.n_ctx() - model.n_tokens
+        draft = []
+        for _ in range(min(self.num_pred_tokens, room)):
+            token = self._next_token()
+            if token == self._eos:
+                break
+            draft.append(token)
+            if len(draft) < self.num_pred_tokens:
+                model.eval([token])
+        return np.array(draft, dtype=np.intc)
+
+class SpeculationTracker(LlamaDraftModel):
+    """
+    Wraps a draft model and measures how many drafted tokens the main
+    model accepts.
+
+    llama-cpp-python passes the tokens decoded so far to every draft call,
+    so the previous draft is scored against the tokens that followed it.
+    settle() scores the last draft of a generation.
+    """
+    def __init__(self, draft_model, name):
+        self.draft_model = draft_model
+        self.name = name
+        self._pending = None
+        self._lock = threading.Lock()
+        self.totals = {"generations": 0, "drafted": 0, "accepted": 0, "generated": 0, "decode_seconds": 0.0}
+        self._current = {"drafted": 0, "accepted": 0}
+
+    def _score(self, input_ids):
+        if self._pending is None:
+            return
+        position, draft = self._pending
+        self._pending = None
+        following = np.asarray(input_ids[position:position + len(draft)])
+        mismatch = np.flatnonzero(following != draft[:len(following)])
+        accepted = int(mismatch[0]) if len(mismatch) else len(following)
+        self._current["drafted"] += len(draft)
+        self._current["accepted"] += accepted
+
+    def __call__(self, input_ids, /, **kwargs):
+        with self._lock:
+            self._score(input_ids)
+            draft = np.asarray(self.draft_model(input_ids, **kwargs), dtype=np.intc)
+            if len(draft):
+                self._pending = (len(input_ids), draft)
+            return draft
+
+    def begin(self):
+        with self._lock:
+            self._pending = None
+            self._current = {"drafted": 0, "accepted": 0}
+
+    def settle(self, input_ids, generated_tokens=0, decode_seconds=None, prompt_tokens=None):
+        """
+        Scores the last draft against the final tokens; returns this
+        generation's stats.
+
+        When generation stops, llama.cpp has already evaluated the last
+        draft, so input_ids can end in draft tokens that were never checked.
+        Only the first prompt_tokens + generated_tokens - 1 are verified:
+        the last generated token was sampled but not evaluated, so its slot
+        still holds the draft's guess. Without prompt_tokens the last draft
+        is not scored.
+        """
+        with self._lock:
+            if prompt_tokens is None:
+                self._pending = None
+            else:
+                self._score(input_ids[:max(0, prompt_tokens + generated_tokens - 1)])
+            stats = dict(self._current)
+            self.totals["generations"] += 1
+            self.totals["drafted"] += stats["drafted"]
+            self.totals["accepted"] += stats["accepted"]
+            if decode_seconds:
+                self.totals["generated"] += generated_tokens
+                self.totals["decode_seconds"] += decode_seconds
+        stats["acceptance_rate"] = stats["accepted"] / stats["drafted"] if stats["drafted"] else None
+        return stats
+
+    def summary(self):
+        with self._lock:
+            totals = dict(self.totals)
+        totals["draft"] = self.name
+        totals["acceptance_rate"] = totals["accepted"] / totals["drafted"] if totals["drafted"] else None
+        seconds = totals.pop("decode_seconds")
+        totals["tokens_per_second"] = totals["generated"] / seconds if seconds > 0 else None
+        return totals
+
+def build_draft_model(config, model_factory, model_kwargs):
+    """
+    Returns a SpeculationTracker around the draft model selected by
+    speculative_decoding, or None when speculation is off.
+    """
+    mode = config.get("speculative_decoding", "") or ""
+    num_pred_tokens = config.get("speculative_num_pred_tokens", 10)
+    if mode not in SPECULATIVE_MODES:
+        raise ValueError(f"Unknown speculative_decoding mode '{mode}'. Available: {', '.join(m for m in SPECULATIVE_MODES if m)}")
+    if mode == "prompt_lookup":
+        # Action JSON mostly repeats keys, names and coordinates already in the prompt
+        draft = LlamaPromptLookupDecoding(
+            max_ngram_size=config.get("speculative_max_ngram_size", 2),
+            num_pred_tokens=num_pred_tokens
+        )
+        return SpeculationTracker(draft, "prompt_lookup")
+    if mode == "draft_model":
+        draft_path = config.get("speculative_draft_model_path")
+        if not draft_path:
+            raise ValueError("speculative_decoding 'draft_model' requires speculative_draft_model_path")
+        logging.info("Loading draft model from %s...", draft_path)
+        model = model_factory(**dict(model_kwargs, model_path=draft_path))
+        return SpeculationTracker(DraftModel(model, num_pred_tokens), os.path.basename(draft_path))
+    return None
@@ -6,7 +6,6 @@ import sys
 # No sys.path manipulation needed if run correctly.
 
 from .config.settings import ConfigLoader
-from .core.agent import Agent
 
 def setup_logging():
     logging.basicConfig(
@@ -52,6 +51,10 @@ def main():
             else:
                 logging.info("Auto-start is enabled. Starting Agent.")
 
+            # Imported here: the agent pulls in llama_cpp, mss and numpy,
+            # which a run that only registers autostart never needs
+            from .core.agent import Agent
+
             # Initialize and Start Agent
             agent = Agent(config_loader)
             agent.start()
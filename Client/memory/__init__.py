@@ -1,3 +1,13 @@
-from .short_term import ShortTermMemory
-from .high_memory import HighMemory
-from .manager import MemoryManager
+from .._lazy import lazy_exports
+
+_EXPORTS = {
+    "ShortTermMemory": ".short_term",
+    "Event": ".short_term",
+    "HighMemory": ".high_memory",
+    "EpisodicMemory": ".episodic",
+    "VectorIndex": ".episodic",
+    "MemoryManager": ".manager"
+}
+
+__all__ = list(_EXPORTS)
+__getattr__ = lazy_exports(globals(), _EXPORTS)
@@ -0,0 +1,183 @@
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """
+    Growable matrix of L2-normalised vectors with vectorised cosine search.
+
+    Once the index holds approximate_threshold vectors, searches go through
+    a coarse k-means partition (IVF): only the nprobe closest clusters are
+    scanned. The partition is rebuilt whenever the index doubles in size.
+    """
+    def __init__(self, approximate_threshold=5000, nprobe=8, kmeans_iterations=8):
+        self.approximate_threshold = approximate_threshold
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self._vectors = None
+        self.size = 0
+        self._centroids = None
+        self._assignments = None
+        self._clustered_size = 0
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, vectors):
+        vectors = self._normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        if self._vectors is None:
+            self._vectors = np.empty((max(64, len(vectors)), vectors.shape[1]), dtype=np.float32)
+        needed = self.size + len(vectors)
+        if needed > len(self._vectors):
+            grown = np.empty((max(needed, 2 * len(self._vectors)), self._vectors.shape[1]), dtype=np.float32)
+            grown[:self.size] = self._vectors[:self.size]
+            self._vectors = grown
+        self._vectors[self.size:needed] = vectors
+        self.size = needed
+
+        if self.approximate_threshold and self.size >= self.approximate_threshold:
+            if self._centroids is None or self.size >= 2 * self._clustered_size:
+                self._build_clusters()
+            else:
+                self._assign_new(len(vectors))
+
+    def _build_clusters(self):
+        data = self._vectors[:self.size]
+        n_clusters = max(1, int(np.sqrt(self.size)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(self.size, n_clusters, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for c in range(n_clusters):
+                members = data[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+        self._centroids = centroids
+        self._assignments = np.argmax(data @ centroids.T, axis=1)
+        self._clustered_size = self.size
+
+    def _assign_new(self, count):
+        new = np.argmax(self._vectors[self.size - count:self.size] @ self._centroids.T, axis=1)
+        self._assignments = np.concatenate([self._assignments, new])
+
+    def search(self, query, k=5):
+        """Returns (indices, scores) of the k most similar vectors, best first."""
+        if self.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = self._normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+
+        if self._centroids is not None:
+            nprobe = min(self.nprobe, len(self._centroids))
+            clusters = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            candidates = np.flatnonzero(np.isin(self._assignments, clusters))
+        else:
+            candidates = np.arange(self.size)
+
+        scores = self._vectors[candidates] @ query
+        k = min(k, len(candidates))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+class EpisodicMemory:
+    """
+    Long-term store for events that have left the prompt window.
+
+    Events are queued on add() and embedded in batches by a background
+    thread, so the agent loop never waits for an embedding call to store
+    them. A batch that fails to embed stays queued and is retried after a
+    growing delay (up to max_retry_delay seconds).
+    """
+    def __init__(self, embed_fn, approximate_threshold=5000, min_score=0.0, retry_delay=1.0, max_retry_delay=60.0):
+        self.embed_fn = embed_fn
+        self.index = VectorIndex(approximate_threshold=approximate_threshold)
+        self.min_score = min_score
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.events = []
+        self.failures = 0
+        self._pending = []
+        # Guards events, index and _pending
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stop = False
+        self._thread = None
+
+    def add(self, event, text):
+        with self._lock:
+            self._pending.append((event, text))
+            if self._thread is None and not self._stop:
+                self._thread = threading.Thread(target=self._run, name="EpisodicMemory", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def _run(self):
+        delay = self.retry_delay
+        while True:
+            with self._lock:
+                while not self._pending and not self._stop:
+                    self._wake.wait()
+                if self._stop:
+                    return
+            if self.flush():
+                delay = self.retry_delay
+                continue
+            with self._lock:
+                self._wake.wait_for(lambda: self._stop, delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def flush(self):
+        """Embeds the queued events; returns False if embedding failed."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return True
+        try:
+            vectors = self.embed_fn([text for _, text in pending])
+        except Exception as e:
+            logger.warning("Failed to embed %d events for episodic memory, will retry: %s", len(pending), e)
+            with self._lock:
+                # Keep arrival order: the failed batch goes back in front of newer events
+                self._pending[:0] = pending
+                self.failures += 1
+            return False
+        with self._lock:
+            self.index.add(vectors)
+            self.events.extend(event for event, _ in pending)
+        return True
+
+    def search(self, text, k=5):
+        """
+        Returns up to k stored events most relevant to text, best first.
+        Events still queued for embedding are not searched.
+        """
+        if k <= 0 or not self.events:
+            return []
+        try:
+            query = self.embed_fn([text])[0]
+        except Exception as e:
+            logger.exception("Failed to embed episodic memory query: %s", e)
+            return []
+        with self._lock:
+            indices, scores = self.index.search(query, k)
+            return [self.events[i] for i, score in zip(indices, scores) if score >= self.min_score]
+
+    def get_count(self):
+        with self._lock:
+            return len(self.events) + len(self._pending)
+
+    def close(self, timeout=5.0):
+        with self._lock:
+            self._stop = True
+            self._wake.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
@@ -2,72 +2,222 @@ import json
 import os
 import uuid
 import time
+import sqlite3
 import logging
+import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    content TEXT NOT NULL,
+    created_timestamp REAL NOT NULL,
+    tags TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS memory_tags (
+    memory_id TEXT NOT NULL REFERENCES memories(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_memory_tags_tag ON memory_tags(tag);
+CREATE INDEX IF NOT EXISTS idx_memory_tags_memory_id ON memory_tags(memory_id);
+"""
+
+# Where the store lived before it moved out of the package directory
+PACKAGE_STORE = Path(__file__).resolve().parent / "high_memory.db"
+
+def default_storage_path():
+    """Returns the per-user store path under $XDG_DATA_HOME (or ~/.local/share)."""
+    data_home = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return Path(data_home) / "auto_llm" / "high_memory.db"
+
+def _adopt_package_store(storage_path):
+    """Moves a store left in the package directory to storage_path, once."""
+    if storage_path.exists() or not PACKAGE_STORE.exists():
+        return
+    try:
+        storage_path.parent.mkdir(parents=True, exist_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            old = PACKAGE_STORE.with_name(PACKAGE_STORE.name + suffix)
+            if old.exists():
+                shutil.move(str(old), str(storage_path.with_name(storage_path.name + suffix)))
+        logger.info("Moved high memory store from %s to %s", PACKAGE_STORE, storage_path)
+    except Exception as e:
+        logger.exception("Error moving high memory store out of the package directory: %s", e)
+
 class HighMemory:
-    def __init__(self, storage_path=None, limit=10):
+    """
+    Persistent memory store backed by SQLite in WAL mode.
+
+    Rows are indexed by id and tag. An in-memory copy ordered by insertion
+    is kept for get_all(), and `version` changes on every mutation so
+    callers can cache derived data. With sync="normal" (default), commits
+    are only fsynced at WAL checkpoints; use batch() to group writes into a
+    single transaction.
+    """
+    def __init__(self, storage_path=None, limit=10, sync="normal"):
+        legacy_path = None
         if storage_path is None:
-            storage_path = Path(__file__).resolve().parent / "high_memory.json"
-        self.storage_path = Path(storage_path)
+            storage_path = default_storage_path()
+            _adopt_package_store(storage_path)
+            legacy_path = PACKAGE_STORE.with_suffix(".json")
+        storage_path = Path(storage_path)
+        # Older versions stored memories as a JSON list; migrate them on first open
+        if legacy_path is None or not legacy_path.exists():
+            legacy_path = storage_path if storage_path.suffix == ".json" else storage_path.with_suffix(".json")
+        self.legacy_path = legacy_path
+        self.storage_path = storage_path.with_suffix(".db") if storage_path.suffix == ".json" else storage_path
         self.limit = limit
+        self.sync = sync
+        self.version = 0
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._conn = self._connect()
         self.memories = self._load_memories()
+        if not self.memories:
+            self._migrate_legacy()
+
+    def _connect(self):
+        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.storage_path), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={'FULL' if self.sync == 'full' else 'NORMAL'}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _row_to_entry(self, row):
+        m_id, content, created, tags = row
+        try:
+            tags = json.loads(tags)
+        except (TypeError, json.JSONDecodeError):
+            tags = []
+        return {"id": m_id, "content": content, "created_timestamp": created, "tags": tags}
 
     def _load_memories(self):
-        if not self.storage_path.exists():
-            return []
         try:
-            with open(self.storage_path, "r") as f:
-                data = json.load(f)
-                if not isinstance(data, list):
-                    logger.warning("High memory storage file does not contain a list. Got %s. Resetting to empty list.", type(data).__name__)
-                    return []
-                return data
+            rows = self._conn.execute(
+                "SELECT id, content, created_timestamp, tags FROM memories ORDER BY seq"
+            ).fetchall()
+            return [self._row_to_entry(row) for row in rows]
         except Exception as e:
             logger.exception("Error loading high memory: %s", e)
             return []
 
-    def _save_memories(self, memories_to_save):
+    def _migrate_legacy(self):
+        if not self.legacy_path.exists():
+            return
         try:
-            self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-            # Use a temporary file for atomic write
-            temp_path = self.storage_path.with_suffix(".tmp")
-            with open(temp_path, "w") as f:
-                json.dump(memories_to_save, f, indent=4)
-            temp_path.replace(self.storage_path)
+            with open(self.legacy_path, "r") as f:
+                data = json.load(f)
+            if not isinstance(data, list):
+                logger.warning("High memory storage file does not contain a list. Got %s. Skipping migration.", type(data).__name__)
+                return
+            with self.batch():
+                for entry in data:
+                    if isinstance(entry, dict) and "content" in entry:
+                        self._insert(
+                            str(entry.get("id") or uuid.uuid4()),
+                            entry["content"],
+                            entry.get("created_timestamp", time.time()),
+                            entry.get("tags") or []
+                        )
+            self.legacy_path.rename(self.legacy_path.with_suffix(".json.migrated"))
+            logger.info("Migrated %d high memories from %s", len(self.memories), self.legacy_path)
         except Exception as e:
-            logger.exception("Error saving high memory: %s", e)
-            raise
+            logger.exception("Error migrating legacy high memory file: %s", e)
 
-    def add_memory(self, content, tags=None):
-        if len(self.memories) >= self.limit:
-            raise ValueError(f"High memory limit reached ({self.limit} items). Please remove an item before adding a new one.")
+    @contextmanager
+    def batch(self):
+        """Groups several writes into one transaction (and at most one sync)."""
+        with self._lock:
+            if self._batch_depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("ROLLBACK")
+                    self.memories = self._load_memories()
+                    self.version += 1
+                raise
+            else:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("COMMIT")
 
-        entry = {
-            "id": str(uuid.uuid4()),
-            "content": content,
-            "created_timestamp": time.time(),
-            "tags": tags or []
-        }
+    def _insert(self, m_id, content, created, tags):
+        self._conn.execute(
+            "INSERT INTO memories (id, content, created_timestamp, tags) VALUES (?, ?, ?, ?)",
+            (m_id, content, created, json.dumps(tags))
+        )
+        self._conn.executemany(
+            "INSERT INTO memory_tags (memory_id, tag) VALUES (?, ?)",
+            [(m_id, str(tag)) for tag in tags]
+        )
+        entry = {"id": m_id, "content": content, "created_timestamp": created, "tags": list(tags)}
+        self.memories.append(entry)
+        self.version += 1
+        return entry
 
-        new_memories = self.memories + [entry]
-        self._save_memories(new_memories)
-        self.memories = new_memories
-        return entry["id"]
+    def add_memory(self, content, tags=None):
+        with self._lock:
+            if len(self.memories) >= self.limit:
+                raise ValueError(f"High memory limit reached ({self.limit} items). Please remove an item before adding a new one.")
+            try:
+                with self.batch():
+                    entry = self._insert(str(uuid.uuid4()), content, time.time(), tags or [])
+            except Exception as e:
+                logger.exception("Error saving high memory: %s", e)
+                raise
+            return entry["id"]
 
     def remove_memory(self, memory_id):
-        new_memories = [m for m in self.memories if str(m["id"]) != str(memory_id)]
-        if len(new_memories) == len(self.memories):
-            return False
+        memory_id = str(memory_id)
+        with self._lock:
+            try:
+                with self.batch():
+                    deleted = self._conn.execute("DELETE FROM memories WHERE id = ?", (memory_id,)).rowcount
+            except Exception as e:
+                logger.exception("Error removing high memory: %s", e)
+                raise
+            if not deleted:
+                return False
+            self.memories = [m for m in self.memories if str(m["id"]) != memory_id]
+            self.version += 1
+            return True
+
+    def get(self, memory_id):
+        row = self._conn.execute(
+            "SELECT id, content, created_timestamp, tags FROM memories WHERE id = ?", (str(memory_id),)
+        ).fetchone()
+        return self._row_to_entry(row) if row else None
 
-        self._save_memories(new_memories)
-        self.memories = new_memories
-        return True
+    def find_by_tag(self, tag):
+        rows = self._conn.execute(
+            "SELECT m.id, m.content, m.created_timestamp, m.tags FROM memories m "
+            "JOIN memory_tags t ON t.memory_id = m.id WHERE t.tag = ? ORDER BY m.seq",
+            (str(tag),)
+        ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
 
     def get_all(self):
         return self.memories.copy()
 
     def get_count(self):
         return len(self.memories)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                finally:
+                    self._conn.close()
+                    self._conn = None
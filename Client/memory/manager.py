@@ -3,9 +3,24 @@ from .high_memory import HighMemory
 import time
 
 class MemoryManager:
-    def __init__(self):
-        self.short_term = ShortTermMemory()
-        self.high_memory = HighMemory()
+    def __init__(self, high_memory_path=None, high_memory_limit=10, high_memory_sync="normal",
+                 episodic_memory=None, episodic_top_k=5, event_metadata_budget=65536, event_spill_dir=None,
+                 prompt_events=10):
+        # Number of recent events shown in the prompt. Events that drop out of
+        # that window move to the episodic store, if any, so every event is
+        # either in the prompt or retrievable.
+        self.prompt_events = prompt_events
+        self.episodic = episodic_memory
+        self.episodic_top_k = episodic_top_k
+        self.short_term = ShortTermMemory(
+            window=prompt_events,
+            on_leave_window=self._archive_event if episodic_memory is not None else None,
+            metadata_budget=event_metadata_budget,
+            spill_dir=event_spill_dir
+        )
+        self.high_memory = HighMemory(high_memory_path, limit=high_memory_limit, sync=high_memory_sync)
+        self._high_memory_lines = None
+        self._high_memory_version = None
 
     def add_event(self, event_type, content, metadata=None):
         self.short_term.add_event(event_type, content, metadata)
@@ -13,34 +28,78 @@ class MemoryManager:
     def add_to_high_memory(self, content, tags=None):
         return self.high_memory.add_memory(content, tags)
 
-    def format_short_term_for_llm(self, n=10):
-        events = self.short_term.get_recent(n)
-        if not events:
-            return "No recent events."
+    def format_event(self, e):
+        ts = e.get('timestamp', time.time())
+        timestamp = time.strftime('%H:%M:%S', time.localtime(ts))
+        event_type_raw = e.get('event_type', 'unknown')
+        event_type = str(event_type_raw).upper() if event_type_raw else "UNKNOWN"
+        content = e.get('content', '')
+        return f"[{timestamp}] {event_type}: {content}\n"
+
+    def _archive_event(self, event):
+        # Embed without the timestamp so similar events match regardless of time
+        self.episodic.add(event, f"{str(event.get('event_type', 'unknown')).upper()}: {event.get('content', '')}")
+
+    def format_memory(self, m):
+        m_id = m.get('id', 'unknown')
+        content = m.get('content', 'no content')
+        tags = m.get('tags') or []
+        tags_str = ", ".join(map(str, tags))
+        return f"- [ID: {m_id}] {content} (Tags: {tags_str})\n"
+
+    def get_short_term_lines(self, n=None):
+        """Returns formatted recent events, oldest first."""
+        n = self.prompt_events if n is None else n
+        return [self.format_event(e) for e in self.short_term.get_recent(n)]
+
+    def get_high_memory_lines(self):
+        # Re-format only when the store has changed
+        if self._high_memory_version != self.high_memory.version:
+            self._high_memory_lines = [self.format_memory(m) for m in self.high_memory.get_all()]
+            self._high_memory_version = self.high_memory.version
+        return list(self._high_memory_lines)
 
-        formatted = "Recent Events:\n"
-        for e in events:
-            ts = e.get('timestamp', time.time())
-            timestamp = time.strftime('%H:%M:%S', time.localtime(ts))
-            event_type_raw = e.get('event_type', 'unknown')
-            event_type = str(event_type_raw).upper() if event_type_raw else "UNKNOWN"
-            content = e.get('content', '')
-            formatted += f"[{timestamp}] {event_type}: {content}\n"
-        return formatted
+    def get_relevant_event_lines(self, query, k=None):
+        """Returns formatted past events most relevant to query, best match first."""
+        if self.episodic is None or not query:
+            return []
+        k = self.episodic_top_k if k is None else k
+        return [self.format_event(e) for e in self.episodic.search(query, k)]
+
+    def format_short_term_for_llm(self, n=None):
+        lines = self.get_short_term_lines(n)
+        if not lines:
+            return "No recent events."
+        return "Recent Events:\n" + "".join(lines)
 
     def format_high_memory_for_llm(self):
-        memories = self.high_memory.get_all()
-        if not memories:
+        lines = self.get_high_memory_lines()
+        if not lines:
             return "No persistent memories."
+        return "Persistent Memories:\n" + "".join(lines)
+
+    def format_relevant_events_for_llm(self, query):
+        lines = self.get_relevant_event_lines(query)
+        if not lines:
+            return ""
+        return "Relevant Past Events:\n" + "".join(lines)
+
+    def get_memory_usage(self):
+        usage = {"short_term": self.short_term.get_memory_usage()}
+        if self.episodic is not None:
+            usage["episodic_events"] = self.episodic.get_count()
+        return usage
+
+    def close(self):
+        # Also removes payloads spilled to disk by short-term memory
+        self.short_term.clear()
+        if self.episodic is not None:
+            self.episodic.close()
+        self.high_memory.close()
 
-        formatted = "Persistent Memories:\n"
-        for m in memories:
-            m_id = m.get('id', 'unknown')
-            content = m.get('content', 'no content')
-            tags = m.get('tags') or []
-            tags_str = ", ".join(map(str, tags))
-            formatted += f"- [ID: {m_id}] {content} (Tags: {tags_str})\n"
-        return formatted
-
-    def get_full_context_string(self):
-        return f"{self.format_high_memory_for_llm()}\n\n{self.format_short_term_for_llm()}"
+    def get_full_context_string(self, query=None):
+        context = f"{self.format_high_memory_for_llm()}\n\n{self.format_short_term_for_llm()}"
+        relevant = self.format_relevant_events_for_llm(query)
+        if relevant:
+            context += f"\n\n{relevant}"
+        return context
@@ -1,18 +1,156 @@
 from collections import deque
+from pathlib import Path
+import itertools
+import logging
+import sys
 import time
 
+# Strings in metadata longer than this are cut down to a preview
+MAX_METADATA_STRING = 256
+
+def estimate_size(value):
+    """Approximate retained size in bytes of a metadata value."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+class Event:
+    """
+    Compact short-term memory record. Supports dict-style get() and item
+    access so existing formatting code keeps working.
+    """
+    __slots__ = ("seq", "timestamp", "event_type", "content", "metadata", "metadata_bytes", "spill_paths")
+
+    def __init__(self, seq, timestamp, event_type, content, metadata, metadata_bytes, spill_paths):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.event_type = event_type # e.g., "action", "observation"
+        self.content = content
+        self.metadata = metadata
+        self.metadata_bytes = metadata_bytes
+        self.spill_paths = spill_paths
+
+    def get(self, key, default=None):
+        if key in self.__slots__:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "event_type": self.event_type,
+            "content": self.content,
+            "metadata": self.metadata
+        }
+
 class ShortTermMemory:
-    def __init__(self, maxlen=20):
+    """
+    Ring buffer of recent events.
+
+    Metadata is compacted on insert: images and arrays are replaced by a
+    summary (and, if spill_dir is set, written to disk and kept by path),
+    long strings are shortened. If the retained metadata exceeds
+    metadata_budget bytes, metadata is dropped from the oldest events first.
+    """
+    def __init__(self, maxlen=20, window=None, on_leave_window=None, metadata_budget=65536, spill_dir=None):
         self.memory = deque(maxlen=maxlen)
+        # Called once per entry, when newer entries push it out of the most
+        # recent `window` events (the ones the prompt shows)
+        self.window = min(window or maxlen, maxlen)
+        self.on_leave_window = on_leave_window
+        self.metadata_budget = metadata_budget
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.metadata_bytes = 0
+        self.spill_bytes = 0
+        self.metadata_dropped = 0
+        self._seq = itertools.count()
 
     def add_event(self, event_type, content, metadata=None):
-        entry = {
-            "timestamp": time.time(),
-            "event_type": event_type, # e.g., "action", "observation"
-            "content": content,
-            "metadata": metadata or {}
-        }
+        seq = next(self._seq)
+        spill_paths = []
+        metadata = self._compact(metadata or {}, seq, spill_paths)
+        entry = Event(seq, time.time(), event_type, content, metadata, estimate_size(metadata), spill_paths)
+        if self.on_leave_window is not None and len(self.memory) >= self.window:
+            self.on_leave_window(self.memory[-self.window])
+        if len(self.memory) == self.memory.maxlen:
+            self._release(self.memory[0])
         self.memory.append(entry)
+        self.metadata_bytes += entry.metadata_bytes
+        self._enforce_budget()
+
+    def _release(self, entry):
+        """Drops an entry's metadata and deletes its spilled files."""
+        self.metadata_bytes -= entry.metadata_bytes
+        entry.metadata = {}
+        entry.metadata_bytes = 0
+        for path in entry.spill_paths:
+            try:
+                self.spill_bytes -= path.stat().st_size
+                path.unlink()
+            except OSError:
+                pass
+        entry.spill_paths = []
+
+    def _enforce_budget(self):
+        if not self.metadata_budget:
+            return
+        for entry in self.memory:
+            if self.metadata_bytes <= self.metadata_budget:
+                break
+            if entry.metadata_bytes:
+                self._release(entry)
+                self.metadata_dropped += 1
+
+    def _compact(self, value, seq, spill_paths, key="value"):
+        if isinstance(value, dict):
+            return {k: self._compact(v, seq, spill_paths, str(k)) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._compact(v, seq, spill_paths, f"{key}_{i}") for i, v in enumerate(value)]
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if isinstance(value, str):
+            if len(value) > MAX_METADATA_STRING:
+                return value[:MAX_METADATA_STRING] + f"... ({len(value)} chars)"
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return {"type": "bytes", "length": len(value)}
+        if hasattr(value, "to_image") and hasattr(value, "array"):
+            # control.screenshot.Frame
+            value = value.to_image()
+        if hasattr(value, "save") and hasattr(value, "size") and hasattr(value, "mode"):
+            summary = {"type": "image", "size": list(value.size), "mode": value.mode}
+            path = self._spill(value, seq, key)
+            if path is not None:
+                summary["path"] = str(path)
+                spill_paths.append(path)
+            return summary
+        if hasattr(value, "shape") and hasattr(value, "nbytes"):
+            return {"type": "array", "shape": list(value.shape), "dtype": str(value.dtype), "nbytes": int(value.nbytes)}
+        text = repr(value)
+        if len(text) > MAX_METADATA_STRING:
+            text = text[:MAX_METADATA_STRING] + "..."
+        return text
+
+    def _spill(self, image, seq, key):
+        if self.spill_dir is None:
+            return None
+        path = self.spill_dir / f"event_{seq}_{key}.png"
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            # Fast compression: spilled images are for inspection, not storage
+            image.save(path, format="PNG", compress_level=1)
+            self.spill_bytes += path.stat().st_size
+            return path
+        except Exception as e:
+            logging.warning("Could not spill event payload to %s: %s", path, e)
+            return None
 
     def get_recent(self, n):
         if n <= 0:
@@ -23,5 +161,20 @@ class ShortTermMemory:
     def get_all(self):
         return list(self.memory)
 
+    def get_memory_usage(self):
+        """Returns a report of what the buffer currently retains."""
+        return {
+            "events": len(self.memory),
+            "capacity": self.memory.maxlen,
+            "content_bytes": sum(sys.getsizeof(e.content) for e in self.memory),
+            "metadata_bytes": self.metadata_bytes,
+            "metadata_budget": self.metadata_budget,
+            "metadata_dropped": self.metadata_dropped,
+            "spilled_files": sum(len(e.spill_paths) for e in self.memory),
+            "spill_bytes": self.spill_bytes
+        }
+
     def clear(self):
+        for entry in self.memory:
+            self._release(entry)
         self.memory.clear()
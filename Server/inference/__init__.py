@@ -0,0 +1,2 @@
+from .scheduler import FairQueue, Job
+from .server import InferenceServer
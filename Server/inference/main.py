@@ -0,0 +1,56 @@
+import argparse
+import logging
+import sys
+
+# Run as 'python -m Server.inference.main'
+
+from .server import InferenceServer
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+def main():
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Auto.LLM shared inference server")
+    parser.add_argument("--model", type=str, required=True, help="Path to the text GGUF model")
+    parser.add_argument("--vision-model", type=str, default=None, help="Path to the vision GGUF model")
+    parser.add_argument("--clip-model", type=str, default=None, help="Path to the CLIP projector for the vision model")
+    parser.add_argument("--embedding-model", type=str, default=None, help="Path to the embedding model (defaults to --model)")
+    parser.add_argument("--no-embeddings", action="store_true", help="Do not load an embedding model")
+    parser.add_argument("--context-size", type=int, default=2048, help="Context size of each text slot")
+    parser.add_argument("--n-gpu-layers", type=int, default=0, help="Layers to offload to the GPU")
+    parser.add_argument("--parallel", type=int, default=1, help="Number of concurrent completion slots")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    args = parser.parse_args()
+
+    server = InferenceServer(
+        model_path=args.model,
+        vision_model_path=args.vision_model,
+        clip_model_path=args.clip_model,
+        embedding_model_path=args.embedding_model,
+        enable_embeddings=not args.no_embeddings,
+        n_ctx=args.context_size,
+        n_gpu_layers=args.n_gpu_layers,
+        parallel=args.parallel
+    )
+    try:
+        server.load()
+    except Exception:
+        logging.exception("Failed to load models")
+        sys.exit(1)
+    server.start_workers()
+    try:
+        server.serve(args.host, args.port)
+    except KeyboardInterrupt:
+        logging.info("Shutting down...")
+
+if __name__ == "__main__":
+    main()
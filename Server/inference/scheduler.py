@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+class Job:
+    """
+    A queued request. Workers push results with put(); the HTTP handler
+    reads them with results(). Setting `cancelled` stops a streaming job.
+    """
+    def __init__(self, kind, client_id, payload):
+        self.kind = kind
+        self.client_id = client_id
+        self.payload = payload
+        self.created = time.monotonic()
+        self.started = None
+        self.cancelled = threading.Event()
+        self._results = queue.Queue()
+
+    def put(self, item):
+        self._results.put(("item", item))
+
+    def fail(self, error):
+        self._results.put(("error", error))
+
+    def finish(self):
+        self._results.put(("done", None))
+
+    def results(self):
+        """Yields results until the job finishes; re-raises worker errors."""
+        while True:
+            kind, value = self._results.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+
+    def result(self):
+        items = list(self.results())
+        return items[-1] if items else None
+
+class FairQueue:
+    """
+    Per-client FIFO queues served round-robin, so one busy client cannot
+    starve the others.
+
+    Each client is pinned to the worker that last served it, which keeps
+    its prompt prefix in that worker's KV cache. Other workers only take a
+    pinned client's job while its own worker is busy, and re-pin it.
+    """
+    def __init__(self):
+        self._queues = OrderedDict()
+        self._affinity = {}
+        self._idle = set()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, job):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Queue is closed")
+            self._queues.setdefault(job.client_id, []).append(job)
+            self._cond.notify_all()
+
+    def _pop(self, client_id):
+        jobs = self._queues[client_id]
+        job = jobs.pop(0)
+        if jobs:
+            # Rotate so other clients are served before this one again
+            self._queues.move_to_end(client_id)
+        else:
+            del self._queues[client_id]
+        job.started = time.monotonic()
+        return job
+
+    def _choose(self, worker):
+        for client_id in self._queues:
+            pinned = self._affinity.get(client_id)
+            if pinned is None or pinned == worker or pinned not in self._idle:
+                return client_id
+        return None
+
+    def get(self, worker=None, timeout=None):
+        """Returns the next job for worker, or None on timeout or close."""
+        with self._cond:
+            self._idle.add(worker)
+            try:
+                ready = self._cond.wait_for(lambda: self._closed or self._choose(worker) is not None, timeout)
+                if not ready or self._closed:
+                    return None
+                client_id = self._choose(worker)
+                self._affinity[client_id] = worker
+                return self._pop(client_id)
+            finally:
+                self._idle.discard(worker)
+                # Jobs pinned to this worker may now be taken by idle ones
+                self._cond.notify_all()
+
+    def get_many(self, max_jobs, window=0.0, timeout=None):
+        """
+        Waits for at least one job, lingers up to `window` seconds for more,
+        then returns up to max_jobs taken round-robin across clients.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queues or self._closed, timeout):
+                return []
+            if window > 0:
+                deadline = time.monotonic() + window
+                self._cond.wait_for(
+                    lambda: self._closed or sum(map(len, self._queues.values())) >= max_jobs,
+                    max(0.0, deadline - time.monotonic())
+                )
+            jobs = []
+            while self._queues and len(jobs) < max_jobs:
+                jobs.append(self._pop(next(iter(self._queues))))
+            return jobs
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def pending(self):
+        with self._cond:
+            return {client_id: len(jobs) for client_id, jobs in self._queues.items()}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            jobs = [job for jobs in self._queues.values() for job in jobs]
+            self._queues.clear()
+            self._cond.notify_all()
+        for job in jobs:
+            job.fail(RuntimeError("Server is shutting down"))
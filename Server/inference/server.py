@@ -0,0 +1,418 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .scheduler import FairQueue, Job
+
+# Sampling options clients may pass through to llama.cpp
+COMPLETION_OPTIONS = ("max_tokens", "stop", "temperature", "top_p", "top_k", "min_p",
+                      "repeat_penalty", "seed")
+
+class InferenceServer:
+    """
+    Holds the models once and serves completion, chat/vision and embedding
+    requests from several clients over localhost HTTP.
+
+    Completions run on `parallel` slots: independent llama.cpp contexts
+    over the same memory-mapped weights, each with its own worker thread
+    (llama.cpp releases the GIL while decoding, so slots decode
+    concurrently). Clients are pinned to a slot so their prompt prefix
+    stays in its KV cache. Embedding requests from all clients are merged
+    into one batched embed() call.
+    """
+    def __init__(self, model_path, vision_model_path=None, clip_model_path=None,
+                 embedding_model_path=None, enable_embeddings=True, n_ctx=2048,
+                 embedding_n_ctx=512, n_gpu_layers=0, parallel=1, embedding_batch_size=32,
+                 embedding_batch_window=0.005, model_factory=None):
+        if model_factory is None:
+            from llama_cpp import Llama
+            model_factory = Llama
+        self.model_factory = model_factory
+        self.model_path = model_path
+        self.vision_model_path = vision_model_path
+        self.clip_model_path = clip_model_path
+        self.embedding_model_path = embedding_model_path or model_path
+        self.enable_embeddings = enable_embeddings
+        self.n_ctx = n_ctx
+        self.embedding_n_ctx = embedding_n_ctx
+        self.n_gpu_layers = n_gpu_layers
+        self.parallel = max(1, int(parallel))
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_batch_window = embedding_batch_window
+
+        self.slots = []
+        self.vision_model = None
+        self.embedding_model = None
+        self.text_queue = FairQueue()
+        self.vision_queue = FairQueue()
+        self.embedding_queue = FairQueue()
+        self._grammars = OrderedDict()
+        self._grammar_lock = threading.Lock()
+        self._threads = []
+        self._httpd = None
+        self._serving = threading.Event()
+        self.stats = {"completions": 0, "chat_completions": 0, "embeddings": 0, "embedding_batches": 0}
+        self._stats_lock = threading.Lock()
+
+    def load(self):
+        for i in range(self.parallel):
+            logging.info("Loading text model slot %d from %s...", i, self.model_path)
+            self.slots.append(self.model_factory(
+                model_path=self.model_path,
+                n_ctx=self.n_ctx,
+                n_gpu_layers=self.n_gpu_layers,
+                use_mmap=True,
+                verbose=False
+            ))
+
+        if self.vision_model_path:
+            chat_handler = None
+            if self.clip_model_path:
+                from llama_cpp.llama_chat_format import Llava15ChatHandler
+                chat_handler = Llava15ChatHandler(clip_model_path=self.clip_model_path)
+            logging.info("Loading vision model from %s...", self.vision_model_path)
+            self.vision_model = self.model_factory(
+                model_path=self.vision_model_path,
+                chat_handler=chat_handler,
+                n_ctx=self.n_ctx,
+                n_gpu_layers=self.n_gpu_layers,
+                verbose=False
+            )
+
+        if self.enable_embeddings:
+            logging.info("Loading embedding model from %s...", self.embedding_model_path)
+            self.embedding_model = self.model_factory(
+                model_path=self.embedding_model_path,
+                embedding=True,
+                n_ctx=self.embedding_n_ctx,
+                n_gpu_layers=self.n_gpu_layers,
+                verbose=False
+            )
+
+    def roles(self):
+        roles = ["text"]
+        if self.vision_model is not None:
+            roles.append("vision")
+        if self.embedding_model is not None:
+            roles.append("embedding")
+        return roles
+
+    def start_workers(self):
+        for i in range(len(self.slots)):
+            self._start_thread(self._text_worker, i, name=f"TextSlot-{i}")
+        if self.vision_model is not None:
+            self._start_thread(self._vision_worker, name="VisionWorker")
+        if self.embedding_model is not None:
+            self._start_thread(self._embedding_worker, name="EmbeddingWorker")
+
+    def _start_thread(self, target, *args, name):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _grammar(self, payload):
+        """
+        Returns the grammar for a request's `json_schema` (or raw GBNF
+        `grammar`), compiled once and cached: clients resend the same schema.
+        """
+        if payload.get("json_schema") is not None:
+            key = ("json_schema", json.dumps(payload["json_schema"], sort_keys=True))
+        elif payload.get("grammar"):
+            key = ("gbnf", payload["grammar"])
+        else:
+            return None
+        with self._grammar_lock:
+            grammar = self._grammars.get(key)
+            if grammar is None:
+                from llama_cpp import LlamaGrammar
+                if key[0] == "json_schema":
+                    grammar = LlamaGrammar.from_json_schema(key[1], verbose=False)
+                else:
+                    grammar = LlamaGrammar.from_string(key[1], verbose=False)
+                self._grammars[key] = grammar
+                if len(self._grammars) > 16:
+                    self._grammars.popitem(last=False)
+            else:
+                self._grammars.move_to_end(key)
+            return grammar
+
+    def _text_worker(self, index):
+        model = self.slots[index]
+        while True:
+            job = self.text_queue.get(worker=index)
+            if job is None:
+                return
+            try:
+                if job.kind == "prime":
+                    self._prime(model, job.payload["prompt"])
+                    job.put({"primed": True})
+                else:
+                    self._complete(model, job)
+            except Exception as e:
+                logging.exception("Completion failed for client %s", job.client_id)
+                job.fail(e)
+            finally:
+                job.finish()
+
+    def _prime(self, model, prompt):
+        tokens = model.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+        cached = list(model.input_ids[:len(tokens)])
+        if cached == tokens:
+            return
+        model.reset()
+        model.eval(tokens)
+
+    def _complete(self, model, job):
+        payload = job.payload
+        options = {key: payload[key] for key in COMPLETION_OPTIONS if key in payload}
+        grammar = self._grammar(payload)
+        self._count("completions")
+        if not payload.get("stream"):
+            job.put(model(payload["prompt"], echo=False, grammar=grammar, **options))
+            return
+        stream = model(payload["prompt"], echo=False, stream=True, grammar=grammar, **options)
+        try:
+            for chunk in stream:
+                if job.cancelled.is_set():
+                    break
+                job.put(chunk)
+        finally:
+            stream.close()
+
+    def _vision_worker(self):
+        while True:
+            job = self.vision_queue.get()
+            if job is None:
+                return
+            try:
+                self._count("chat_completions")
+                self._chat(job)
+            except Exception as e:
+                logging.exception("Chat completion failed for client %s", job.client_id)
+                job.fail(e)
+            finally:
+                job.finish()
+
+    def _chat(self, job):
+        payload = job.payload
+        options = {key: payload[key] for key in COMPLETION_OPTIONS if key in payload}
+        grammar = self._grammar(payload)
+        if not payload.get("stream"):
+            job.put(self.vision_model.create_chat_completion(
+                messages=payload["messages"], grammar=grammar, **options
+            ))
+            return
+        stream = self.vision_model.create_chat_completion(
+            messages=payload["messages"], grammar=grammar, stream=True, **options
+        )
+        try:
+            for chunk in stream:
+                if job.cancelled.is_set():
+                    break
+                job.put(chunk)
+        finally:
+            stream.close()
+
+    def _embedding_worker(self):
+        while True:
+            jobs = self.embedding_queue.get_many(self.embedding_batch_size, window=self.embedding_batch_window)
+            if not jobs:
+                if self.embedding_queue.closed:
+                    return
+                continue
+            # One embed() call for every input of every queued request
+            inputs = []
+            for job in jobs:
+                texts = job.payload["input"]
+                inputs.extend([texts] if isinstance(texts, str) else texts)
+            try:
+                vectors = self.embedding_model.embed(inputs, truncate=True)
+                self._count("embeddings", len(inputs))
+                self._count("embedding_batches")
+                offset = 0
+                for job in jobs:
+                    texts = job.payload["input"]
+                    n = 1 if isinstance(texts, str) else len(texts)
+                    job.put({"data": [
+                        {"index": i, "embedding": v} for i, v in enumerate(vectors[offset:offset + n])
+                    ]})
+                    offset += n
+            except Exception as e:
+                logging.exception("Embedding batch of %d requests failed", len(jobs))
+                for job in jobs:
+                    job.fail(e)
+            finally:
+                for job in jobs:
+                    job.finish()
+
+    def tokenize(self, text, add_bos=True, special=False, role="text"):
+        """Tokenizes a string, or each string of a list (one token list per string)."""
+        # Tokenizing only reads the vocabulary, so it does not need a slot
+        model = self.vision_model if role == "vision" and self.vision_model is not None else self.slots[0]
+        if isinstance(text, list):
+            return [model.tokenize(t.encode("utf-8"), add_bos=add_bos, special=special) for t in text]
+        return model.tokenize(text.encode("utf-8"), add_bos=add_bos, special=special)
+
+    def health(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            "status": "ok",
+            "roles": self.roles(),
+            "parallel": len(self.slots),
+            "pending": {
+                "text": self.text_queue.pending(),
+                "vision": self.vision_queue.pending(),
+                "embedding": self.embedding_queue.pending(),
+            },
+            "stats": stats,
+        }
+
+    def bind(self, host="127.0.0.1", port=8765):
+        """Opens the listening socket; returns the bound (host, port) (port 0 picks a free one)."""
+        server = self
+
+        class Handler(InferenceRequestHandler):
+            inference = server
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        return self._httpd.server_address[:2]
+
+    def serve(self, host="127.0.0.1", port=8765):
+        if self._httpd is None:
+            self.bind(host, port)
+        httpd = self._httpd
+        logging.info("Inference server listening on http://%s:%d", *httpd.server_address[:2])
+        self._serving.set()
+        try:
+            httpd.serve_forever()
+        finally:
+            self._serving.clear()
+            self.shutdown()
+
+    def shutdown(self):
+        """Stops serving (also from another thread) and fails queued requests."""
+        httpd, self._httpd = self._httpd, None
+        if httpd is not None:
+            if self._serving.is_set():
+                httpd.shutdown()
+            httpd.server_close()
+        for q in (self.text_queue, self.vision_queue, self.embedding_queue):
+            q.close()
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP; streamed completions are sent as server-sent events."""
+    inference = None
+    protocol_version = "HTTP/1.1"
+
+    def _client_id(self):
+        return self.headers.get("X-Client-Id") or str(self.client_address[0])
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/health":
+            self._send_json(200, self.inference.health())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        try:
+            payload = self._read_json()
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+
+        routes = {
+            "/v1/completions": (self.inference.text_queue, "completion", "text"),
+            "/v1/prime": (self.inference.text_queue, "prime", "text"),
+            "/v1/chat/completions": (self.inference.vision_queue, "chat", "vision"),
+            "/v1/embeddings": (self.inference.embedding_queue, "embedding", "embedding"),
+        }
+        if path == "/v1/tokenize":
+            try:
+                tokens = self.inference.tokenize(
+                    payload["texts"] if "texts" in payload else payload["text"], payload.get("add_bos", True), payload.get("special", False),
+                    payload.get("role", "text")
+                )
+                self._send_json(200, {"tokens": tokens})
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+            return
+        if path not in routes:
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        queue, kind, role = routes[path]
+        if role not in self.inference.roles():
+            self._send_json(404, {"error": f"No {role} model loaded"})
+            return
+
+        job = Job(kind, self._client_id(), payload)
+        try:
+            queue.put(job)
+        except RuntimeError as e:
+            self._send_json(503, {"error": str(e)})
+            return
+
+        if kind in ("completion", "chat") and payload.get("stream"):
+            self._stream(job)
+            return
+        start = time.perf_counter()
+        try:
+            result = job.result()
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        logging.debug("%s for %s took %.3fs (queued %.3fs)", kind, job.client_id,
+                      time.perf_counter() - start, (job.started or job.created) - job.created)
+        self._send_json(200, result)
+
+    def _stream(self, job):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            try:
+                for chunk in job.results():
+                    self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception as e:
+                self.wfile.write(b"data: " + json.dumps({"error": str(e)}).encode("utf-8") + b"\n\n")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream (e.g. it already has a complete action)
+            job.cancelled.set()
+            try:
+                for _ in job.results():
+                    pass
+            except Exception:
+                pass
+
+    def log_message(self, format, *args):
+        logging.debug("inference: " + format, *args)
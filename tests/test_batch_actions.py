@@ -0,0 +1,71 @@
+import pytest
+from PIL import Image
+
+from Client.benchmarks.replay import ReplayCapture
+from Client.control import actions
+from Client.control.actions import ActionExecutor
+from Client.control.backends import NoOpInputBackend
+
+CLICK = {"action": "left_click", "params": {"x": 10, "y": 20}}
+
+@pytest.fixture
+def executor(tmp_path):
+    Image.new("RGB", (64, 48), "white").save(tmp_path / "frame.png")
+    return ActionExecutor(
+        screen_capture=ReplayCapture(tmp_path), input_backend=NoOpInputBackend(), config={"action_duration": 0}
+    )
+
+def _run(executor, *steps):
+    return executor.execute_batch({"actions": list(steps)})
+
+def test_batch_runs_steps_in_order(executor):
+    result = _run(executor, CLICK, {"action": "press_key", "params": {"key": "enter"}, "wait": 0})
+    assert result["status"] == "success"
+    assert result["completed"] == 2
+    assert executor.backend.calls == [("move_to", 10, 20), ("click", "left"), ("press", "enter")]
+
+@pytest.mark.parametrize("final", [
+    {"action": "screenshot"},
+    {"action": "zoom", "params": {"x": 0, "y": 0, "width": 400, "height": 300}},
+    {"action": "reset_zoom"},
+])
+def test_view_changing_step_must_be_last(executor, final):
+    result = _run(executor, final, CLICK)
+    assert result["status"] == "error"
+    assert result["message"].startswith("Invalid step 1:")
+    assert "last action" in result["message"]
+    assert executor.backend.calls == []
+
+    assert _run(executor, CLICK, final)["status"] == "success"
+
+@pytest.mark.parametrize("wait", [-1, "1", True, None])
+def test_bad_wait_is_rejected(executor, wait):
+    result = _run(executor, dict(CLICK, wait=wait), CLICK)
+    assert result["status"] == "error"
+    assert "Invalid wait" in result["message"]
+    assert executor.backend.calls == []
+
+def test_long_wait_is_capped(executor, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(actions.time, "sleep", sleeps.append)
+    assert _run(executor, dict(CLICK, wait=60), CLICK)["status"] == "success"
+    assert sleeps == [actions.MAX_STEP_WAIT]
+
+@pytest.mark.parametrize("bad_step", [
+    {"action": "no_such_action"},
+    {"action": "left_click", "params": {"x": 1, "z": 2}},
+    {"action": "press_key", "params": "enter"},
+    "press enter",
+])
+def test_invalid_step_means_no_step_runs(executor, bad_step):
+    result = _run(executor, CLICK, CLICK, bad_step)
+    assert result["status"] == "error"
+    assert result["message"].startswith("Invalid step 3:")
+    assert result["completed"] == 0
+    assert result["results"] == []
+    assert executor.backend.calls == []
+
+def test_batch_over_the_limit_is_rejected(executor):
+    result = executor.execute_batch({"actions": [CLICK] * 3}, max_actions=2)
+    assert result["status"] == "error"
+    assert executor.backend.calls == []
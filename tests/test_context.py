@@ -0,0 +1,91 @@
+from Client.core.context import ContextBuilder, TokenCounter
+from Client.memory.manager import MemoryManager
+
+def _words(text):
+    return len(text.split())
+
+class BatchTokenizer:
+    """Counts words and records every batch it was asked to count."""
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        return [_words(text) for text in texts]
+
+def _builder(tmp_path, token_counter, context_size=2048, max_tokens=64, **kwargs):
+    memory = MemoryManager(high_memory_path=tmp_path / "high_memory.db")
+    builder = ContextBuilder(
+        "info", memory, token_counter=token_counter, context_size=context_size,
+        max_tokens=max_tokens, safety_margin=0, **kwargs
+    )
+    return builder, memory
+
+def test_new_segments_are_counted_in_one_batch(tmp_path):
+    batch = BatchTokenizer()
+    counter = TokenCounter(lambda text: batch([text])[0], batch)
+    builder, memory = _builder(tmp_path, counter)
+    memory.add_event("action", "clicked ok")
+    memory.add_event("action", "typed hello")
+
+    builder.get_full_prompt("an editor window")
+    assert len(batch.batches) == 1
+    assert "an editor window" in batch.batches[0]
+
+    memory.add_event("action", "pressed enter")
+    batch.batches.clear()
+    builder.get_full_prompt("a terminal")
+    # Only the new event line and the observation are tokenized again
+    assert len(batch.batches) == 1
+    assert len(batch.batches[0]) == 2
+    assert batch.batches[0][-1] == "a terminal"
+    memory.close()
+
+def _fit(builder, tail_tokens):
+    """Sizes the context so tail_tokens are left after the prefix and generation."""
+    prefix = builder.token_counter.count(builder.get_prompt_prefix())
+    builder.context_size = prefix + builder.max_tokens + tail_tokens
+
+def test_oldest_events_are_trimmed_first(tmp_path):
+    builder, memory = _builder(tmp_path, TokenCounter(_words), recent_events=10)
+    for n in range(10):
+        memory.add_event("action", f"step {n}")
+    _fit(builder, 40)
+
+    prompt = builder.get_full_prompt("desktop")
+    budget = builder.last_budget
+    assert 0 < budget["events_included"] < budget["events_available"] == 10
+    assert budget["remaining_tokens"] >= 0
+    assert "step 9" in prompt and "step 0" not in prompt
+    omitted = 10 - budget["events_included"]
+    assert f"({omitted} older entries omitted)" in prompt
+    memory.close()
+
+def test_persistent_memories_are_kept_before_events(tmp_path):
+    builder, memory = _builder(tmp_path, TokenCounter(_words))
+    for n in range(3):
+        memory.add_to_high_memory(f"fact {n}")
+        memory.add_event("action", f"step {n}")
+    _fit(builder, 40)
+
+    prompt = builder.get_full_prompt("desktop")
+    budget = builder.last_budget
+    assert budget["memories_included"] == 3
+    assert budget["events_included"] < 3
+    assert all(f"fact {n}" in prompt for n in range(3))
+    memory.close()
+
+def test_long_observation_is_truncated_to_half_the_budget(tmp_path):
+    counter = TokenCounter(_words)
+    builder, memory = _builder(tmp_path, counter)
+    memory.add_event("action", "clicked ok")
+    _fit(builder, 100)
+
+    prompt = builder.get_full_prompt("word " * 500)
+    observation = prompt.split("Current Observation: ")[1].split("\n\nNext Action")[0]
+    assert observation.endswith(" [...]")
+    assert counter.count(observation) <= 50
+    # The space the observation left is still used for memory
+    assert builder.last_budget["events_included"] == 1
+    assert builder.last_budget["remaining_tokens"] >= 0
+    memory.close()
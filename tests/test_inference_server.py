@@ -0,0 +1,117 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from Client.llm.remote import RemoteLlama
+from Server.inference.server import InferenceServer
+
+class StubModel:
+    """Minimal llama_cpp.Llama stand-in: echoes the prompt's words back."""
+    def __init__(self, model_path=None, embedding=False, **kwargs):
+        self.model_path = model_path
+        self.grammars = []
+        self.embed_calls = []
+        self.input_ids = []
+
+    def tokenize(self, text, add_bos=True, special=False):
+        tokens = [len(word) for word in text.split()]
+        return ([1] + tokens) if add_bos else tokens
+
+    def reset(self):
+        self.input_ids = []
+
+    def eval(self, tokens):
+        self.input_ids = list(self.input_ids) + list(tokens)
+
+    def __call__(self, prompt, echo=False, stream=False, grammar=None, max_tokens=16, **kwargs):
+        self.grammars.append(grammar)
+        words = prompt.split()[:max_tokens]
+        if stream:
+            return ({"choices": [{"text": word + " "}]} for word in words)
+        return {"choices": [{"text": " ".join(words)}], "usage": {"completion_tokens": len(words)}}
+
+    def embed(self, inputs, truncate=True):
+        self.embed_calls.append(list(inputs))
+        return [[float(len(text)), 1.0] for text in inputs]
+
+@pytest.fixture
+def server():
+    inference = InferenceServer("text.gguf", model_factory=StubModel, embedding_batch_window=0.05)
+    inference.load()
+    inference.start_workers()
+    host, port = inference.bind("127.0.0.1", 0)
+    thread = threading.Thread(target=inference.serve, daemon=True)
+    thread.start()
+    inference.url = f"http://{host}:{port}"
+    yield inference
+    inference.shutdown()
+    thread.join(5)
+
+def test_health_reports_roles(server):
+    health = RemoteLlama(server.url).health()
+    assert health["status"] == "ok"
+    assert health["roles"] == ["text", "embedding"]
+
+def test_completion_and_stream(server):
+    model = RemoteLlama(server.url)
+    assert model("open the editor", max_tokens=2)["choices"][0]["text"] == "open the"
+    chunks = list(model("open the editor", stream=True))
+    assert "".join(chunk["choices"][0]["text"] for chunk in chunks) == "open the editor "
+    assert server.stats["completions"] == 2
+
+def test_tokenize_and_prime(server):
+    model = RemoteLlama(server.url)
+    assert model.tokenize("ab cde") == [1, 2, 3]
+    model.prime("ab cde")
+    assert server.slots[0].input_ids == [1, 2, 3]
+
+def test_tokenize_batch(server):
+    model = RemoteLlama(server.url)
+    assert model.tokenize_batch(["ab cde", "x"], add_bos=False) == [[2, 3], [1]]
+
+def test_embeddings_from_clients_are_batched(server):
+    clients = [RemoteLlama(server.url, role="embedding", client_id=f"client-{i}") for i in range(3)]
+    results = [None] * len(clients)
+
+    def embed(i):
+        results[i] = clients[i].embed(["x" * (i + 1), "yy"])
+
+    threads = [threading.Thread(target=embed, args=(i,)) for i in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [vectors[0][0] for vectors in results] == [1.0, 2.0, 3.0]
+    # Three requests inside the batch window share fewer than three embed() calls
+    assert server.stats["embeddings"] == 6
+    assert server.stats["embedding_batches"] < 3
+
+def test_missing_role_is_rejected(server):
+    with pytest.raises(RuntimeError, match="No vision model loaded"):
+        RemoteLlama(server.url, role="vision").create_chat_completion([{"role": "user", "content": "hi"}])
+
+def test_invalid_json_is_rejected(server):
+    request = urllib.request.Request(server.url + "/v1/completions", data=b"{not json",
+                                     headers={"Content-Type": "application/json"})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=5)
+    assert error.value.code == 400
+    assert "Invalid JSON" in json.loads(error.value.read())["error"]
+
+def test_compiled_grammar_is_not_sent():
+    with pytest.raises(ValueError):
+        RemoteLlama("http://127.0.0.1:1")("prompt", grammar=object())
+
+def test_json_schema_is_compiled_on_the_server_and_cached(server):
+    pytest.importorskip("llama_cpp")
+    schema = {"type": "object", "properties": {"action": {"type": "string"}}, "required": ["action"]}
+    model = RemoteLlama(server.url)
+    model("first", json_schema=schema)
+    model("second", json_schema=dict(reversed(list(schema.items()))))
+    grammars = server.slots[0].grammars
+    assert grammars[0] is not None
+    # Key order does not matter; the compiled grammar is reused
+    assert grammars[1] is grammars[0]
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from Server.inference.scheduler import FairQueue, Job
+
+def _job(client_id, n=0):
+    return Job("completion", client_id, {"n": n})
+
+def _wait_idle(q, worker, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while worker not in q._idle:
+        assert time.monotonic() < deadline, "worker never started waiting"
+        time.sleep(0.001)
+
+def test_clients_are_served_round_robin():
+    q = FairQueue()
+    for n in range(3):
+        q.put(_job("a", n))
+    q.put(_job("b"))
+    order = [(job.client_id, job.payload["n"]) for job in (q.get(timeout=1) for _ in range(4))]
+    assert order == [("a", 0), ("b", 0), ("a", 1), ("a", 2)]
+    assert q.pending() == {}
+
+def test_get_times_out_when_empty():
+    assert FairQueue().get(timeout=0.01) is None
+
+def test_client_stays_with_its_idle_worker():
+    q = FairQueue()
+    q.put(_job("a"))
+    assert q.get(worker=0, timeout=1).client_id == "a"
+
+    taken = []
+    thread = threading.Thread(target=lambda: taken.append(q.get(worker=0, timeout=2)))
+    thread.start()
+    _wait_idle(q, 0)
+    q.put(_job("a", 1))
+    # Worker 0 is idle, so worker 1 must leave the pinned job to it
+    assert q.get(worker=1, timeout=0.1) is None
+    thread.join()
+    assert taken[0].payload["n"] == 1
+
+def test_busy_worker_client_is_taken_and_repinned():
+    q = FairQueue()
+    q.put(_job("a"))
+    q.get(worker=0, timeout=1)
+    # Worker 0 is busy (not waiting in get), so worker 1 takes over client a
+    q.put(_job("a", 1))
+    assert q.get(worker=1, timeout=1).payload["n"] == 1
+    q.put(_job("a", 2))
+    assert q.get(worker=1, timeout=1).payload["n"] == 2
+
+def test_get_many_batches_across_clients():
+    q = FairQueue()
+    for client_id in ("a", "a", "b", "c"):
+        q.put(_job(client_id))
+    jobs = q.get_many(3, window=0.0, timeout=1)
+    assert [job.client_id for job in jobs] == ["a", "b", "c"]
+    assert q.pending() == {"a": 1}
+
+def test_get_many_waits_for_window():
+    q = FairQueue()
+    q.put(_job("a"))
+    threading.Timer(0.02, lambda: q.put(_job("b"))).start()
+    jobs = q.get_many(2, window=1.0, timeout=1)
+    assert [job.client_id for job in jobs] == ["a", "b"]
+
+def test_close_fails_pending_jobs_and_wakes_workers():
+    q = FairQueue()
+    job = _job("a")
+    q.put(job)
+    results = []
+    q.close()
+    thread = threading.Thread(target=lambda: results.append(q.get(timeout=2)))
+    thread.start()
+    thread.join()
+    assert results == [None]
+    with pytest.raises(RuntimeError):
+        job.result()
+    with pytest.raises(RuntimeError):
+        q.put(_job("b"))
+
+def test_job_results_reraise_worker_errors():
+    job = _job("a")
+    job.put(1)
+    job.put(2)
+    job.fail(ValueError("boom"))
+    results = job.results()
+    assert next(results) == 1
+    assert next(results) == 2
+    with pytest.raises(ValueError):
+        next(results)
@@ -0,0 +1,51 @@
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from Client.benchmarks.replay import ReplayCapture, StubLlama
+from Client.config.settings import DEFAULT_CONFIG
+from Client.control.actions import ActionExecutor
+from Client.control.backends import NoOpInputBackend
+from Client.control.screenshot import Frame
+from Client.core.agent import Agent
+from Client.core.trace import TraceReader
+from Client.llm.model_loader import ModelLoader
+
+class ReusingCapture(ReplayCapture):
+    """Replays frames into one reused buffer, as ScreenCapture does."""
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.buffer = np.empty_like(self.frames[0])
+
+    def grab(self, region=None):
+        frame = super().grab(region)
+        self.buffer[...] = frame.array
+        return Frame(self.buffer, region, frame.timestamp)
+
+def test_traced_frame_is_the_observed_one(tmp_path):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    Image.new("RGB", (64, 48), "black").save(frames_dir / "0.png")
+    Image.new("RGB", (64, 48), "white").save(frames_dir / "1.png")
+    config = dict(DEFAULT_CONFIG, model_path="stub.gguf", constrained_decoding=False, adaptive_settle=False,
+                  step_delay=0.0, max_steps=1, model_warmup=False, trace_dir=str(tmp_path / "trace"),
+                  high_memory_path=str(tmp_path / "high_memory.db"))
+    capture = ReusingCapture(frames_dir)
+    model_factory = partial(StubLlama, token_latency=0.0, prompt_token_latency=0.0,
+                            responses=[{"action": "screenshot"}])
+    agent = Agent(
+        config,
+        model_loader=ModelLoader(config, model_factory=model_factory),
+        action_executor=ActionExecutor(screen_capture=capture, input_backend=NoOpInputBackend(), config=config),
+        capture_factory=lambda: capture
+    )
+    agent.start()
+
+    # The screenshot action grabbed the white frame into the same buffer
+    assert capture.buffer.min() == 255
+    (trace_dir,) = (tmp_path / "trace").iterdir()
+    with TraceReader(trace_dir) as reader:
+        assert len(reader) == 1
+        assert reader.step(0)["action"] == {"action": "screenshot"}
+        assert np.asarray(reader.frame(0).convert("L")).max() == 0
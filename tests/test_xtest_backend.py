@@ -0,0 +1,86 @@
+"""
+XTEST input backend against a private Xvfb server. Skipped when Xvfb or
+python-xlib is not installed. Run with -s to see the latency report.
+"""
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+pytest.importorskip("Xlib")
+if shutil.which("Xvfb") is None:
+    pytest.skip("Xvfb is not installed", allow_module_level=True)
+
+from Client.benchmarks.bench_input import bench_backend
+from Client.control.backends import FailSafeError, XTestBackend
+
+SCREEN = (1024, 768)
+
+@pytest.fixture(scope="module")
+def display():
+    # -displayfd makes Xvfb pick a free display number and report it when ready
+    read_fd, write_fd = os.pipe()
+    server = subprocess.Popen(
+        ["Xvfb", "-displayfd", str(write_fd), "-screen", "0", f"{SCREEN[0]}x{SCREEN[1]}x24", "-nolisten", "tcp"],
+        pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        number = f.readline().strip()
+    if not number:
+        server.kill()
+        pytest.skip("Xvfb failed to start")
+    yield f":{number}"
+    server.terminate()
+    server.wait(5)
+
+@pytest.fixture
+def backend(display):
+    backend = XTestBackend(display=display)
+    # Start every test away from the fail-safe corners
+    backend.move_to(SCREEN[0] // 2, SCREEN[1] // 2)
+    yield backend
+    backend.close()
+
+def _pointer(backend):
+    pointer = backend._root.query_pointer()
+    return pointer.root_x, pointer.root_y
+
+def test_size_and_move(backend):
+    assert backend.size() == SCREEN
+    backend.move_to(100, 200)
+    assert _pointer(backend) == (100, 200)
+    backend.move_to(300, 400, duration=0.05)
+    assert _pointer(backend) == (300, 400)
+
+def test_failsafe_in_corner(backend):
+    backend.move_to(0, 0)
+    with pytest.raises(FailSafeError):
+        backend.click()
+    backend.failsafe = False
+    backend.move_to(10, 10)
+
+def test_hotkey_holds_shift_for_shifted_characters(backend):
+    events = []
+    original = backend._key
+    backend._key = lambda event_type, keycode: (events.append((event_type, keycode)), original(event_type, keycode))
+    backend.hotkey("ctrl", "+")
+    X = backend._X
+    ctrl, shift, plus = backend._keycode("ctrl")[0], backend._keycode("shift")[0], backend._keycode("+")[0]
+    assert backend._keycode("+")[1], "'+' is expected to be a shifted key on the default layout"
+    assert events == [
+        (X.KeyPress, ctrl), (X.KeyPress, shift), (X.KeyPress, plus),
+        (X.KeyRelease, plus), (X.KeyRelease, shift), (X.KeyRelease, ctrl),
+    ]
+    # Nothing is left held down
+    assert not any(backend._display.query_keymap())
+
+def test_latency_report(backend):
+    results = bench_backend(backend, 50)
+    print("\nXTEST latency (seconds):\n" + json.dumps(results, indent=4))
+    for action, stats in results.items():
+        # Generous bound: each action is one or two round trips to a local server
+        assert stats["p50"] < 0.05, action